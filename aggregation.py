@@ -0,0 +1,298 @@
+"""
+Two-level solve for schedules with very many tasks.
+
+Tasks that the model cannot tell apart much are merged into aggregate tasks,
+and the smaller LP of the aggregates is solved. Tasks go in one cluster when
+they are the same kind (completable or ongoing), have the same batch_hours,
+batch flag, allowed days (whether row) and, for ongoings, miss_week_cost,
+have due dates in the same due_window days (dues past the horizon all count
+as its end), and have scores within score_tolerance of the cluster's first
+task (relative to the largest score of the schedule). An aggregate has the
+summed total_hours, week_hours, max_day_hours, current_schedule and
+perm_task_time of its members and their mean scores weighted by hours. Its
+due date is its members' earliest, by which it must do the batches all of
+them need before their own due dates. With the default due_window of 1 that
+is exactly what the members' due rows ask for; wider windows give fewer
+clusters but ask for the work earlier, and can make the aggregate LP
+infeasible when the exact one is not.
+
+Each aggregate's hours per day are then split out to its members day by day:
+perm_task_time first, then completables up to what they still need before
+their due dates, earliest due first, and ongoings up to what they are below
+week_hours that week, most first; what is left goes to whoever still has
+room. Every member stays within its max_day_hours (and total_hours), in whole
+batches. The split schedule is priced on the full
+model, so its cost compares directly with makeSchedule's. It is feasible but
+not proven optimal, so its status is STATUS_NOT_SOLVED.
+"""
+
+import time
+
+import numpy as np
+
+from sparse_model import buildModel, priceSchedule
+from presolve import presolveModel
+from solvers import SolveResult, STATUS_NOT_SOLVED, STATUS_INFEASIBLE, getBackend
+
+_EPS = 1e-9
+
+
+#status is optimal when the aggregate LP solved and the split schedule is
+#feasible for the full model; the objective is its full-model cost
+class AggregateResult(SolveResult):
+    def __init__(self, status, objective, values, solve_time, backend, message = "", clusters = None,
+    aggregate = None, unplaced = 0.0):
+        super(AggregateResult, self).__init__(status, objective, values, solve_time, backend, message)
+        #task rows of every cluster
+        self.clusters = clusters if clusters is not None else []
+        #SolveResult of the aggregate LP
+        self.aggregate = aggregate
+        #aggregate hours that no member could take
+        self.unplaced = unplaced
+
+
+class _AggregateTask(object):
+    def __init__(self, tasks, weights):
+        first = tasks[0]
+        self.batch_hours = first.batch_hours
+        self.is_batch = first.isBatch()
+        #what the members can do in a day in whole batches
+        self.max_day_hours = sum(_whole(t.max_day_hours, t.batch_hours, t.isBatch()) for t in tasks)
+        weights = np.asarray(weights, dtype = float)
+        if weights.sum() <= 0:
+            weights = np.ones(len(tasks))
+        self.scores = tuple(np.average(np.array([list(t.scores) for t in tasks], dtype = float), axis = 0,
+            weights = weights))
+        if hasattr(first, 'total_hours'):
+            self.total_hours = sum(t.total_hours for t in tasks)
+        if hasattr(first, 'week_hours'):
+            self.week_hours = sum(t.week_hours for t in tasks)
+            self.miss_week_cost = first.miss_week_cost
+
+    def isBatch(self):
+        return self.is_batch
+
+
+#what buildModel reads from a schedule, with aggregate tasks
+class _AggregateView(object):
+    def __init__(self, sched, completables, ongoings, current, perm):
+        for name in ('NUM_SCORES', 'DAILY_SCORE_TARGETS', 'MISS_DAILY_SCORE_COSTS', 'TIME_COST', 'UNSMOOTH_COST',
+        'SHIFT_COST', 'MAX_DAILY_HOURS', 'budget_days', 'committed_hours', 'week_offset'):
+            setattr(self, name, getattr(sched, name, None))
+        self.completables = completables
+        self.ongoings = ongoings
+        self.current_schedule = current
+        self.perm_task_time = perm
+
+
+#lists of task rows (rows offset by first) that go in one cluster
+def clusterTasks(tasks, whether, keys, score_tolerance, scale, first = 0):
+    groups = dict()
+    order = []
+    for k, task in enumerate(tasks):
+        key = (task.batch_hours, bool(task.isBatch()), whether[first + k].tobytes()) + keys[k]
+        if key not in groups:
+            groups[key] = []
+            order.append(key)
+        groups[key].append(k)
+    clusters = []
+    step = score_tolerance * scale
+    for key in order:
+        members = groups[key]
+        scores = np.array([list(tasks[k].scores) for k in members], dtype = float)
+        #leader clustering: a task joins the first cluster whose first task's
+        #scores are all within step of its own
+        leaders = []
+        found = []
+        for m in range(len(members)):
+            if leaders:
+                far = np.abs(scores[leaders] - scores[m]).max(axis = 1)
+                best = int(np.argmin(far))
+                if far[best] <= step:
+                    found[best].append(first + members[m])
+                    continue
+            leaders.append(m)
+            found.append([first + members[m]])
+        clusters += found
+    return clusters
+
+
+#batches each completable needs before its due date (as in the due rows)
+def _dueNeeds(completables, dues, num_days):
+    needs = np.zeros(len(completables))
+    for k in np.flatnonzero(dues > 0):
+        t = completables[k]
+        needs[k] = int(t.total_hours / t.batch_hours * float(min(dues[k], num_days)) / dues[k])
+    return needs
+
+
+#largest multiple of batch no more than hours, or hours for continuous tasks
+def _whole(hours, batch, is_batch):
+    if not is_batch or batch <= 0:
+        return max(hours, 0.0)
+    return max(np.floor(hours / batch + 1e-6) * batch, 0.0)
+
+
+#splits the hours per day H of a cluster of completables out to its members.
+#returns members x days hours and the hours left over
+def splitCompletables(H, tasks, dues, needs, whether, perm, num_days):
+    m = len(tasks)
+    hours = np.array(perm, dtype = float)
+    left_total = np.array([t.total_hours for t in tasks], dtype = float) - hours.sum(axis = 1)
+    #hours each member still needs before its due date
+    need = np.asarray(needs, dtype = float) * np.array([t.batch_hours for t in tasks]) - \
+        np.array([hours[i, :max(dues[i], 0)].sum() for i in range(m)])
+    due_order = np.where(dues > 0, dues, np.inf)
+    unplaced = 0.0
+    for j in range(num_days):
+        left = H[j] - hours[:, j].sum()
+        #up to what each member still needs before its due date first,
+        #earliest due first, then whatever room is left
+        short = [i for i in range(m) if need[i] > _EPS and dues[i] > j]
+        for pass_, order in ((0, short), (1, range(m))):
+            for i in sorted(order, key = lambda i: (due_order[i], i)):
+                if left <= _EPS:
+                    break
+                if not whether[i, j]:
+                    continue
+                t = tasks[i]
+                room = min(t.max_day_hours - hours[i, j], left_total[i])
+                if pass_ == 0:
+                    #need rounded up to whole batches
+                    room = min(room, np.ceil(need[i] / t.batch_hours - 1e-6) * t.batch_hours if t.isBatch() else
+                        need[i])
+                give = _whole(min(left, room), t.batch_hours, t.isBatch())
+                if give <= _EPS:
+                    continue
+                hours[i, j] += give
+                left -= give
+                left_total[i] -= give
+                if j < dues[i]:
+                    need[i] -= give
+        unplaced += max(left, 0.0)
+    return hours, unplaced
+
+
+#splits the hours per day H of a cluster of ongoings out to its members,
+#filling the members furthest below week_hours that week first. weeks start
+#week_offset days before day 0, and credit is what the members did in those
+def splitOngoings(H, tasks, whether, perm, num_days, week_offset = 0, credit = None):
+    m = len(tasks)
+    hours = np.array(perm, dtype = float)
+    targets = np.array([t.week_hours for t in tasks], dtype = float)
+    unplaced = 0.0
+    for j in range(num_days):
+        left = H[j] - hours[:, j].sum()
+        week = max(j - (j + week_offset) % 7, 0)
+        deficit = targets - hours[:, week:j + 1].sum(axis = 1)
+        if credit is not None and j + week_offset < 7:
+            deficit -= credit
+        order = sorted(range(m), key = lambda i: (-deficit[i], i))
+        #up to the deficit first, then whatever room is left
+        for pass_ in (0, 1):
+            for i in order:
+                if left <= _EPS:
+                    break
+                if not whether[i, j]:
+                    continue
+                t = tasks[i]
+                room = t.max_day_hours - hours[i, j]
+                if pass_ == 0:
+                    room = min(room, max(deficit[i], t.batch_hours if t.isBatch() else 0.0))
+                give = _whole(min(left, room), t.batch_hours, t.isBatch())
+                if give <= _EPS:
+                    continue
+                hours[i, j] += give
+                deficit[i] -= give
+                left -= give
+        unplaced += max(left, 0.0)
+    return hours, unplaced
+
+
+#Solves sched (with dues and whether from its prepared model) through an LP of
+#aggregate tasks. Returns (model, result): the full monolithic model and an
+#AggregateResult with the split schedule as column values of that model
+def solveAggregated(sched, dues, whether, score_tolerance = 0.05, due_window = 1, backend = None):
+    backend = getBackend(backend)
+    t = time.time()
+    completables = list(sched.completables)
+    ongoings = list(sched.ongoings)
+    tasks = completables + ongoings
+    nc = len(completables)
+    T = len(tasks)
+    D = sched.budget_days
+    dues = np.asarray(dues, dtype = np.int64).reshape(nc)
+    whether = np.asarray(whether, dtype = float).reshape(T, D)
+    current = np.asarray(sched.current_schedule, dtype = float).reshape(T, D)
+    perm = np.asarray(sched.perm_task_time, dtype = float).reshape(T, D)
+    scores = [abs(s) for task in tasks for s in task.scores]
+    scale = max([1.0] + scores)
+
+    window = max(int(due_window), 1)
+    due_keys = [(-1,) if d <= 0 else (min(d, D) // window,) for d in dues]
+    clusters = clusterTasks(completables, whether, due_keys, score_tolerance, scale)
+    clusters += clusterTasks(ongoings, whether, [(o.miss_week_cost,) for o in ongoings], score_tolerance, scale, nc)
+    cluster_of = np.zeros(T, dtype = np.int64)
+    for k, members in enumerate(clusters):
+        cluster_of[members] = k
+    K = len(clusters)
+    kc = sum(1 for members in clusters if members[0] < nc)
+
+    needs = _dueNeeds(completables, dues, D)
+    aggregates = []
+    agg_dues = np.zeros(kc, dtype = np.int64)
+    agg_needs = np.zeros(kc)
+    for k, members in enumerate(clusters):
+        group = [tasks[i] for i in members]
+        if k < kc:
+            aggregates.append(_AggregateTask(group, [g.total_hours for g in group]))
+            due = dues[members]
+            agg_dues[k] = due[due > 0].min() if (due > 0).any() else 0
+            agg_needs[k] = needs[members].sum()
+        else:
+            aggregates.append(_AggregateTask(group, [g.week_hours for g in group]))
+    agg_current = np.zeros((K, D))
+    np.add.at(agg_current, cluster_of, current)
+    agg_perm = np.zeros((K, D))
+    np.add.at(agg_perm, cluster_of, perm)
+    agg_whether = whether[[members[0] for members in clusters]].reshape(K, D)
+
+    view = _AggregateView(sched, aggregates[:kc], aggregates[kc:], agg_current, agg_perm)
+    credit = getattr(sched, 'week_credit', None)
+    if credit is not None:
+        credit = np.asarray(credit, dtype = float)
+        view.week_credit = np.zeros(K - kc)
+        np.add.at(view.week_credit, cluster_of[nc:] - kc, credit)
+    model = buildModel(view, agg_dues, agg_whether)
+    #each aggregate due row asks for what all its members need
+    due_rows = model.row_slices['due'].start + np.arange(len(model.due_rows))
+    model.row_lower[due_rows] = agg_needs[model.due_rows]
+    presolved = presolveModel(model)
+    result = presolved.expandResult(backend.solve(presolved.model))
+    if not result.isOptimal():
+        return None, AggregateResult(result.status, None, None, time.time() - t, backend.name,
+            "aggregate LP: %s" % result.message, clusters, result)
+    H = model.scheduleFromSolution(result.values)
+
+    hours = np.zeros((T, D))
+    unplaced = 0.0
+    for k, members in enumerate(clusters):
+        group = [tasks[i] for i in members]
+        if k < kc:
+            split, left = splitCompletables(H[k], group, dues[members], needs[members], whether[members],
+                perm[members], D)
+        else:
+            split, left = splitOngoings(H[k], group, whether[members], perm[members], D, view.week_offset or 0,
+                None if credit is None else credit[np.asarray(members) - nc])
+        hours[members] = split
+        unplaced += left
+
+    full, values, feasible = priceSchedule(sched, dues, whether, hours)
+    status = STATUS_NOT_SOLVED if feasible else STATUS_INFEASIBLE
+    message = "%d tasks in %d clusters" % (T, K)
+    if unplaced > 1e-6:
+        message += ", %.2f hours could not be split out" % unplaced
+    if not feasible:
+        message += ", split schedule violates the full model"
+    return full, AggregateResult(status, full.objectiveValue(values), values, time.time() - t, backend.name,
+        message, clusters, result, unplaced)
@@ -0,0 +1,130 @@
+"""
+Figures about a schedule's current_schedule, as array operations on the grid.
+
+ScheduleAnalytics reads the tasks x days hours once and works out, each with
+one numpy operation over the whole grid:
+
+- hours per day and per whole week (the weeks abval4 uses, which start
+  week_offset days before the schedule's start)
+- score totals per day, and their deviation from DAILY_SCORE_TARGETS (abval3
+  is the absolute value) with what the misses cost
+- the change in hours between consecutive days (abval1)
+- each ongoing's hours per week against week_hours (abval4), with the
+  week_credit of the days before the start in the first week
+- for each completable, hours still to schedule and the days between the last
+  day it is worked on and its due date
+
+days() yields the same figures one day at a time, and writeJsonLines and
+writeCsv write them out that way, one line or row per day, so a long schedule
+is never held as one string.
+"""
+
+import csv
+import json
+from datetime import timedelta
+
+import numpy as np
+
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+#completables worked on less than this in a day are left out of day records,
+#as in Schedule.__str__
+_MIN_HOURS = 1.0 / 60
+
+
+#file opened for writing text, or for csv.writer when for_csv
+def _openOutput(filename, for_csv = False):
+    return open(filename, "w", newline = "" if for_csv else None)
+
+
+class ScheduleAnalytics(object):
+    def __init__(self, sched):
+        self.completables = list(sched.completables)
+        self.ongoings = list(sched.ongoings)
+        self.tasks = self.completables + self.ongoings
+        self.start = sched.start
+        self.score_labels = tuple(sched.SCORE_LABELS[:sched.NUM_SCORES])
+        T, D, S = len(self.tasks), sched.budget_days, sched.NUM_SCORES
+        C = len(self.completables)
+        hours = np.zeros((T, D))
+        grid = np.asarray(sched.current_schedule, dtype = float)
+        if grid.ndim == 2:
+            hours[:min(T, grid.shape[0]), :min(D, grid.shape[1])] = grid[:T, :D]
+        #tasks x days
+        self.hours = hours
+        self.scores = np.array([list(t.scores)[:S] for t in self.tasks], dtype = float).reshape(T, S)
+        self.targets = np.asarray(sched.DAILY_SCORE_TARGETS[:S], dtype = float)
+        self.miss_costs = np.asarray(sched.MISS_DAILY_SCORE_COSTS[:S], dtype = float)
+
+        self.day_hours = hours.sum(axis = 0)
+        #days x scores
+        self.day_scores = hours.T.dot(self.scores)
+        self.score_deviations = self.day_scores - self.targets
+        self.day_miss_costs = np.abs(self.score_deviations).dot(self.miss_costs)
+        self.day_changes = np.abs(np.diff(self.day_hours))
+
+        #tasks x whole weeks, counted from week_offset days before the start
+        offset = getattr(sched, 'week_offset', 0) or 0
+        W = (D + offset) // 7
+        self.week_hours = np.hstack((np.zeros((T, offset)), hours))[:, :7 * W].reshape(T, W, 7).sum(axis = 2)
+        week_targets = np.repeat(np.array([o.week_hours for o in self.ongoings], dtype = float), W).reshape(T - C, W)
+        credit = getattr(sched, 'week_credit', None)
+        if credit is not None and W:
+            week_targets[:, 0] -= credit
+        #ongoings x weeks
+        self.week_deviations = self.week_hours[C:] - week_targets
+        #what the misses cost each ongoing over all the weeks
+        self.week_miss_costs = np.abs(self.week_deviations).sum(axis = 1) * \
+            np.array([o.miss_week_cost for o in self.ongoings], dtype = float)
+
+        done = hours[:C].sum(axis = 1)
+        self.remaining_hours = np.array([t.total_hours for t in self.completables], dtype = float) - done
+        #days from the schedule start to each due date (nan without one), and
+        #from the end of the last day worked on to it (nan if never worked on)
+        dues = [sched.due_dates.get(t, t.due) for t in self.completables]
+        self.due_days = np.array([np.nan if d is None else (d - sched.start).days for d in dues], dtype = float)
+        worked = hours[:C] > 1e-9
+        last = np.where(worked.any(axis = 1), D - 1 - np.argmax(worked[:, ::-1], axis = 1), -1)
+        self.due_slack = np.where(last >= 0, self.due_days - (last + 1), np.nan)
+
+    def date(self, j):
+        return self.start + timedelta(days = j)
+
+    #dict of the figures of day j
+    def day(self, j):
+        d = self.date(j)
+        column = self.hours[:, j]
+        C = len(self.completables)
+        shown = np.flatnonzero(np.concatenate((column[:C] >= _MIN_HOURS, column[C:] > 0)))
+        return {'date': d.isoformat(), 'weekday': WEEKDAYS[d.weekday()], 'hours': float(self.day_hours[j]),
+            'tasks': [{'name': self.tasks[i].name, 'hours': float(column[i])} for i in shown.tolist()],
+            'scores': dict(zip(self.score_labels, self.day_scores[j].tolist())),
+            'score_deviations': dict(zip(self.score_labels, self.score_deviations[j].tolist())),
+            'miss_cost': float(self.day_miss_costs[j])}
+
+    def days(self):
+        for j in range(self.hours.shape[1]):
+            yield self.day(j)
+
+    #one JSON object per day (see day) to output, a filename or a file
+    def writeJsonLines(self, output):
+        if not hasattr(output, 'write'):
+            with _openOutput(output) as f:
+                return self.writeJsonLines(f)
+        for record in self.days():
+            output.write(json.dumps(record, sort_keys = True) + "\n")
+
+    #one row per day to output, a filename or a file opened for csv: date,
+    #weekday, hours, score totals, score deviations, miss cost, and the hours
+    #of every task
+    def writeCsv(self, output):
+        if not hasattr(output, 'write'):
+            with _openOutput(output, True) as f:
+                return self.writeCsv(f)
+        writer = csv.writer(output)
+        writer.writerow(['date', 'weekday', 'hours'] + list(self.score_labels) +
+            [label + " deviation" for label in self.score_labels] + ['miss_cost'] + [t.name for t in self.tasks])
+        for j in range(self.hours.shape[1]):
+            d = self.date(j)
+            writer.writerow([d.isoformat(), WEEKDAYS[d.weekday()], self.day_hours[j]] + self.day_scores[j].tolist() +
+                self.score_deviations[j].tolist() + [self.day_miss_costs[j]] + self.hours[:, j].tolist())
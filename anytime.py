@@ -0,0 +1,133 @@
+"""
+Anytime solve for schedule MIPs (tasks with is_batch).
+
+A feasible schedule comes first, from the LP relaxation: batch counts are
+rounded down, rows that then fall short (due and perm rows) get batches back
+one at a time wherever max_day_hours, MAX_DAILY_HOURS and total_hours still
+allow it, and the continuous columns are re-solved with the batch counts
+fixed. The exact solver then starts from that schedule with what is left of
+the time budget and the requested gap. The better of the two schedules is
+returned; its bound is the solver's, or the relaxation's if that is tighter.
+"""
+
+import copy
+import time
+
+import numpy as np
+
+from solvers import SolveResult, STATUS_OPTIMAL, STATUS_NOT_SOLVED
+
+
+#copy of model with every column continuous
+def relaxedModel(model):
+    relaxed = copy.copy(model)
+    relaxed.integrality = np.zeros_like(model.integrality)
+    return relaxed
+
+
+#integer column values close to the relaxation values that keep every row on
+#x columns only (due, total, perm, day) satisfiable: lower bounds with the
+#continuous columns at their relaxation values, upper bounds with the
+#continuous columns at their lower bounds, since re-solving them can make
+#room. None if the rounding could not be repaired
+def roundRelaxation(model, values, tol = 1e-7):
+    A = model.A.tocsr()
+    x = np.array(values, dtype = float)
+    ints = np.flatnonzero(model.integrality)
+    floor = np.floor(x[ints] + tol)
+    fraction = x[ints] - floor
+    x[ints] = np.minimum(floor, np.floor(model.col_upper[ints] + tol))
+    fractions = np.zeros(model.num_cols)
+    fractions[ints] = fraction
+
+    #rows that the continuous abval columns cannot absorb
+    xs = model.col_slices['x']
+    entry_rows = np.repeat(np.arange(model.num_rows), np.diff(A.indptr))
+    outside = (A.indices < xs.start) | (A.indices >= xs.stop)
+    hard = np.bincount(entry_rows[outside], minlength = model.num_rows) == 0
+
+    activity = A.dot(x)
+    least = np.where(model.integrality, x, model.col_lower)
+    least_activity = A.dot(np.where(np.isfinite(least), least, 0.0))
+    A_cols = A.tocsc()
+
+    def fits(k):
+        if x[k] + 1 > model.col_upper[k] + tol:
+            return False
+        lo, hi = A_cols.indptr[k], A_cols.indptr[k + 1]
+        rows = A_cols.indices[lo:hi]
+        a = A_cols.data[lo:hi]
+        keep = hard[rows]
+        return not (np.any((least_activity[rows] + a)[keep & (a > 0)] > model.row_upper[rows][keep & (a > 0)] + tol) or
+            np.any((activity[rows] + a)[keep & (a < 0)] < model.row_lower[rows][keep & (a < 0)] - tol))
+
+    short = np.flatnonzero(hard & (activity < model.row_lower - tol))
+    for r in short:
+        lo, hi = A.indptr[r], A.indptr[r + 1]
+        candidates = [(fractions[k], a, k) for k, a in zip(A.indices[lo:hi], A.data[lo:hi])
+            if model.integrality[k] and a > 0]
+        #the columns the relaxation wanted most go first
+        candidates.sort(reverse = True)
+        for f, a, k in candidates:
+            while activity[r] < model.row_lower[r] - tol and fits(k):
+                x[k] += 1
+                ck = slice(A_cols.indptr[k], A_cols.indptr[k + 1])
+                activity[A_cols.indices[ck]] += A_cols.data[ck]
+                least_activity[A_cols.indices[ck]] += A_cols.data[ck]
+            if activity[r] >= model.row_lower[r] - tol:
+                break
+    if np.any(hard & ((activity < model.row_lower - tol) | (least_activity > model.row_upper + tol))):
+        return None
+    return x
+
+
+#Solves model within time_limit seconds (None for no limit), stopping early
+#once the relative gap is below gap. Returns a SolveResult with the best
+#schedule found and its bound; the status is optimal only if the solver
+#proved the gap
+def solveAnytime(model, backend, time_limit = None, gap = None, warm_start = None):
+    t = time.time()
+    if not model.isMip():
+        return backend.solve(model, warm_start, time_limit, gap)
+    #relaxation and rounding run on a separate backend so a persistent one
+    #keeps the model it already holds. they always run to the end, so there
+    #is a schedule even when the budget is smaller than they take
+    helper = backend.copy()
+    relaxation = helper.solve(relaxedModel(model))
+    solves = [relaxation]
+    bound = None
+    incumbent = None
+    if relaxation:
+        bound = relaxation.objective
+        x = roundRelaxation(model, relaxation.values)
+        if x is not None:
+            fixed = helper.solve(model.fixedIntegers(x))
+            solves.append(fixed)
+            if fixed:
+                incumbent = fixed
+                warm_start = fixed.values
+
+    result = None
+    remaining = None if time_limit is None else time_limit - (time.time() - t)
+    if remaining is None or remaining > 0:
+        result = backend.solve(model, warm_start, remaining, gap)
+        solves.append(result)
+        if result.bound is not None and (bound is None or result.bound > bound):
+            bound = result.bound
+
+    best = incumbent
+    source = "rounded relaxation"
+    if result is not None and result.values is not None and (best is None or result.objective <= best.objective):
+        best = result
+        source = result.backend
+    message = "no time left for the solver" if result is None else result.message
+    #iterations of every solve above; nodes of the exact one
+    counts = [r.iterations for r in solves if r.iterations is not None]
+    iterations = sum(counts) if counts else None
+    nodes = None if result is None else result.nodes
+    if best is None:
+        return SolveResult(result.status if result is not None else STATUS_NOT_SOLVED, None, None,
+        time.time() - t, backend.name, message, bound, iterations, nodes)
+    status = STATUS_OPTIMAL if result is not None and result.isOptimal() else STATUS_NOT_SOLVED
+    return SolveResult(status, best.objective, best.values, time.time() - t, backend.name,
+    "%s; best schedule from %s" % (message, source), bound, iterations, nodes)
@@ -0,0 +1,142 @@
+"""
+Days a task can be done on, as a boolean mask over a schedule's horizon.
+
+An Availability is a set of weekdays (gym on weekdays only: weekdays =
+range(5)), an RRULE of the days the task can be done on ("FREQ=WEEKLY;
+INTERVAL=2;BYDAY=SA" for every other Saturday), or both, in which case a day
+must pass both. Dates listed in dates are always available and dates in
+exclude never are.
+
+mask(start, num_days) is worked out with array operations for weekdays and
+for DAILY and WEEKLY rules with INTERVAL, BYDAY and UNTIL; other rules are
+expanded with dateutil over the horizon only. The last mask is kept, so tasks
+sharing one Availability pay for it once per horizon. Schedule.__makeWhether
+combines the masks with the prerequisite start days, and the model fixes the
+x columns of masked-out days at 0, so presolve drops them.
+
+An Availability should not be changed once made; make a new one instead.
+"""
+
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from ical_import import Recurrence, asDatetime
+
+DAY_CODES = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+#RRULE parts the vectorized masks understand
+_SIMPLE_PARTS = set(['FREQ', 'INTERVAL', 'BYDAY', 'UNTIL', 'WKST'])
+
+
+def _asDate(d):
+    return d.date() if isinstance(d, datetime) else d
+
+
+def _parseDate(text):
+    return datetime.strptime(text[:10], "%Y-%m-%d").date()
+
+
+class Availability(object):
+    def __init__(self, weekdays = None, rule = None, dtstart = None, dates = (), exclude = ()):
+        #days of the week (0 is Monday) the task can be done on, None for all
+        self.weekdays = None if weekdays is None else tuple(sorted(set(weekdays)))
+        #RRULE value of the days the task can be done on, counted from dtstart
+        self.rule = rule
+        self.dtstart = _asDate(dtstart) if dtstart is not None else date.today()
+        self.dates = frozenset(_asDate(d) for d in dates)
+        self.exclude = frozenset(_asDate(d) for d in exclude)
+        self._fields = None
+        if rule is not None:
+            self._fields = dict(p.split("=", 1) for p in rule.upper().split(";") if "=" in p)
+            if 'FREQ' not in self._fields:
+                raise ValueError("an availability rule needs a FREQ: %r" % rule)
+        #(start, num_days, mask) of the last call to mask
+        self._last = None
+
+    #boolean array of the days from start the task can be done on
+    def mask(self, start, num_days):
+        start = _asDate(start)
+        if self._last is not None and self._last[0] == start and self._last[1] == num_days:
+            return self._last[2]
+        days = np.arange(num_days)
+        mask = np.ones(num_days, dtype = bool)
+        if self.weekdays is not None:
+            table = np.zeros(7, dtype = bool)
+            table[list(self.weekdays)] = True
+            mask &= table[(start.weekday() + days) % 7]
+        if self.rule is not None:
+            mask &= self.__ruleMask(start, num_days)
+        for dates, value in ((self.dates, True), (self.exclude, False)):
+            for d in dates:
+                j = (d - start).days
+                if 0 <= j < num_days:
+                    mask[j] = value
+        mask.flags.writeable = False
+        self._last = (start, num_days, mask)
+        return mask
+
+    def __ruleMask(self, start, num_days):
+        fields = self._fields
+        freq = fields['FREQ']
+        if not (set(fields) <= _SIMPLE_PARTS and freq in ('DAILY', 'WEEKLY') and
+        all(code in DAY_CODES for code in fields.get('BYDAY', 'MO').split(","))):
+            #anything else goes through dateutil, over the horizon only
+            a = asDatetime(start)
+            occurrences = Recurrence(self.rule, asDatetime(self.dtstart)).between(a, a + timedelta(days = num_days))
+            mask = np.zeros(num_days, dtype = bool)
+            mask[[(_asDate(d) - start).days for d in occurrences]] = True
+            return mask
+        interval = int(fields.get('INTERVAL', 1))
+        #days from dtstart
+        offsets = (start - self.dtstart).days + np.arange(num_days)
+        mask = offsets >= 0
+        if 'UNTIL' in fields:
+            until = datetime.strptime(fields['UNTIL'][:8], "%Y%m%d").date()
+            mask &= offsets <= (until - self.dtstart).days
+        weekday = (self.dtstart.weekday() + offsets) % 7
+        if 'BYDAY' in fields:
+            table = np.zeros(7, dtype = bool)
+            table[[DAY_CODES.index(code) for code in fields['BYDAY'].split(",")]] = True
+            mask &= table[weekday]
+        elif freq == 'WEEKLY':
+            mask &= weekday == self.dtstart.weekday()
+        if freq == 'DAILY':
+            mask &= offsets % interval == 0
+        elif interval > 1:
+            #weeks start on WKST, Monday unless given
+            wkst = DAY_CODES.index(fields.get('WKST', 'MO'))
+            first = (self.dtstart.weekday() - wkst) % 7
+            mask &= ((offsets + first) // 7) % interval == 0
+        return mask
+
+    #hashable value of the availability; equal for equal availabilities
+    def key(self):
+        return (self.weekdays, self.rule, self.dtstart, self.dates, self.exclude)
+
+    #for the schedule file header
+    def asDict(self):
+        return {'weekdays': list(self.weekdays) if self.weekdays is not None else None, 'rule': self.rule,
+            'dtstart': self.dtstart.isoformat(), 'dates': sorted(d.isoformat() for d in self.dates),
+            'exclude': sorted(d.isoformat() for d in self.exclude)}
+
+    @staticmethod
+    def fromDict(values):
+        return Availability(values.get('weekdays'), values.get('rule'), _parseDate(values['dtstart']),
+            [_parseDate(d) for d in values.get('dates', [])], [_parseDate(d) for d in values.get('exclude', [])])
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_last'] = None
+        return state
+
+    def __repr__(self):
+        parts = []
+        if self.weekdays is not None:
+            parts.append("weekdays=%r" % (self.weekdays,))
+        if self.rule is not None:
+            parts.append("rule=%r" % self.rule)
+        return "Availability(%s)" % ", ".join(parts)
+
+
+WEEKDAYS_ONLY = Availability(weekdays = range(5))
+WEEKENDS_ONLY = Availability(weekdays = (5, 6))
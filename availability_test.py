@@ -0,0 +1,116 @@
+"""
+Checks Availability.mask against the days dateutil's rrule gives, over random
+weekdays, rules, dtstarts, dates and exclude, for the vectorized DAILY and
+WEEKLY rules and for the ones that go through dateutil.
+
+    python -m pytest availability_test.py (or python availability_test.py)
+"""
+
+import random
+import unittest
+from datetime import date, datetime, timedelta
+
+import numpy as np
+from dateutil.rrule import rrulestr
+
+from availability import Availability, DAY_CODES
+
+_DAY0 = date(2024, 3, 4)
+
+
+def _datetime(d):
+    return datetime(d.year, d.month, d.day)
+
+
+#a random RRULE value, MONTHLY ones for the dateutil path
+def _randomRule(rng):
+    freq = rng.choice(('DAILY', 'WEEKLY', 'WEEKLY', 'MONTHLY'))
+    parts = ["FREQ=" + freq]
+    if rng.random() < 0.6:
+        parts.append("INTERVAL=%d" % rng.randint(1, 4))
+    if freq == 'MONTHLY':
+        parts.append(rng.choice(("BYMONTHDAY=%d" % rng.randint(1, 28), "BYDAY=1%s" % rng.choice(DAY_CODES))))
+    elif rng.random() < 0.6:
+        parts.append("BYDAY=" + ",".join(rng.sample(DAY_CODES, rng.randint(1, 4))))
+    if rng.random() < 0.3:
+        until = _DAY0 + timedelta(days = rng.randint(-20, 60))
+        parts.append("UNTIL=" + until.strftime("%Y%m%d") + rng.choice(("", "T000000")))
+    if freq == 'WEEKLY' and rng.random() < 0.4:
+        parts.append("WKST=" + rng.choice(DAY_CODES))
+    rng.shuffle(parts)
+    return ";".join(parts)
+
+
+#the mask worked out day by day, with dateutil for the rule
+def _expected(availability, start, num_days):
+    days = [start + timedelta(days = j) for j in range(num_days)]
+    want = np.ones(num_days, dtype = bool)
+    if availability.weekdays is not None:
+        want &= np.array([d.weekday() in availability.weekdays for d in days], dtype = bool)
+    if availability.rule is not None:
+        rule = rrulestr("RRULE:" + availability.rule, dtstart = _datetime(availability.dtstart))
+        found = set(d.date() for d in rule.between(_datetime(start), _datetime(days[-1]), inc = True))
+        want &= np.array([d in found for d in days], dtype = bool)
+    for j, d in enumerate(days):
+        if d in availability.dates:
+            want[j] = True
+        if d in availability.exclude:
+            want[j] = False
+    return want
+
+
+class AvailabilityTest(unittest.TestCase):
+    def randomAvailability(self, rng):
+        weekdays = rng.sample(range(7), rng.randint(1, 7)) if rng.random() < 0.5 else None
+        rule = None
+        if weekdays is None or rng.random() < 0.5:
+            rule = _randomRule(rng)
+        dtstart = _DAY0 + timedelta(days = rng.randint(-40, 20))
+        near = [_DAY0 + timedelta(days = rng.randint(-5, 40)) for k in range(rng.randint(0, 4))]
+        dates = near[:len(near) // 2]
+        exclude = near[len(near) // 2:]
+        return Availability(weekdays, rule, dtstart, dates, exclude)
+
+    def testMasks(self):
+        rng = random.Random(0)
+        for n in range(400):
+            availability = self.randomAvailability(rng)
+            for q in range(3):
+                start = _DAY0 + timedelta(days = rng.randint(-10, 30))
+                num_days = rng.randint(1, 60)
+                mask = availability.mask(start, num_days)
+                want = _expected(availability, start, num_days)
+                self.assertTrue(np.array_equal(mask, want), (availability.asDict(), start, num_days,
+                    np.flatnonzero(mask != want)))
+
+    def testSimpleRules(self):
+        #every DAILY and WEEKLY shape mask works out itself, against dateutil
+        rng = random.Random(1)
+        for freq in ('DAILY', 'WEEKLY'):
+            for interval in range(1, 5):
+                for wkst in DAY_CODES:
+                    byday = ",".join(rng.sample(DAY_CODES, rng.randint(1, 3)))
+                    rule = "FREQ=%s;INTERVAL=%d;BYDAY=%s;WKST=%s" % (freq, interval, byday, wkst)
+                    dtstart = _DAY0 + timedelta(days = rng.randint(-30, 10))
+                    availability = Availability(rule = rule, dtstart = dtstart)
+                    want = _expected(availability, _DAY0, 70)
+                    self.assertTrue(np.array_equal(availability.mask(_DAY0, 70), want), (rule, dtstart))
+
+    def testCacheAndKey(self):
+        rng = random.Random(2)
+        for n in range(100):
+            availability = self.randomAvailability(rng)
+            first = availability.mask(_DAY0, 30)
+            self.assertIs(availability.mask(_DAY0, 30), first)
+            self.assertFalse(first.flags.writeable)
+            other = availability.mask(_DAY0 + timedelta(days = 1), 30)
+            self.assertTrue(np.array_equal(other[:-1], first[1:]))
+            copy = Availability.fromDict(availability.asDict())
+            self.assertEqual(copy.key(), availability.key())
+            self.assertEqual(hash(copy.key()), hash(availability.key()))
+            self.assertTrue(np.array_equal(copy.mask(_DAY0, 30), first))
+        self.assertNotEqual(Availability(weekdays = (0,)).key(), Availability(weekdays = (1,)).key())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,5 @@
+"""
+Benchmarks for the scheduler. Run the modules from the repository root, e.g.
+
+    python -m benchmarks.build_scaling
+"""
@@ -0,0 +1,49 @@
+"""
+makeScheduleAggregated against the exact makeSchedule: cost of the schedule
+each one produces in the full model, solve time and number of clusters.
+
+    python -m benchmarks.aggregation_quality [--tasks 300] [--days 28] [--profiles 8] [--tolerance 0.05]
+"""
+
+import argparse
+import time
+
+from benchmarks.generator import randomSchedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--tasks", type = int, default = 300)
+    parser.add_argument("--days", type = int, default = 28)
+    parser.add_argument("--profiles", type = int, default = 8)
+    parser.add_argument("--tolerance", type = float, default = 0.05)
+    parser.add_argument("--due-window", type = int, default = 1)
+    parser.add_argument("--seeds", type = int, default = 3)
+    parser.add_argument("--backend", default = None)
+    parser.add_argument("--batch-fraction", type = float, default = 0.0)
+    args = parser.parse_args()
+
+    for seed in range(args.seeds):
+        make = lambda: randomSchedule(args.tasks, args.days, seed = seed, batch_fraction = args.batch_fraction,
+        score_profiles = args.profiles)
+        schedule = make()
+        t = time.time()
+        exact = schedule.makeSchedule(args.backend, incremental = False)
+        exact_time = time.time() - t
+
+        schedule = make()
+        t = time.time()
+        aggregated = schedule.makeScheduleAggregated(args.tolerance, args.due_window, args.backend)
+        aggregated_time = time.time() - t
+
+        if not exact or aggregated.values is None:
+            print("seed %d: exact %s, aggregated %s" % (seed, exact.message, aggregated.message))
+            continue
+        gap = (aggregated.objective - exact.objective) / max(abs(exact.objective), 1.0)
+        print("seed %d: exact %.6g in %.3fs, aggregated %.6g in %.3fs (%d tasks in %d clusters), gap %.2f%%, "
+        "speedup %.1fx" % (seed, exact.objective, exact_time, aggregated.objective, aggregated_time, args.tasks,
+        len(aggregated.clusters), 100 * gap, exact_time / max(aggregated_time, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""
+Throughput of Schedule.costOfBlocks over a batch of candidate blocks for
+different numbers of worker processes.
+
+    python -m benchmarks.block_throughput [--blocks 64] [--workers 1,2,4]
+"""
+
+import argparse
+import random
+import time
+
+from final_scheduler import Block
+from benchmarks.generator import randomSchedule, randomScores
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--tasks", type = int, default = 100)
+    parser.add_argument("--days", type = int, default = 28)
+    parser.add_argument("--blocks", type = int, default = 64)
+    parser.add_argument("--workers", default = "1,2,4")
+    parser.add_argument("--batch-fraction", type = float, default = 0.3)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    schedule = randomSchedule(args.tasks, args.days, batch_fraction = args.batch_fraction)
+    t = time.time()
+    schedule.makeSchedule()
+    print("base solve: %.3fs" % (time.time() - t))
+    blocks = [Block(name = "b" + str(k), start = schedule.indexToDate(rng.randrange(args.days)),
+        duration = rng.choice((0.5, 1.0, 2.0)), scores = randomScores(rng, 6), rr = None, task = None)
+        for k in range(args.blocks)]
+
+    baseline = None
+    for workers in [int(w) for w in args.workers.split(",")]:
+        t = time.time()
+        costs = schedule.costOfBlocks(blocks, workers = workers)
+        elapsed = time.time() - t
+        if baseline is None:
+            baseline = costs
+        same = all(abs(a - b) <= 1e-6 * max(1.0, abs(a)) for a, b in zip(costs, baseline))
+        print("workers %2d: %.3fs, %.1f blocks/s, matches first run: %s" % (workers, elapsed, len(blocks) / elapsed, same))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+"""
+Times model construction for the pulp and sparse builders over a grid of
+tasks x budget_days. Nothing is solved.
+
+    python -m benchmarks.build_scaling [--tasks 50,100,200] [--days 7,30,90]
+"""
+
+import argparse
+import time
+
+from benchmarks.generator import randomSchedule
+
+
+def timeIt(f):
+    t = time.time()
+    f()
+    return time.time() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--tasks", default = "25,50,100,200,400")
+    parser.add_argument("--days", default = "7,28,90")
+    parser.add_argument("--skip-pulp", action = "store_true", help = "only time the array builders")
+    args = parser.parse_args()
+
+    print("%6s %5s %10s %10s %10s %10s" % ("tasks", "days", "arrays", "sparse+lp", "pulp", "speedup"))
+    for num_tasks in [int(n) for n in args.tasks.split(",")]:
+        for budget_days in [int(d) for d in args.days.split(",")]:
+            schedule = randomSchedule(num_tasks, budget_days)
+            arrays = timeIt(schedule.makeModel)
+            sparse = timeIt(lambda: schedule.makeLpProblem("sparse"))
+            if args.skip_pulp:
+                print("%6d %5d %10.3f %10.3f %10s %10s" % (num_tasks, budget_days, arrays, sparse, "-", "-"))
+                continue
+            legacy = timeIt(lambda: schedule.makeLpProblem("pulp"))
+            print("%6d %5d %10.3f %10.3f %10.3f %9.1fx" % (num_tasks, budget_days, arrays, sparse, legacy, legacy / arrays))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Synthetic schedules for benchmarking.
+"""
+
+import math
+import random
+from datetime import date, timedelta
+
+import numpy as np
+
+from final_scheduler import Schedule, CompletableTask, OngoingTask
+
+
+def randomScores(rng, num_scores):
+    return tuple(float(rng.choice((0, 0, 5, 10, 50, 100))) for s in range(num_scores))
+
+
+#num_tasks tasks over budget_days days; roughly a third of them are ongoings.
+#batch_fraction of the tasks get integer batch counts. each task has
+#num_scores scores. due_slack scales how far past a completable's minimum
+#days its due date can fall (1.0 spreads dues up to a week past the horizon,
+#0.0 makes every due date as tight as it can be). prereq_density is the
+#fraction of the possible edges (from each completable to the ones before
+#it) in the prerequisite DAG. with score_profiles > 0, the tasks' scores are
+#drawn from that many score vectors, each score moved by up to 2%, as in a
+#schedule of many similar tasks
+def randomSchedule(num_tasks, budget_days, seed = 0, start = None, batch_fraction = 0.3, num_scores = 6,
+due_slack = 1.0, prereq_density = 0.0, score_profiles = 0):
+    rng = random.Random(seed)
+    scores = lambda: randomScores(rng, num_scores)
+    if score_profiles > 0:
+        #profiles and noise come from their own stream
+        profile_rng = random.Random(seed + 1)
+        profiles = [randomScores(profile_rng, num_scores) for p in range(score_profiles)]
+        scores = lambda: tuple(s * (1 + profile_rng.uniform(-0.02, 0.02)) for s in profile_rng.choice(profiles))
+    if start is None:
+        start = date.today()
+    num_ongoings = num_tasks // 3
+    num_completables = num_tasks - num_ongoings
+    #keep completable work around 6 hours a day so instances stay feasible
+    max_batches = max(1, min(12, int(2 * 6.0 * budget_days / (num_completables * 0.625 + 1)) - 1))
+    completables = []
+    for i in range(num_completables):
+        batch_hours = rng.choice((0.25, 0.5, 0.75, 1.0))
+        max_day_hours = rng.choice((2, 4, 24))
+        total_hours = batch_hours * rng.randint(1, max_batches)
+        min_days = int(math.ceil(total_hours / max_day_hours))
+        completables.append(CompletableTask(name = "c" + str(i), max_day_hours = max_day_hours,
+        max_block_length = 24, min_block_length = 0, is_batch = rng.random() < batch_fraction, batch_hours = batch_hours,
+        scores = scores(), due = start + timedelta(days = rng.randint(min_days + 1,
+        min_days + 1 + int(round(due_slack * max(budget_days + 6 - min_days, 0))))),
+        total_hours = total_hours, prereqs = set()))
+    ongoings = []
+    for i in range(num_ongoings):
+        ongoings.append(OngoingTask(name = "o" + str(i), max_day_hours = rng.choice((1, 3, 6)), max_block_length = 24,
+        min_block_length = 0, is_batch = rng.random() < batch_fraction, batch_hours = rng.choice((0.25, 0.5, 1.0)),
+        scores = scores(), week_hours = rng.choice((1.5, 3.0, 7.0)), miss_week_cost = rng.choice((100, 500))))
+    if prereq_density > 0:
+        #separate stream so the tasks are the same with and without prereqs
+        dag_rng = np.random.RandomState(seed)
+        for i in range(1, num_completables):
+            k = dag_rng.binomial(i, prereq_density)
+            completables[i].prereqs = set(completables[p] for p in dag_rng.choice(i, k, replace = False))
+    targets = dict()
+    if num_scores != 6:
+        targets = dict(SCORE_LABELS = tuple("score" + str(s) for s in range(num_scores)),
+        DAILY_SCORE_TARGETS = tuple(rng.choice((50, 200, 700)) for s in range(num_scores)),
+        MISS_DAILY_SCORE_COSTS = tuple(rng.choice((50, 200, 1000)) for s in range(num_scores)))
+    schedule = Schedule(start = start, budget_days = budget_days, MAX_DAILY_HOURS = 14.0,
+    current_schedule = [], perm_task_time = [], completables = [], ongoings = [], flex_blocks = [], perm_blocks = [], **targets)
+    schedule.addCompletables(completables)
+    schedule.addOngoings(ongoings)
+    return schedule
@@ -0,0 +1,49 @@
+"""
+Latency of makeSchedule after editing one task, with the persistent model
+(patched in place and warm-started) against a cold rebuild and solve.
+
+    python -m benchmarks.resolve_latency [--tasks 200] [--days 28] [--edits 10]
+"""
+
+import argparse
+import random
+import time
+
+from benchmarks.generator import randomSchedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--tasks", type = int, default = 200)
+    parser.add_argument("--days", type = int, default = 28)
+    parser.add_argument("--edits", type = int, default = 10)
+    parser.add_argument("--backend", default = None)
+    parser.add_argument("--batch-fraction", type = float, default = 0.0)
+    args = parser.parse_args()
+
+    rng = random.Random(1)
+    schedule = randomSchedule(args.tasks, args.days, batch_fraction = args.batch_fraction)
+    t = time.time()
+    result = schedule.makeSchedule(args.backend)
+    print("first solve (%s): %.3fs" % (result.backend, time.time() - t))
+
+    warm = 0.0
+    cold = 0.0
+    for k in range(args.edits):
+        task = rng.choice(schedule.completables)
+        task.total_hours += task.batch_hours
+        t = time.time()
+        result = schedule.makeSchedule()
+        warm += time.time() - t
+        warm_cost = result.objective
+        update = schedule.last_update[0]
+
+        t = time.time()
+        result = schedule.makeSchedule(incremental = False)
+        cold += time.time() - t
+        print("edit %2d: %-8s warm %.6g cold %.6g" % (k, update, warm_cost, result.objective))
+    print("mean latency: warm %.3fs, cold %.3fs" % (warm / args.edits, cold / args.edits))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Rolling-horizon makeScheduleRolling against the monolithic makeSchedule:
+cost of the schedule each one produces in the full model, and solve time.
+
+    python -m benchmarks.rolling_quality [--tasks 60] [--days 56] [--window 14] [--step 7]
+"""
+
+import argparse
+import time
+
+from benchmarks.generator import randomSchedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--tasks", type = int, default = 60)
+    parser.add_argument("--days", type = int, default = 56)
+    parser.add_argument("--window", type = int, default = 14)
+    parser.add_argument("--step", type = int, default = 7)
+    parser.add_argument("--seeds", type = int, default = 3)
+    parser.add_argument("--backend", default = None)
+    parser.add_argument("--batch-fraction", type = float, default = 0.3)
+    args = parser.parse_args()
+
+    for seed in range(args.seeds):
+        schedule = randomSchedule(args.tasks, args.days, seed = seed, batch_fraction = args.batch_fraction)
+        t = time.time()
+        mono = schedule.makeSchedule(args.backend, incremental = False)
+        mono_time = time.time() - t
+
+        schedule = randomSchedule(args.tasks, args.days, seed = seed, batch_fraction = args.batch_fraction)
+        t = time.time()
+        rolling = schedule.makeScheduleRolling(args.window, args.step, args.backend)
+        rolling_time = time.time() - t
+
+        if not mono or rolling.values is None:
+            print("seed %d: monolithic %s, rolling %s" % (seed, mono.message, rolling.message))
+            continue
+        gap = (rolling.objective - mono.objective) / max(abs(mono.objective), 1.0)
+        print("seed %d: monolithic %.6g in %.3fs, rolling %.6g in %.3fs (%d windows), gap %.2f%%" % (seed,
+        mono.objective, mono_time, rolling.objective, rolling_time, len(rolling.windows), 100 * gap))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Throughput and latency of ScheduleService under bursts of requests from many
+users, against solving the same requests one after another from scratch.
+
+    python -m benchmarks.service_throughput [--users 8] [--bursts 4] [--workers 2]
+"""
+
+import argparse
+import time
+
+from schedule_service import ScheduleService
+from benchmarks.generator import randomSchedule
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--users", type = int, default = 8)
+    parser.add_argument("--tasks", type = int, default = 60)
+    parser.add_argument("--days", type = int, default = 28)
+    parser.add_argument("--bursts", type = int, default = 4)
+    parser.add_argument("--workers", type = int, default = 2)
+    parser.add_argument("--batch-fraction", type = float, default = 0.0)
+    args = parser.parse_args()
+
+    schedules = [randomSchedule(args.tasks, args.days, seed = u, batch_fraction = args.batch_fraction)
+        for u in range(args.users)]
+
+    #every burst each user edits one ongoing's weekly target and asks again
+    t = time.time()
+    for burst in range(args.bursts):
+        for s in schedules:
+            s.ongoings[burst % len(s.ongoings)].week_hours += 0.5
+            s.makeSchedule(incremental = False)
+    cold = time.time() - t
+
+    for s in schedules:
+        for k in range(args.bursts):
+            s.ongoings[k % len(s.ongoings)].week_hours -= 0.5
+    with ScheduleService(workers = args.workers) as service:
+        latencies = []
+        patched = 0
+        t = time.time()
+        for burst in range(args.bursts):
+            jobs = []
+            for u in range(args.users):
+                s = schedules[u]
+                s.ongoings[burst % len(s.ongoings)].week_hours += 0.5
+                jobs.append((time.time(), service.submit(u, s)))
+            for submitted, job in jobs:
+                result = job.wait()
+                latencies.append(time.time() - submitted)
+                patched += result.update is not None and result.update[0] == "patched"
+        served = time.time() - t
+
+    n = args.users * args.bursts
+    latencies.sort()
+    print("%d requests, %d workers" % (n, args.workers))
+    print("sequential cold solves: %.3fs (%.1f/s)" % (cold, n / cold))
+    print("service:                %.3fs (%.1f/s), %d of %d patched" % (served, n / served, patched, n))
+    print("latency median %.3fs, max %.3fs" % (latencies[len(latencies) // 2], latencies[-1]))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Benchmark suite: times each phase of makeSchedule over a grid of synthetic
+schedules and writes the results as JSON.
+
+Phases are timed separately: due assignment (the prerequisite graph), the
+rest of Schedule.prepareModel (whether and the grids), model build, presolve,
+solve and extraction of current_schedule. Every case runs in a fresh process
+so its peak resident memory can be reported. With --baseline the run is
+compared with an earlier results file and the exit status is 1 if any phase
+of any case slowed down by more than --threshold.
+
+    python -m benchmarks.suite [--tasks 50,200] [--days 7,28] [--out results.json]
+    python -m benchmarks.suite --baseline results.json [--threshold 0.25]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing
+import platform
+import resource
+import sys
+import time
+
+import numpy as np
+
+from benchmarks.generator import randomSchedule
+from sparse_model import buildModel
+from presolve import presolveModel
+from solvers import getBackend
+from solve_record import SolveRecord
+
+PHASES = ("assign_dues", "prepare", "build", "presolve", "solve", "extract")
+
+
+#parameters of every case of the grid given on the command line
+def cases(args):
+    grid = itertools.product(ints(args.tasks), ints(args.days), ints(args.scores), floats(args.prereq_density),
+        floats(args.batch_fraction), floats(args.due_slack))
+    out = []
+    for num_tasks, budget_days, num_scores, density, batch_fraction, due_slack in grid:
+        params = dict(num_tasks = num_tasks, budget_days = budget_days, num_scores = num_scores,
+            prereq_density = density, batch_fraction = batch_fraction, due_slack = due_slack, seed = args.seed)
+        out.append(params)
+    return out
+
+
+def ints(text):
+    return [int(v) for v in text.split(",")]
+
+
+def floats(text):
+    return [float(v) for v in text.split(",")]
+
+
+def caseName(params):
+    return "t%(num_tasks)d-d%(budget_days)d-s%(num_scores)d-p%(prereq_density)g-b%(batch_fraction)g-u%(due_slack)g" \
+        % params
+
+
+#phase -> seconds for one run of one case, plus what the solve found
+def runOnce(params, backend):
+    schedule = randomSchedule(params["num_tasks"], params["budget_days"], seed = params["seed"],
+        batch_fraction = params["batch_fraction"], num_scores = params["num_scores"],
+        due_slack = params["due_slack"], prereq_density = params["prereq_density"])
+    times = dict()
+    record = SolveRecord()
+    dues, whether = schedule.prepareModel(record)
+    times["assign_dues"] = record.phases["assign_dues"]
+    #whether, the grids and the week credit
+    times["prepare"] = sum(record.phases.values()) - times["assign_dues"]
+    t = time.time()
+    model = buildModel(schedule, dues, whether)
+    times["build"] = time.time() - t
+    t = time.time()
+    presolved = presolveModel(model)
+    times["presolve"] = time.time() - t
+    t = time.time()
+    result = presolved.expandResult(backend.solve(presolved.model))
+    times["solve"] = time.time() - t
+    t = time.time()
+    if result.values is not None:
+        schedule.current_schedule.assign(model.scheduleFromSolution(result.values))
+    times["extract"] = time.time() - t
+    info = dict(status = result.status, objective = result.objective, rows = model.num_rows, cols = model.num_cols,
+        nnz = int(model.A.nnz), integer_cols = int(np.count_nonzero(model.integrality)), backend = result.backend)
+    return times, info
+
+
+#runs a case repeat times in this process and sends back the fastest time of
+#each phase and the peak resident memory
+def _runCase(conn, params, backend, repeat):
+    try:
+        backend = getBackend(backend)
+        runs = [runOnce(params, backend) for r in range(repeat)]
+        phases = dict((p, min(times[p] for times, info in runs)) for p in PHASES)
+        phases["total"] = min(sum(times.values()) for times, info in runs)
+        #ru_maxrss is in kilobytes on Linux and bytes on macOS
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if sys.platform == "darwin":
+            peak //= 1024
+        conn.send(dict(name = caseName(params), params = params, phases = phases, peak_rss_kb = peak, **runs[0][1]))
+    except Exception as e:
+        conn.send(dict(name = caseName(params), params = params, error = repr(e)))
+    conn.close()
+
+
+def runCase(params, backend, repeat):
+    conn, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target = _runCase, args = (child, params, backend, repeat))
+    process.start()
+    result = conn.recv()
+    process.join()
+    return result
+
+
+#(case, phase, old, new) for every phase that is more than threshold slower
+#than in baseline. phases under min_seconds in both runs are too noisy to
+#compare and are skipped
+def regressions(results, baseline, threshold, min_seconds = 0.01):
+    old_cases = dict((case["name"], case) for case in baseline["cases"] if "phases" in case)
+    out = []
+    for case in results["cases"]:
+        old = old_cases.get(case["name"])
+        if old is None or "phases" not in case:
+            continue
+        for phase, new_time in sorted(case["phases"].items()):
+            old_time = old["phases"].get(phase)
+            if old_time is None or max(old_time, new_time) < min_seconds:
+                continue
+            if new_time > old_time * (1 + threshold):
+                out.append((case["name"], phase, old_time, new_time))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.strip().split("\n")[0])
+    parser.add_argument("--tasks", default = "50,200")
+    parser.add_argument("--days", default = "7,28")
+    parser.add_argument("--scores", default = "6")
+    parser.add_argument("--prereq-density", default = "0,0.02")
+    parser.add_argument("--batch-fraction", default = "0")
+    parser.add_argument("--due-slack", default = "1")
+    parser.add_argument("--seed", type = int, default = 0)
+    parser.add_argument("--repeat", type = int, default = 3, help = "runs per case; the fastest is kept")
+    parser.add_argument("--backend", default = None)
+    parser.add_argument("--out", default = None, help = "write the results here as JSON")
+    parser.add_argument("--baseline", default = None, help = "results file to compare with")
+    parser.add_argument("--threshold", type = float, default = 0.25, help = "allowed slowdown per phase, 0.25 = 25%%")
+    args = parser.parse_args()
+
+    results = dict(created = time.strftime("%Y-%m-%dT%H:%M:%S"), python = platform.python_version(),
+        numpy = np.__version__, platform = platform.platform(), backend = getBackend(args.backend).name, cases = [])
+    print("%-40s %11s %8s %8s %8s %8s %8s %9s" % (("case",) + PHASES + ("peak MB",)))
+    for params in cases(args):
+        case = runCase(params, args.backend, args.repeat)
+        results["cases"].append(case)
+        if "error" in case:
+            print("%-40s %s" % (case["name"], case["error"]))
+            continue
+        print("%-40s %11.3f %8.3f %8.3f %8.3f %8.3f %8.3f %9.1f" % ((case["name"],) +
+            tuple(case["phases"][p] for p in PHASES) + (case["peak_rss_kb"] / 1024.0,)))
+
+    if args.out is not None:
+        with open(args.out, "w") as output:
+            json.dump(results, output, indent = 1, sort_keys = True)
+
+    if args.baseline is not None:
+        with open(args.baseline) as input:
+            baseline = json.load(input)
+        slower = regressions(results, baseline, args.threshold)
+        for name, phase, old_time, new_time in slower:
+            print("REGRESSION %s %s: %.3fs -> %.3fs (+%.0f%%)" % (name, phase, old_time, new_time,
+            100 * (new_time / old_time - 1)))
+        if slower:
+            sys.exit(1)
+        print("no phase slower than %.0f%% of the baseline" % (100 * args.threshold))
+
+
+if __name__ == "__main__":
+    main()
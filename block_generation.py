@@ -0,0 +1,165 @@
+"""
+Turns the hours of current_schedule into time-of-day blocks.
+
+Each task's hours on a day are cut into chunks of whole batch_hours, as even
+as possible, with as few chunks as max_block_length allows, and the hours
+that are not whole batches go on the chunks with room; that keeps
+max_block_length always (unless one batch is longer) and min_block_length
+whenever the hours allow it.
+The chunks of the day are then packed first-fit decreasing into the free
+gaps of the day window, which is the window minus the time already committed
+to perm_blocks; a chunk that fits no gap whole is split over the largest
+gaps. Within a gap the chunks are ordered so that chunks of one task are not
+next to each other where that can be helped, since they would run together
+into a block longer than max_block_length. Hours that do not fit in the
+window are reported back instead of being placed.
+
+This is a greedy pass over each day's allocations, not a second solve: the
+LP has already decided how many hours go where.
+"""
+
+import heapq
+import math
+from datetime import timedelta
+
+import numpy as np
+
+_EPS = 1e-9
+
+
+#hours cut into the fewest equal pieces of at most max_length
+def _evenPieces(hours, max_length):
+    if hours <= 1e-6:
+        return []
+    n = int(math.ceil(hours / max_length - 1e-6))
+    return [hours / n] * n
+
+
+#lengths of the blocks hours is cut into, largest first: whole multiples of
+#unit, at most max_length, as few and as even as possible (which makes the
+#shortest one as long as it can be). hours that are not a multiple of unit
+#are shared out over the blocks that have room, using one more block if
+#they need it. a unit longer than max_length is never cut, so then the
+#blocks are one unit each (and longer than max_length)
+def chunkHours(hours, max_length, unit):
+    if unit <= 0:
+        unit = hours
+    units = int(math.floor(hours / unit + 1e-6))
+    rest = hours - units * unit
+    if units == 0:
+        return _evenPieces(hours, max_length)
+    if unit > max_length + 1e-9:
+        return [unit] * units + _evenPieces(rest, max_length)
+    max_units = int(math.floor(max_length / unit + 1e-6))
+    n = max(int(math.ceil(units / float(max_units))), int(math.ceil(hours / max_length - 1e-6)))
+    base, extra = divmod(units, n)
+    lengths = [unit * (base + 1)] * extra + [unit * base] * (n - extra)
+    if rest > 1e-6:
+        #shared out evenly over the blocks that still have room
+        while rest > 1e-9:
+            room = [k for k in range(n) if max_length - lengths[k] > 1e-9]
+            if not room:
+                #rounding
+                lengths[-1] += rest
+                break
+            share = rest / len(room)
+            for k in room:
+                add = min(max_length - lengths[k], share)
+                lengths[k] += add
+                rest -= add
+    else:
+        lengths[0] += rest
+    return sorted([length for length in lengths if length > 1e-6], reverse = True)
+
+
+#places chunks ((length, task, unit, min_length) tuples) into gaps ((start,
+#end) hours from midnight). returns the placements as (task, start, length)
+#and the hours of each task left over
+def packDay(chunks, gaps):
+    #[room left, chunks] of every gap
+    bins = [[end - start, []] for start, end in gaps]
+    unplaced = dict()
+    for length, task, unit, min_length in chunks:
+        fit = next((b for b in bins if b[0] >= length - _EPS), None)
+        if fit is not None:
+            fit[0] -= length
+            fit[1].append((length, task))
+            continue
+        #no gap takes it whole: pieces of whole units in the largest gaps
+        left = length
+        while left > _EPS and bins:
+            b = max(bins, key = lambda b: b[0])
+            piece = min(left, math.floor(b[0] / unit + 1e-6) * unit if unit > 0 else b[0])
+            if piece <= _EPS or piece < min(min_length, left) - _EPS:
+                break
+            b[0] -= piece
+            b[1].append((piece, task))
+            left -= piece
+        if left > _EPS:
+            unplaced[task] = unplaced.get(task, 0.0) + left
+    placed = []
+    for (start, end), (room, contents) in zip(gaps, bins):
+        t = start
+        for length, task in _alternate(contents):
+            placed.append((task, t, length))
+            t += length
+    return placed, unplaced
+
+
+#(length, task) chunks of one gap in an order where no two chunks of a task
+#are next to each other where that can be helped: each step takes the task
+#with the most chunks left (then the longest chunk) other than the last one
+#placed, from a heap that the last task is held back from
+def _alternate(contents):
+    left = dict()
+    for length, task in sorted(contents):
+        left.setdefault(task, []).append(length)
+    heap = [(-len(lengths), -lengths[-1], task) for task, lengths in left.items()]
+    heapq.heapify(heap)
+    out = []
+    held = None
+    while heap:
+        count, length, task = heapq.heappop(heap)
+        lengths = left[task]
+        out.append((lengths.pop(), task))
+        if held is not None:
+            heapq.heappush(heap, held)
+        held = (count + 1, -lengths[-1], task) if lengths else None
+    #only the held task is left
+    if held is not None:
+        task = held[2]
+        out += [(length, task) for length in reversed(left[task])]
+    return out
+
+
+#blocks for hours (a tasks x days array) over the days from day0: returns
+#(placed, unplaced), placed as (task index, start datetime, hours) and unplaced
+#as (task index, day, hours). committed is a time_set.TimeSet of time that is
+#not free, and blocks only go between day_start and day_end hours after midnight
+def generateBlocks(hours, tasks, day0, committed = None, day_start = 0.0, day_end = 24.0):
+    hours = np.asarray(hours, dtype = float)
+    placed = []
+    unplaced = []
+    units = [t.batch_hours for t in tasks]
+    limits = [(getattr(t, 'min_block_length', 0.0), getattr(t, 'max_block_length', 24.0) or 24.0) for t in tasks]
+    for j in range(hours.shape[1]):
+        rows = np.flatnonzero(hours[:, j] > 1e-6)
+        if not len(rows):
+            continue
+        day = day0 + timedelta(days = j)
+        window = (day + timedelta(hours = day_start), day + timedelta(hours = day_end))
+        if committed is not None:
+            gaps = [((a - day).total_seconds() / 3600.0, (b - day).total_seconds() / 3600.0)
+                for a, b in committed.free(*window)]
+        else:
+            gaps = [(day_start, day_end)]
+        chunks = []
+        for i in rows.tolist():
+            lengths = chunkHours(hours[i, j], limits[i][1], units[i])
+            #the k-th chunks of all tasks come before their (k+1)-th ones of equal length
+            chunks += [(length, k, i) for k, length in enumerate(lengths)]
+        chunks.sort(key = lambda c: (-c[0], c[1], c[2]))
+        day_placed, day_unplaced = packDay([(length, i, units[i], limits[i][0]) for length, k, i in chunks], gaps)
+        placed += [(i, day + timedelta(hours = start), length) for i, start, length in day_placed]
+        unplaced += [(i, j, left) for i, left in sorted(day_unplaced.items())]
+    return placed, unplaced
@@ -0,0 +1,151 @@
+"""
+Property checks of block_generation over random days: blocks stay out of
+committed time and each other, keep min/max_block_length and whole batches
+where the hours allow, and placed plus unplaced hours add up to the grid.
+
+    python -m pytest block_generation_test.py (or python block_generation_test.py)
+"""
+
+import math
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from block_generation import chunkHours, generateBlocks
+from time_set import TimeSet, TimeInterval
+
+_TOL = 1e-6
+
+
+class _Task(object):
+    def __init__(self, batch_hours, min_block_length, max_block_length):
+        self.batch_hours = batch_hours
+        self.min_block_length = min_block_length
+        self.max_block_length = max_block_length
+
+
+def _isWhole(length, unit):
+    return abs(length / unit - round(length / unit)) < _TOL
+
+
+#whether hours (whole units) can be cut into whole-unit pieces between
+#min_length and max_length
+def _splittable(hours, min_length, max_length, unit):
+    units = int(round(hours / unit))
+    low = int(math.ceil(min_length / unit - _TOL))
+    high = int(math.floor(max_length / unit + _TOL))
+    return any(k * low <= units <= k * high for k in range(1, units + 1))
+
+
+class ChunkHoursTest(unittest.TestCase):
+    def testLengths(self):
+        rng = random.Random(0)
+        for n in range(5000):
+            unit = rng.choice((0.25, 0.5, 0.75, 1.0, 2.0))
+            max_length = rng.choice((0.5, 1.0, 1.5, 2.0, 3.0, 24.0))
+            if rng.random() < 0.5:
+                hours = unit * rng.randint(1, 20)
+            else:
+                hours = round(rng.uniform(0.01, 12.0), 4)
+            lengths = chunkHours(hours, max_length, unit)
+            case = (hours, max_length, unit, lengths)
+            self.assertAlmostEqual(sum(lengths), hours, 6, case)
+            self.assertTrue(all(length > 0 for length in lengths), case)
+            self.assertEqual(lengths, sorted(lengths, reverse = True), case)
+            if unit <= max_length:
+                self.assertTrue(max(lengths) <= max_length + _TOL, case)
+            else:
+                #a batch is never cut
+                self.assertTrue(all(length <= max(unit, max_length) + _TOL for length in lengths), case)
+            if _isWhole(hours, unit):
+                self.assertTrue(all(_isWhole(length, unit) for length in lengths), case)
+                self.assertEqual(len(lengths), int(math.ceil(hours / unit / max(math.floor(max_length / unit + _TOL),
+                    1) - _TOL)), case)
+
+    def testMinLength(self):
+        rng = random.Random(1)
+        for n in range(5000):
+            unit = rng.choice((0.25, 0.5, 1.0))
+            max_length = unit * rng.randint(1, 8)
+            min_length = unit * rng.randint(0, int(round(max_length / unit)))
+            hours = unit * rng.randint(1, 30)
+            lengths = chunkHours(hours, max_length, unit)
+            if _splittable(hours, min_length, max_length, unit):
+                self.assertTrue(min(lengths) >= min_length - _TOL, (hours, min_length, max_length, unit, lengths))
+
+
+class GenerateBlocksTest(unittest.TestCase):
+    def check(self, seed, whole):
+        rng = random.Random(seed)
+        np_rng = np.random.RandomState(seed)
+        T, D = rng.randint(1, 12), rng.randint(1, 10)
+        tasks = []
+        for i in range(T):
+            unit = rng.choice((0.25, 0.5, 1.0))
+            max_length = rng.choice((unit, 1.0, 1.5, 2.0, 24.0))
+            tasks.append(_Task(unit, rng.choice((0.0, unit, 1.0)), max_length))
+        hours = np_rng.uniform(0, 3, (T, D)) * (np_rng.rand(T, D) < 0.5)
+        if whole:
+            hours = np.array([np.round(hours[i] / t.batch_hours) * t.batch_hours for i, t in enumerate(tasks)])
+        day0 = datetime(2024, 3, 4)
+        day_start, day_end = 7.0, 23.0
+        committed = TimeSet()
+        for j in range(D):
+            for k in range(rng.randint(0, 4)):
+                start = day0 + timedelta(days = j, hours = rng.uniform(0, 23))
+                committed.add(TimeInterval(start, start + timedelta(hours = rng.choice((0.5, 1.0, 2.5)))))
+        placed, unplaced = generateBlocks(hours, tasks, day0, committed, day_start, day_end)
+
+        done = np.zeros((T, D))
+        for i, start, length in placed:
+            j = (start - day0).days
+            end = start + timedelta(hours = length)
+            day = day0 + timedelta(days = j)
+            self.assertTrue(length > 0)
+            self.assertTrue(start >= day + timedelta(hours = day_start) - timedelta(seconds = 1))
+            self.assertTrue(end <= day + timedelta(hours = day_end) + timedelta(seconds = 1))
+            self.assertFalse(committed.overlaps(start + timedelta(seconds = 1), end - timedelta(seconds = 1)),
+                (i, start, length))
+            t = tasks[i]
+            if t.batch_hours <= t.max_block_length:
+                self.assertTrue(length <= t.max_block_length + _TOL, (i, start, length, t.max_block_length))
+            if whole:
+                self.assertTrue(_isWhole(length, t.batch_hours), (i, start, length, t.batch_hours))
+            done[i, j] += length
+        #no two blocks overlap
+        spans = sorted((start, start + timedelta(hours = length)) for i, start, length in placed)
+        for (a, b), (c, d) in zip(spans, spans[1:]):
+            self.assertTrue(c >= b - timedelta(seconds = 1), ((a, b), (c, d)))
+        for i, j, left in unplaced:
+            self.assertTrue(left > 0)
+            done[i, j] += left
+        self.assertTrue(np.allclose(done, hours, atol = _TOL), (done, hours))
+
+    def testRandomDays(self):
+        for seed in range(300):
+            self.check(seed, False)
+
+    def testWholeBatches(self):
+        for seed in range(300):
+            self.check(seed, True)
+
+    #blocks of a day without committed time keep min and max_block_length
+    def testLimitsInFreeDay(self):
+        rng = random.Random(2)
+        for n in range(500):
+            unit = rng.choice((0.25, 0.5, 1.0))
+            max_length = unit * rng.randint(1, 6)
+            task = _Task(unit, unit * rng.randint(0, int(round(max_length / unit))), max_length)
+            hours = unit * rng.randint(1, 16)
+            placed, unplaced = generateBlocks(np.array([[hours]]), [task], datetime(2024, 3, 4))
+            self.assertFalse(unplaced)
+            lengths = [length for i, start, length in placed]
+            self.assertTrue(max(lengths) <= max_length + _TOL, (hours, task.__dict__, lengths))
+            if _splittable(hours, task.min_block_length, max_length, unit):
+                self.assertTrue(min(lengths) >= task.min_block_length - _TOL, (hours, task.__dict__, lengths))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+Prices a calendar block against a solved schedule model.
+
+A block commits hours (with the block's scores) on the days it falls on,
+which only moves the right-hand sides of those days' rows: the MAX_DAILY_HOURS
+row, the abval3 score-target rows and the abval1 smoothness rows on either
+side of each day.
+The change in cost is estimated from the duals of the base solve. The
+estimate is exact when the optimal basis stays primal feasible after the
+move, which is checked directly with one solve against the factored basis
+(the joint version of the per-row ranging intervals).
+"""
+
+import multiprocessing
+
+import numpy as np
+import scipy.sparse as sp
+from scipy.sparse.linalg import splu
+
+from solvers import HighsBackend
+
+
+class BlockPrice(object):
+    def __init__(self, cost, exact, method, reason = ""):
+        self.cost = cost
+        #True when cost is the optimal change in objective, not just an estimate
+        self.exact = exact
+        #"dual" for the dual-price estimate, "resolve" for a re-solve
+        self.method = method
+        self.reason = reason
+
+    def __repr__(self):
+        return "BlockPrice(cost=%r, exact=%r, method=%s)" % (self.cost, self.exact, self.method)
+
+
+#rows touched by committing hours with scores on day j, and the change of each
+#row's (upper) bound. scores None (a block without a task, e.g. from
+#importIcal) touches no score rows
+def blockRowDeltas(model, j, hours, scores):
+    rows = []
+    deltas = []
+    rows.append(model.row_slices['day'].start + j)
+    deltas.append(-hours)
+    S = model.num_scores if scores is not None else 0
+    for s in range(S):
+        k = float(scores[s]) * hours
+        if k != 0.0:
+            rows += [model.row_slices['abval3_pos'].start + j * S + s, model.row_slices['abval3_neg'].start + j * S + s]
+            deltas += [-k, k]
+    #hours on day j enter abval1 row j as today and row j - 1 as tomorrow
+    if j < model.num_days - 1:
+        rows += [model.row_slices['abval1_pos'].start + j, model.row_slices['abval1_neg'].start + j]
+        deltas += [-hours, hours]
+    if j > 0:
+        rows += [model.row_slices['abval1_pos'].start + j - 1, model.row_slices['abval1_neg'].start + j - 1]
+        deltas += [hours, -hours]
+    return np.array(rows, dtype = np.int64), np.array(deltas)
+
+
+#blockRowDeltas for hours spread over several days, day_hours being (j, hours)
+#pairs. a row touched from more than one day gets the sum of the deltas
+def spanRowDeltas(model, day_hours, scores):
+    parts = [blockRowDeltas(model, j, hours, scores) for j, hours in day_hours]
+    rows, inverse = np.unique(np.concatenate([p[0] for p in parts]), return_inverse = True)
+    deltas = np.bincount(inverse, weights = np.concatenate([p[1] for p in parts]), minlength = len(rows))
+    return rows, deltas
+
+
+#sensitivity of a solved model: taken from the backend when it still holds the
+#optimal LP, otherwise from a separate HiGHS solve of the LP (with integer
+#columns fixed at values for a MIP). None if highspy is not installed
+def modelSensitivity(model, values, backend = None):
+    if isinstance(backend, HighsBackend):
+        sensitivity = backend.sensitivity(model)
+        if sensitivity is not None:
+            return sensitivity
+    pricer = HighsBackend()
+    if not pricer.available():
+        return None
+    lp = model.fixedIntegers(values) if model.isMip() else model
+    if not pricer.solve(lp):
+        return None
+    return pricer.sensitivity(lp)
+
+
+#dual-price estimate of moving the (upper) bounds of rows by deltas
+def priceRowDeltas(sensitivity, rows, deltas):
+    return float(np.dot(sensitivity.duals[rows], deltas))
+
+
+#basis matrix of [A, -I] (columns, then row logicals r = Ax) in the order of
+#sensitivity.basic_variables, factored once per sensitivity
+def _basisLu(model, sensitivity):
+    if sensitivity.basis_lu is None:
+        basic = sensitivity.basic_variables
+        A = model.A.tocsc()
+        logicals = -sp.identity(model.num_rows, format = 'csc')
+        columns = [A[:, k] if k >= 0 else logicals[:, -1 - k] for k in basic]
+        sensitivity.basis_lu = splu(sp.hstack(columns, format = 'csc'))
+    return sensitivity.basis_lu
+
+
+#True if the optimal basis of the base solve stays primal feasible when the
+#upper bounds of rows move by deltas, i.e. the dual estimate is exact
+def basisStaysFeasible(model, sensitivity, values, rows, deltas, tol = 1e-7):
+    basic = sensitivity.basic_variables
+    if len(basic) != model.num_rows:
+        return False
+    is_basic_row = np.zeros(model.num_rows, dtype = bool)
+    is_basic_row[-1 - basic[basic < 0]] = True
+    #a nonbasic row sits on its bound and moves with it
+    rhs = np.zeros(model.num_rows)
+    moving = ~is_basic_row[rows]
+    rhs[rows[moving]] = deltas[moving]
+    if not rhs.any():
+        step = np.zeros(len(basic))
+    else:
+        try:
+            step = _basisLu(model, sensitivity).solve(rhs)
+        except RuntimeError:
+            return False
+    activity = model.A.dot(values)
+    row_upper = model.row_upper.copy()
+    row_upper[rows] += deltas
+    cols = basic >= 0
+    new_x = np.asarray(values)[basic[cols]] + step[cols]
+    if np.any(new_x < model.col_lower[basic[cols]] - tol) or np.any(new_x > model.col_upper[basic[cols]] + tol):
+        return False
+    r = -1 - basic[~cols]
+    new_r = activity[r] + step[~cols]
+    return not (np.any(new_r < model.row_lower[r] - tol) or np.any(new_r > row_upper[r] + tol))
+
+
+#objective of model re-solved with the upper bounds of rows moved by deltas,
+#or None if that is not optimal. the bounds are put back afterwards. with a
+#time_limit or gap the best schedule found in time counts as well
+def resolveWithDeltas(model, values, backend, rows, deltas, time_limit = None, gap = None):
+    saved = model.row_upper[rows].copy()
+    model.row_upper[rows] += deltas
+    try:
+        result = backend.solve(model, values, time_limit, gap)
+    finally:
+        model.row_upper[rows] = saved
+    if result:
+        return result.objective
+    if (time_limit is not None or gap is not None) and result.values is not None:
+        return result.objective
+    return None
+
+
+#per-process copy of the base model, values, backend and limits for resolveAll
+_worker_state = None
+
+
+def _initWorker(model, values, backend, time_limit, gap):
+    global _worker_state
+    _worker_state = (model, values, backend, time_limit, gap)
+
+
+def _resolveJob(job):
+    model, values, backend, time_limit, gap = _worker_state
+    rows, deltas = job
+    return resolveWithDeltas(model, values, backend, rows, deltas, time_limit, gap)
+
+
+#re-solves model once per (rows, deltas) job and returns the objectives in job
+#order. with workers > 1 the jobs are spread over a process pool; each worker
+#gets its own copy of the model and backend once, and re-solves its jobs warm.
+#time_limit and gap apply to each re-solve
+def resolveAll(model, values, backend, jobs, workers = 1, time_limit = None, gap = None):
+    if workers <= 1 or len(jobs) <= 1:
+        return [resolveWithDeltas(model, values, backend, rows, deltas, time_limit, gap) for rows, deltas in jobs]
+    pool = multiprocessing.Pool(min(workers, len(jobs)), _initWorker, (model, values, backend, time_limit, gap))
+    try:
+        return pool.map(_resolveJob, jobs, chunksize = max(1, len(jobs) // (4 * workers)))
+    finally:
+        pool.close()
+        pool.join()
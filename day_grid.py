@@ -0,0 +1,172 @@
+"""
+Tasks x days float grid for current_schedule and perm_task_time.
+
+Rows are tasks in Schedule order (completables, then ongoings) and columns are
+days from the schedule start. The days live in a ring buffer: moving the start
+forward only moves the head, and the live window is copied back to the front
+once every few advances, so advancing costs O(1) per row and day amortized.
+The window always stays contiguous, so array() (and np.asarray(grid)) is a
+view that the model builders read without copying. Row capacity doubles as
+tasks are added.
+
+grid[i][j], len(grid), iteration over rows and tolist() work as they did on
+the old list-of-lists grids.
+"""
+
+import numpy as np
+
+
+class DayGrid(object):
+    def __init__(self, num_rows = 0, num_days = 0):
+        self.num_days = num_days
+        self._rows = num_rows
+        self._head = 0
+        self._data = np.zeros((max(num_rows, 4), num_days + DayGrid.slack(num_days)))
+
+    #spare columns kept after the window; the window is compacted once the
+    #head has moved through them
+    @staticmethod
+    def slack(num_days):
+        return max(7, num_days // 4)
+
+    #grid from a list of rows (or an array), trimmed or padded with zeros to
+    #num_rows x num_days. num_rows defaults to the number of rows given
+    @staticmethod
+    def fromRows(rows, num_days, num_rows = None):
+        if isinstance(rows, DayGrid):
+            rows = rows.array()
+        if num_rows is None:
+            num_rows = len(rows)
+        grid = DayGrid(num_rows, num_days)
+        a = grid.array()
+        if isinstance(rows, np.ndarray) and rows.ndim == 2:
+            n, d = min(num_rows, rows.shape[0]), min(num_days, rows.shape[1])
+            a[:n, :d] = rows[:n, :d]
+            return grid
+        for i in range(min(num_rows, len(rows))):
+            row = np.asarray(rows[i], dtype = float).ravel()[:num_days]
+            a[i, :len(row)] = row
+        return grid
+
+    def __len__(self):
+        return self._rows
+
+    #view of the live tasks x days window
+    def array(self):
+        return self._data[:self._rows, self._head:self._head + self.num_days]
+
+    def __array__(self, dtype = None):
+        a = self.array()
+        if dtype is not None and np.dtype(dtype) != a.dtype:
+            return a.astype(dtype)
+        return a
+
+    def __getitem__(self, index):
+        return self.array()[index]
+
+    def __setitem__(self, index, value):
+        self.array()[index] = value
+
+    def __iter__(self):
+        return iter(self.array())
+
+    def tolist(self):
+        return self.array().tolist()
+
+    @property
+    def nbytes(self):
+        return self._data.nbytes
+
+    #overwrites the window with a num_rows x num_days array
+    def assign(self, values):
+        self.array()[:] = values
+
+    def fill(self, value):
+        self.array().fill(value)
+
+    #grows the row capacity so that num_rows rows fit
+    def __reserve(self, num_rows):
+        capacity = self._data.shape[0]
+        if num_rows <= capacity:
+            return
+        data = np.zeros((max(num_rows, 2 * capacity), self._data.shape[1]))
+        data[:self._rows] = self._data[:self._rows]
+        self._data = data
+
+    #inserts a row of zeros (or values) before row index
+    def insertRow(self, index, values = None):
+        self.insertRows(index, 1, None if values is None else [values])
+
+    #inserts count rows of zeros (or a count x days array of values) before
+    #row index, moving the rows below once
+    def insertRows(self, index, count, values = None):
+        if count <= 0:
+            return
+        self.__reserve(self._rows + count)
+        d = self._data
+        d[index + count:self._rows + count] = d[index:self._rows]
+        d[index:index + count] = 0.0
+        self._rows += count
+        if values is not None:
+            self.array()[index:index + count] = values
+
+    def appendRow(self, values = None):
+        self.insertRow(self._rows, values)
+
+    #overwrites the rows at indices with values, a rows x days array whose
+    #first day is day offset of this grid; days outside the window are dropped
+    def setRows(self, indices, values, offset = 0):
+        values = np.asarray(values, dtype = float)
+        lo = max(0, -offset)
+        hi = min(values.shape[1], self.num_days - offset) if values.ndim == 2 else lo
+        if len(indices) and hi > lo:
+            self.array()[np.asarray(indices)[:, None], np.arange(lo + offset, hi + offset)] = values[:, lo:hi]
+
+    #drops the rows at indices, keeping the order of the others
+    def removeRows(self, indices):
+        keep = np.ones(self._rows, dtype = bool)
+        keep[list(indices)] = False
+        num_rows = int(keep.sum())
+        self._data[:num_rows] = self._data[:self._rows][keep]
+        self._data[num_rows:self._rows] = 0.0
+        self._rows = num_rows
+
+    #moves the start forward by days; the days that come into the window at
+    #the end are zero
+    def advance(self, days):
+        if days <= 0:
+            return
+        d = self._data
+        D = self.num_days
+        if days >= D:
+            d[:self._rows] = 0.0
+            self._head = 0
+        elif self._head + days + D > d.shape[1]:
+            d[:self._rows, :D - days] = d[:self._rows, self._head + days:self._head + D]
+            d[:self._rows, D - days:] = 0.0
+            self._head = 0
+        else:
+            #columns after the window are always zero, so only the head moves
+            self._head += days
+
+    #trims or pads with zeros to num_rows x num_days
+    def resize(self, num_rows, num_days):
+        if num_days == self.num_days:
+            self.__reserve(num_rows)
+            if num_rows < self._rows:
+                self._data[num_rows:self._rows] = 0.0
+            self._rows = num_rows
+            return
+        grid = DayGrid.fromRows(self.array(), num_days, num_rows)
+        self.__dict__.update(grid.__dict__)
+
+    #only the live window is pickled
+    def __getstate__(self):
+        return {'num_days': self.num_days, 'array': self.array().copy()}
+
+    def __setstate__(self, state):
+        grid = DayGrid.fromRows(state['array'], state['num_days'])
+        self.__dict__.update(grid.__dict__)
+
+    def __repr__(self):
+        return "DayGrid(%d rows x %d days)" % (self._rows, self.num_days)
@@ -6,19 +6,13 @@ Created on Sat Sep 15 22:13:26 2018
 """
 
 #Next steps:
-#randomize basis matrix before solving
 #finish Block and RRule
-#read in ical to perm_blocks -- use ical package
-#transfer perm_blocks to perm_task_time right before makeSchedule()
 #transfer perm_blocks and flex_blocks into current_schedule right before makeSchedule()
 #approximate block repeats (eg "Do laundry every 6 to 8 days")
 #read ordered to-do list into CompletableTasks
 #ongoing benchmark -- completable task made from an ongoing task
 #block generation:
-    #algorithm that takes current_schedule and spits out blocks for each day, into flex_blocks
     #promotion from flex_blocks to perm_blocks
-#merge two schedule objects
-#whether_patterns for Tasks (use rrule?)
 #repeating Completable with no prereqs
 #repeating set of Completables with a single due date with no external prereqs
 #c++ branch and bound variant for acheiving min day hours 
@@ -29,7 +23,28 @@ from datetime import *
 from dateutil import *
 import random
 import math
-import cPickle as pickle
+import copy
+import numpy as np
+from sparse_model import buildModel, updateModel
+from solvers import getBackend, STATUS_NOT_SOLVED
+from block_pricing import BlockPrice, spanRowDeltas, priceRowDeltas, basisStaysFeasible, modelSensitivity, resolveAll
+from rolling_horizon import solveRolling
+from aggregation import solveAggregated
+from day_grid import DayGrid
+from prereq_graph import PrereqGraph
+from presolve import presolveModel
+from anytime import solveAnytime
+from solve_record import SolveRecord, NULL_RECORD
+from solution_cache import modelFingerprint, queryFingerprint
+from schedule_store import writeSchedule, readSchedule
+from ical_import import readEvents, Recurrence, asDatetime, hoursByDay
+from time_set import TimeSet, TimeInterval
+from block_generation import generateBlocks
+from scenarios import Scenario, runScenarios
+from task_registry import TaskRegistry
+from analytics import ScheduleAnalytics
+from availability import Availability, WEEKDAYS_ONLY, WEEKENDS_ONLY
+from history import ScheduleHistory
 
 
 class Block(object):
@@ -43,42 +58,90 @@ class Block(object):
         self.task = task
 
     def getNext(self):
-        if not self.rr.has_next():
+        if self.rr is None or not self.rr.has_next():
             return None
         return Block(name = self.name, start = self.rr.next(), duration = self.duration,
         scores = self.scores, rr = self.rr, task = self.task)
 
+    #start times of the occurrences of this block that overlap [a, b)
+    def occurrences(self, a, b):
+        length = timedelta(hours = self.duration)
+        start = asDatetime(self.start)
+        found = [start] if start < b and start + length > a else []
+        if self.rr is not None:
+            if start in getattr(self.rr.rr, 'exdates', ()):
+                found = []
+            found = sorted(set(found + self.rr.between(a - length, b)))
+        return found
+
     def generateTask(self): #TODO write this
         return self.task
-"""
-class TimeSet(object):
-    def __init__(self, intervals = set()):
-        self.intervals = intervals
-
-class TimeInterval(object):
 
-    def __init__(self, start, end):
-        self.start = start
-        self.end = end
-        self.duration = end - start
-"""
 
 #for blocks only!!
+#rr is a list of start times, a dateutil rule or an ical_import.Recurrence. it
+#is read lazily, one occurrence ahead of next()
 class RRule(object):
+    _END = object()
+    _iter = None
+    _ahead = _END
+
     def __init__(self, rr):
         self.rr = rr
         self.index = 0
-    def has_next(self): #TODO write this
-        return True
+
+    def __peek(self):
+        if self._iter is None:
+            self._iter = iter(self.rr)
+            for k in range(self.index):
+                next(self._iter, None)
+            self._ahead = next(self._iter, RRule._END)
+        return self._ahead
+
+    def has_next(self):
+        return self.__peek() is not RRule._END
+
     def next(self):
+        d = self.__peek()
+        if d is RRule._END:
+            raise StopIteration
+        self._ahead = next(self._iter, RRule._END)
         self.index += 1
-        return self.rr[self.index - 1]
+        return d
+
+    #occurrences in [a, b), without going through the ones before a when rr
+    #is a Recurrence
+    def between(self, a, b):
+        if isinstance(self.rr, Recurrence):
+            return self.rr.between(a, b)
+        if isinstance(self.rr, (list, tuple)):
+            return [d for d in map(asDatetime, self.rr) if a <= d < b]
+        return [d for d in self.rr.between(a, b, inc = True) if d < b]
+
+    #the rule as a value (its dates, or its RFC 5545 string) to compare blocks by
+    def key(self):
+        if isinstance(self.rr, Recurrence):
+            return (self.rr.rule, self.rr.dtstart, tuple(sorted(self.rr.exdates)), tuple(self.rr.rdates))
+        if isinstance(self.rr, (list, tuple)):
+            return tuple(self.rr)
+        return str(self.rr)
+
+    #the iterator is made again (from index) after unpickling
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.pop('_iter', None)
+        state.pop('_ahead', None)
+        return state
     
     
 
 class Task(object):
+    #availability.Availability of the days the task can be done on, None for
+    #every day. class-level default so tasks pickled before it existed still load
+    availability = None
+
     def __init__(self, name = "task", descr = "", max_day_hours = 24.0, max_block_length = 24.0, min_block_length = 0.0, is_batch = True,
-    batch_hours = 1.0/6, scores = (0.0,0.0,0.0,0.0,0.0,0.0)):
+    batch_hours = 1.0/6, scores = (0.0,0.0,0.0,0.0,0.0,0.0), availability = None):
         self.name = name
         self.descr = descr
         self.max_day_hours = max_day_hours
@@ -90,14 +153,16 @@ class Task(object):
         else:
             self.batch_hours = batch_hours
         self.scores = scores
+        self.availability = availability
     def isBatch(self):
         return self.is_batch
 
 class CompletableTask(Task):
     def __init__(self, name = "task", max_day_hours = 24, max_block_length = 24, min_block_length = 0, is_batch = False, batch_hours = 1.0,
-    scores = (0,0,0,0,0,0), due = None, total_hours = 0, prereqs = set()):
+    scores = (0,0,0,0,0,0), due = None, total_hours = 0, prereqs = set(), availability = None):
         super(CompletableTask, self).__init__(name = name, max_day_hours = max_day_hours,
-        max_block_length = max_block_length, min_block_length = min_block_length, is_batch = is_batch, batch_hours = batch_hours, scores = scores)
+        max_block_length = max_block_length, min_block_length = min_block_length, is_batch = is_batch, batch_hours = batch_hours, scores = scores,
+        availability = availability)
         self.due = due
         self.total_hours = total_hours
         self.prereqs = prereqs
@@ -117,9 +182,10 @@ class CompletableTask(Task):
 
 class OngoingTask(Task):
     def __init__(self, name, max_day_hours, max_block_length, min_block_length, is_batch, batch_hours,
-    scores, week_hours, miss_week_cost):
+    scores, week_hours, miss_week_cost, availability = None):
         super(OngoingTask, self).__init__(name = name,max_day_hours = max_day_hours,
-        max_block_length = max_block_length, min_block_length = min_block_length, is_batch = is_batch, batch_hours = batch_hours, scores = scores)
+        max_block_length = max_block_length, min_block_length = min_block_length, is_batch = is_batch, batch_hours = batch_hours, scores = scores,
+        availability = availability)
         self.week_hours = week_hours
         self.miss_week_cost = miss_week_cost
 
@@ -127,30 +193,90 @@ class Schedule:
     WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday','Thursday','Friday','Saturday','Sunday']
     BIG_M = 99999999.9
 
+    #model and solver kept between makeSchedule calls. class-level defaults so
+    #schedules pickled before these existed still load
+    _model = None
+    _model_tasks = None
+    _model_start = None
+    _backend = None
+    #column values and LP sensitivity of the last solve
+    _values = None
+    _sensitivity = None
+    #("patched", changed families), ("rebuilt", None) or None before the first solve
+    last_update = None
+    #prerequisite graph of the completables, kept between due assignments
+    _prereq_graph = None
+    #presolve.Presolved of the last makeSchedule with presolve; its
+    #removed_cols, removed_rows and removedByFamily() report what was dropped
+    last_presolve = None
+    #instrumentation (see solve_record.py): when record_solves is set or
+    #on_solve is a callable, makeSchedule keeps a SolveRecord of its phases,
+    #model size and solver counts in last_record and calls on_solve(self, record)
+    record_solves = False
+    on_solve = None
+    last_record = None
+    _record = NULL_RECORD
+    #solution_cache.SolutionCache consulted by makeSchedule and costOfBlocks
+    #before they solve, or None
+    solution_cache = None
+    #perm_blocks, task rows, start and days perm_task_time was last filled for
+    _perm_key = None
+    _perm_start = None
+    _perm_days = 0
+    #time_set.TimeSet of the occurrences of perm_blocks over the horizon (each
+    #interval's data is its block), the ones without a task of the schedule,
+    #and the hours of those on each day. filled with perm_task_time
+    committed = None
+    _untasked = None
+    committed_hours = None
+    #task_registry.TaskRegistry of completables and ongoings (see taskRegistry)
+    _registry = None
+    #tasks x days masks of the tasks' availability, and the start, days and
+    #patterns they were made for
+    _availability = None
+    _availability_key = None
+    #status of the last solve, whether it was proven optimal, its bound, and
+    #the (time_limit, gap) it had if any, which block re-solves get as well
+    _status = STATUS_NOT_SOLVED
+    _exact = False
+    _bound = None
+    _limits = None
+    #history.ScheduleHistory of the days bringUpToDate moved past, or None
+    history = None
+    #days of the current week (counted from history.origin) before start, and
+    #the hours each ongoing did in them; set by makeSchedule from history
+    week_offset = 0
+    week_credit = None
+
     @staticmethod
     def hoursToTimeString(hours):
-        return str(int(hours)) + ":" +\
-        str(int((hours - int(hours)) * 60)/10) +\
-        str(int((hours - int(hours)) * 60)%10)
+        return "%d:%02d" % (int(hours), int((hours - int(hours)) * 60))
 
+    #reads a schedule written by save, or pickled by an older version (see
+    #schedule_store.migrate to convert those)
     @staticmethod
     def loadSchedule(filename):
-        with open(filename, 'rb') as input:
-            return pickle.load(input)
+        return readSchedule(filename)
 
     #adds a row of zeros before index
     @staticmethod
     def addZerosRow(grid,index,num_zeros):
-        if len(grid) == 0:
+        if isinstance(grid, DayGrid):
+            grid.insertRow(index)
+        elif len(grid) == 0:
             grid.append([])
         else:
             grid.insert(index, [0.0 for h in range(num_zeros)])
 
     #deletes first J columns of a grid.
     #useful for removing past days from schedule
-    #column J not deleted
+    #column J not deleted. a DayGrid keeps its width, so J zero days are
+    #added at the end
     @staticmethod
     def deleteCol0ToJ(grid, J):
+        if isinstance(grid, DayGrid):
+            grid.advance(J)
+            return
         for i in range(len(grid)):
             for j in range(min(len(grid[i]),J)):
                 del(grid[i][0])
@@ -181,8 +307,8 @@ class Schedule:
         self.MAX_DAILY_HOURS = MAX_DAILY_HOURS
         self.start = start
         self.budget_days = budget_days
-        self.current_schedule = current_schedule
-        self.perm_task_time = perm_task_time
+        self.current_schedule = DayGrid.fromRows(current_schedule, budget_days)
+        self.perm_task_time = DayGrid.fromRows(perm_task_time, budget_days)
         self.completables = completables
         self.ongoings = ongoings
         self.due_dates = dict([(c,c.due) for c in completables])
@@ -190,135 +316,326 @@ class Schedule:
         self.perm_blocks = perm_blocks
         self.cost = -1
         self.is_up_to_date = False
-        self._grids = [self.current_schedule, self.perm_task_time]
         self._prereqs_prior_dues = dict()
 
         #TODO make sure tasks from blocks are included in completables/ongoings
 
     
     
+    #current_schedule and perm_task_time as DayGrids. grids set to lists (or
+    #loaded from schedules pickled with list grids) are converted here
+    def __grids(self):
+        if not isinstance(self.current_schedule, DayGrid):
+            self.current_schedule = DayGrid.fromRows(self.current_schedule, self.budget_days)
+        if not isinstance(self.perm_task_time, DayGrid):
+            self.perm_task_time = DayGrid.fromRows(self.perm_task_time, self.budget_days)
+        return [self.current_schedule, self.perm_task_time]
+
     def isDue(self, compl_task):
-        return not self.due_dates.has_key(compl_task) or not (self.due_dates[compl_task] is None)
+        return compl_task not in self.due_dates or not (self.due_dates[compl_task] is None)
 
 
-    def addCompletables(self, tasks):
+    #the TaskRegistry of completables and ongoings: stable task ids and the
+    #grid row of each task. reindexed here if the lists were replaced or
+    #changed length other than through the methods below
+    def taskRegistry(self):
+        if self._registry is None:
+            self._registry = TaskRegistry(self.completables, self.ongoings)
+        elif not self._registry.isCurrent(self.completables, self.ongoings):
+            self._registry.sync(self.completables, self.ongoings)
+        return self._registry
+
+    def taskRow(self, task):
+        return self.taskRegistry().rowOf(task)
+
+    def taskId(self, task):
+        return self.taskRegistry().idOf(task)
+
+    def taskById(self, task_id):
+        return self.taskRegistry().taskOf(task_id)
+
+    #tasks not in the schedule yet, each once
+    def __newTasks(self, tasks):
+        registry = self.taskRegistry()
+        new = []
+        seen = set()
         for task in tasks:
-            if task not in self.completables:
-                for grid in self._grids:
-                    Schedule.addZerosRow(grid, len(self.completables), self.budget_days)
-                self.completables.append(task)
+            if task not in registry and task not in seen:
+                seen.add(task)
+                new.append(task)
+        return new
+
+    def addCompletables(self, tasks):
+        new = self.__newTasks(tasks)
+        if new:
+            for grid in self.__grids():
+                grid.insertRows(min(len(self.completables), len(grid)), len(new))
+            self.completables.extend(new)
+            for task in new:
                 self.due_dates[task] = task.due
+            self._registry.appended(len(new), 0)
         self.is_up_to_date = False
 
     def addOngoings(self, tasks):
-        for task in tasks:
-            if task not in self.ongoings:
-                for grid in self._grids:
-                    Schedule.addZerosRow(grid, len(grid), self.budget_days)
-                self.ongoings.append(task)
+        new = self.__newTasks(tasks)
+        if new:
+            for grid in self.__grids():
+                grid.insertRows(len(grid), len(new))
+            self.ongoings.extend(new)
+            self._registry.appended(0, len(new))
         self.is_up_to_date = False
 
+    #removes tasks (completables or ongoings) and their grid rows; tasks not
+    #in the schedule are ignored. returns the tasks removed
+    def removeTasks(self, tasks):
+        registry = self.taskRegistry()
+        rows = set(registry.rowOf(task) for task in tasks if task in registry)
+        if not rows:
+            return []
+        for grid in self.__grids():
+            grid.removeRows([i for i in rows if i < len(grid)])
+        C = len(self.completables)
+        removed = [t for i, t in enumerate(self.completables + self.ongoings) if i in rows]
+        self.completables = [t for i, t in enumerate(self.completables) if i not in rows]
+        self.ongoings = [t for i, t in enumerate(self.ongoings) if C + i not in rows]
+        for task in removed:
+            self.due_dates.pop(task, None)
+        registry.sync(self.completables, self.ongoings)
+        self.is_up_to_date = False
+        return removed
+
+    #a new schedule with the tasks, grids, blocks and due dates of this one and
+    #of other, which must have as many scores. tasks are matched by identity; a
+    #task in both keeps this schedule's rows, due date and id. other's days are
+    #lined up by date and the ones outside this schedule's horizon dropped. the
+    #constants, start and budget_days are this schedule's
+    def merge(self, other):
+        if other.NUM_SCORES != self.NUM_SCORES:
+            raise ValueError("cannot merge a schedule with %d scores into one with %d" % (other.NUM_SCORES,
+                self.NUM_SCORES))
+        mine = self.taskRegistry()
+        theirs = other.taskRegistry()
+        new_completables = [t for t in other.completables if t not in mine]
+        new_ongoings = [t for t in other.ongoings if t not in mine]
+        completables = self.completables + new_completables
+        ongoings = self.ongoings + new_ongoings
+        C = len(self.completables)
+        #rows of other's new tasks in other and in the merged schedule
+        src = [theirs.rowOf(t) for t in new_completables + new_ongoings]
+        dst = list(range(C, C + len(new_completables))) + list(range(len(completables) + len(self.ongoings),
+            len(completables) + len(ongoings)))
+        grids = []
+        for grid, their_grid in zip(self.__grids(), other.__grids()):
+            grid = DayGrid.fromRows(grid, self.budget_days, len(mine))
+            grid.insertRows(C, len(new_completables))
+            grid.insertRows(len(grid), len(new_ongoings))
+            pairs = [(i, k) for i, k in zip(src, dst) if i < len(their_grid)]
+            if pairs:
+                grid.setRows([k for i, k in pairs], their_grid.array()[[i for i, k in pairs]],
+                    (other.start - self.start).days)
+            grids.append(grid.array())
+        blocks = []
+        for name in ('flex_blocks', 'perm_blocks'):
+            seen = set(id(b) for b in getattr(self, name))
+            blocks.append(getattr(self, name) + [b for b in getattr(other, name) if id(b) not in seen])
+        merged = Schedule(SHIFT_COST = self.SHIFT_COST, TIME_COST = self.TIME_COST,
+            UNSMOOTH_COST = self.UNSMOOTH_COST, SCORE_LABELS = self.SCORE_LABELS,
+            DAILY_SCORE_TARGETS = self.DAILY_SCORE_TARGETS, MISS_DAILY_SCORE_COSTS = self.MISS_DAILY_SCORE_COSTS,
+            MAX_DAILY_HOURS = self.MAX_DAILY_HOURS, start = self.start, budget_days = self.budget_days,
+            current_schedule = grids[0], perm_task_time = grids[1], completables = completables,
+            ongoings = ongoings, flex_blocks = blocks[0], perm_blocks = blocks[1])
+        merged.due_dates = dict(other.due_dates)
+        merged.due_dates.update(self.due_dates)
+        merged._registry = TaskRegistry(completables, ongoings, mine.ids())
+        #our ids, so our history
+        merged.history = copy.deepcopy(self.history)
+        return merged
+
     def bringUpToDate(self):
         #move start date
         #delete tasks that were already due
         #delete past columns of grids, add up to budget_days
         today = date.today()
-        for grid in self._grids:
-            Schedule.deleteCol0ToJ(grid, self.dateToIndex(today))
-            for i in grid:
-                i += [0.0 for j in range(self.dateToIndex(today))]
+        J = self.dateToIndex(today)
+        perm_filled = self._perm_key == self.__permKey() and self._perm_start == self.start
+        if J > 0:
+            self.__archive(min(J, self.budget_days))
+        for grid in self.__grids():
+            Schedule.deleteCol0ToJ(grid, J)
         if self.start < date.today():
             self.start = date.today()
-        self.completables = [c for c in self.completables if c.due is None or self.dateToIndex(c.due) <= 0]
+        self.removeTasks([t for t in self.completables if not (t.due is None or self.dateToIndex(t.due) > 0)])
+        #perm_task_time moved with the other grids, so only its new days need filling
+        if perm_filled:
+            if J > 0:
+                self._perm_days = max(self._perm_days - J, 0)
+            self._perm_start = self.start
+            self._perm_key = self.__permKey()
+        self.is_up_to_date = False
         
         
 
+    #moves the first num_days days of current_schedule into history
+    def __archive(self, num_days):
+        if self.history is None:
+            self.history = ScheduleHistory()
+        tasks = self.completables + self.ongoings
+        registry = self.taskRegistry()
+        grid = self.__grids()[0].array()
+        hours = np.zeros((len(tasks), num_days))
+        hours[:min(len(tasks), len(grid))] = grid[:len(tasks), :num_days]
+        scores = [list(t.scores)[:self.NUM_SCORES] for t in tasks]
+        self.history.archive(self.start, hours, [registry.idOf(t) for t in tasks],
+            np.array(scores, dtype = float).reshape(len(tasks), self.NUM_SCORES))
+
+    #week_offset and week_credit from history
+    def __weekCredit(self):
+        self.week_offset = 0
+        self.week_credit = None
+        if self.history is None or not len(self.history) or self.start < self.history.origin:
+            return
+        week_start = self.history.weekStart(self.start)
+        self.week_offset = (self.start - week_start).days
+        if self.week_offset:
+            registry = self.taskRegistry()
+            self.week_credit = np.array([self.history.hours(registry.idOf(o), week_start, self.start)
+                for o in self.ongoings])
+
     def __str__(self):
-        out = ""
+        stats = self.analytics()
+        C = len(self.completables)
+        out = []
         for j in range(self.budget_days):
-            out += Schedule.WEEKDAYS[self.indexToDate(j).weekday()] + " " + str(self.indexToDate(j))
-            total_hours = 0
-            for i in range(len(self.completables)):
-                if self.current_schedule[i][j] >= 1.0/60:
-                    out += "\n" + self.completables[i].name + " "
-                    out += Schedule.hoursToTimeString(self.current_schedule[i][j])
-                    total_hours += self.current_schedule[i][j]
-            for i in range(len(self.ongoings)):
-                if self.current_schedule[i + len(self.completables)][j] > 0:
-                    out += "\n" + self.ongoings[i].name + " "
-                    out += Schedule.hoursToTimeString(self.current_schedule[i + len(self.completables)][j])
-                    total_hours += self.current_schedule[i + len(self.completables)][j]
-            out += "\nscore totals: "
-            for s in range(self.NUM_SCORES):
-                total = 0
-                for i in range(len(self.completables)):
-                    total += self.completables[i].scores[s] * self.current_schedule[i][j]
-                for i in range(len(self.ongoings)):
-                    total += self.ongoings[i].scores[s] * self.current_schedule[i + len(self.completables)][j]
-                out += str(int(total)) + " "
-            out += "\ntotal time: " + Schedule.hoursToTimeString(total_hours)
-            out += "\n\n"
-        return out
-
+            out.append(Schedule.WEEKDAYS[self.indexToDate(j).weekday()] + " " + str(self.indexToDate(j)))
+            column = stats.hours[:, j]
+            shown = np.flatnonzero(np.concatenate((column[:C] >= 1.0/60, column[C:] > 0)))
+            for i in shown.tolist():
+                out.append("\n" + stats.tasks[i].name + " " + Schedule.hoursToTimeString(column[i]))
+            #added up task by task as before, so int() truncates the same totals
+            totals = np.cumsum(column[:, None] * stats.scores, axis = 0)[-1] if len(column) else stats.day_scores[j]
+            out.append("\nscore totals: " + "".join(str(int(total)) + " " for total in totals))
+            #of the hours shown above
+            out.append("\ntotal time: " + Schedule.hoursToTimeString(sum(column[shown].tolist())) + "\n\n")
+        return "".join(out)
+
+    #analytics.ScheduleAnalytics of current_schedule: hours, score totals and
+    #their misses per day and week, due date slack, and JSON lines or CSV export
+    def analytics(self):
+        self.__grids()
+        return ScheduleAnalytics(self)
+
+    #writes the schedule in the columnar format of schedule_store; solver
+    #state is not saved
     def save(self, filename):
-        with open(filename, 'wb') as output:
-            pickle.dump(self, output, pickle.HIGHEST_PROTOCOL)
+        writeSchedule(self, filename)
+
+    #reads the VEVENTs of an iCalendar (a filename, or an open file or other
+    #iterable of lines) into perm_blocks, streaming. match(event) gives the task
+    #an event's time counts toward, by default the task named by its SUMMARY;
+    #events without one are kept as blocks without a task. events over before
+    #start are skipped and recurrences are only expanded over the horizon (see
+    #ical_import). returns the blocks added
+    def importIcal(self, source, match = None):
+        if match is None:
+            tasks = dict((t.name, t) for t in self.completables + self.ongoings)
+            match = lambda event: tasks.get(event.summary)
+        lines = open(source) if isinstance(source, (str, type(u""))) else source
+        added = []
+        try:
+            for event in readEvents(lines, since = asDatetime(self.start)):
+                task = match(event)
+                rr = RRule(event.recurrence) if event.recurrence is not None else None
+                added.append(Block(name = event.summary, start = event.start, duration = event.hours,
+                    scores = task.scores if task is not None else None, rr = rr, task = task))
+        finally:
+            if lines is not source:
+                lines.close()
+        self.perm_blocks = self.perm_blocks + added
+        self.is_up_to_date = False
+        return added
 
 
     #Assigns due dates to prerequisite tasks. Original due dates
     #are stored in self._prereqs_prior_dues and should be restored
     #after the schedule is calculated.
     def __assignDues(self):
-        self.due_dates = dict([(c,c.due) for c in self.completables])
-        returnval = True
-        for c in self.completables:
-            if self.isDue(c):
-                if not self.__assignDuesAux(c,dict()):
-                    returnval = False
-        
-        return returnval
-
-    def __assignDuesAux(self, compl_task, cache):
-        if not self.due_dates.has_key(compl_task):
-            return False
-        num_days = (self.due_dates[compl_task] - self.start).days
-        if num_days < compl_task.minDays():
-            return False
-
-        square_one_time = 0
-        if cache.has_key(compl_task):
-            square_one_time = cache[compl_task]
-        else:
-            square_one_time = compl_task.getHoursFromSquareOne()
-        cache[compl_task] = square_one_time
-        last_days = int(math.floor(num_days * compl_task.total_hours / square_one_time))
-        pre_due = self.due_dates[compl_task] - timedelta(days = last_days)
-        for p in compl_task.prereqs:
-            if self.due_dates[p] is None or pre_due < self.due_dates[p]:
-                self.due_dates[p] = pre_due
-            if not self.__assignDuesAux(p, cache):
-                return False
-        return True
-
+        if self._prereq_graph is None:
+            self._prereq_graph = PrereqGraph()
+        self._prereq_graph.refresh(self.completables, self.start)
+        self.due_dates = self._prereq_graph.dueDates()
+        return not self._prereq_graph.infeasible()
+
+    #tasks x days array, 1 on the days a task can be done: days its
+    #availability allows (or perm_blocks give it time on) from the day its
+    #prerequisites are due
     def __makeWhether(self):
-        whether = [[1 for j in range(self.budget_days)] for i in
-        range(len(self.completables) + len(self.ongoings))]
-        for i in range(len(self.completables)):
-            start_index = 0
-            for c in self.completables[i].prereqs:
-                if not self.isDue(c):
-                    start_index = self.budget_days
-                    break
-                else:
-                    start_index = max(start_index, self.dateToIndex(self.due_dates[c]) - 1)
-            for j in range(min(start_index, self.budget_days)):
-                whether[i][j] = 0
-        return whether
-
+        tasks = self.completables + self.ongoings
+        D = self.budget_days
+        key = (self.start, D, tuple(t.availability.key() if t.availability is not None else None for t in tasks))
+        if key != self._availability_key:
+            available = np.ones((len(tasks), D), dtype = bool)
+            for i, t in enumerate(tasks):
+                if t.availability is not None:
+                    available[i] = t.availability.mask(self.start, D)
+            self._availability = available
+            self._availability_key = key
+        whether = self._availability | (self.perm_task_time.array() > 0)
+        C = len(self.completables)
+        start_indices = np.asarray(self._prereq_graph.startIndices(D), dtype = np.int64).reshape(C)
+        whether[:C] &= np.arange(D)[None, :] >= start_indices[:, None]
+        return whether.astype(float)
+
+    #perm_blocks and the tasks by value, with tasks as their registry ids, so
+    #the key still matches after the schedule is pickled and loaded
+    def __permKey(self):
+        registry = self.taskRegistry()
+        blocks = tuple((b.start, b.duration, b.rr.key() if b.rr is not None else None,
+            registry.idOf(b.task) if b.task in registry else None) for b in self.perm_blocks)
+        return (blocks, tuple(registry.idOf(t) for t in self.completables + self.ongoings))
+
+    #fills perm_task_time with the hours of the occurrences of perm_blocks,
+    #split at midnight, and committed with the occurrences themselves. if the
+    #blocks, tasks and start are the ones it was last filled for, only the days
+    #added since (by bringUpToDate or a longer budget_days) are expanded
     def __makePermTaskTime(self):
-        num_tasks = len(self.completables) + len(self.ongoings)
-        self.perm_task_time= [[0.0 for j in range(self.budget_days)] for i in range(num_tasks)]
-        #TODO read in perm_blocks
+        tasks = self.completables + self.ongoings
+        self.perm_task_time.resize(len(tasks), self.budget_days)
+        day0 = asDatetime(self.start)
+        key = self.__permKey()
+        first = 0
+        if key == self._perm_key and self.start == self._perm_start and self._perm_days <= self.budget_days \
+        and self.committed is not None:
+            first = self._perm_days
+            self.committed.removeBefore(day0)
+            self._untasked.removeBefore(day0)
+        else:
+            self.perm_task_time.fill(0.0)
+            self.committed = TimeSet()
+            self._untasked = TimeSet()
+        if first < self.budget_days:
+            hours = self.perm_task_time.array()
+            rows = dict((id(t), i) for i, t in enumerate(tasks))
+            a = day0 + timedelta(days = first)
+            b = day0 + timedelta(days = self.budget_days)
+            added = []
+            for block in self.perm_blocks:
+                i = rows.get(id(block.task))
+                length = timedelta(hours = block.duration)
+                for t in block.occurrences(a, b):
+                    #occurrences running into a from before it are in committed already
+                    if t >= a or first == 0:
+                        added.append(TimeInterval(t, t + length, block))
+                    if i is None:
+                        continue
+                    for j, h in hoursByDay(t, block.duration, day0, first, self.budget_days):
+                        hours[i, j] += h
+            self.committed.update(added)
+            self._untasked.update(interval for interval in added if id(interval.data.task) not in rows)
+        #blocks without a task of the schedule take their time out of MAX_DAILY_HOURS
+        self.committed_hours = self._untasked.dayHours(day0, self.budget_days)
+        self._perm_key = key
+        self._perm_start = self.start
+        self._perm_days = self.budget_days
 
     def dateToIndex(self, d):
         return (d - self.start).days
@@ -326,8 +643,101 @@ class Schedule:
     def indexToDate(self, j):
         return self.start + timedelta(days = j)
 
-    #make schedule matrix and store it in current_schedule
-    def makeSchedule(self):
+    #sets dues, makes whether, trims current_schedule and fills perm_task_time.
+    #returns (dues, whether) for the model builders (see sparse_model.buildModel).
+    #a solve_record.SolveRecord given as record gets the time of each step
+    def prepareModel(self, record = None):
+        if record is None:
+            record = self._record
+        num_completables = len(self.completables)
+        num_tasks = num_completables + len(self.ongoings)
+
+        #set dues
+        with record.phase("assign_dues"):
+            self.__assignDues()
+            dues = [0 for c in self.completables]
+            for i in range(num_completables):
+                if self.isDue(self.completables[i]):
+                    dues[i] = self.dateToIndex(self.due_dates[self.completables[i]])
+
+        #trim current_schedule to proper dimensions
+        with record.phase("grids"):
+            self.__grids()
+            self.current_schedule.resize(num_tasks, self.budget_days)
+            self.__makePermTaskTime()
+
+        #make whether
+        with record.phase("make_whether"):
+            whether = self.__makeWhether()
+
+        #credit the hours already done this week
+        with record.phase("week_credit"):
+            self.__weekCredit()
+        return dues, whether
+
+    #builds the schedule LP as sparse arrays (see sparse_model.ScheduleModel)
+    def makeModel(self):
+        dues, whether = self.prepareModel()
+        return buildModel(self, dues, whether)
+
+    #returns (model, warm_start), reusing the previous model when possible
+    def __currentModel(self, incremental):
+        dues, whether = self.prepareModel()
+        tasks = self.completables + self.ongoings
+        previous = self._model
+        if not incremental:
+            previous = None
+        record = self._record
+        if previous is not None and self._model_tasks == tasks and self._model_start == self.start:
+            with record.phase("patch"):
+                changed = updateModel(previous, self, dues, whether)
+            if changed is not None:
+                self.last_update = ("patched", changed)
+                with record.phase("warm_start"):
+                    return previous, previous.completeSolution(self.current_schedule)
+        with record.phase("build"):
+            self._model = buildModel(self, dues, whether)
+        self._model_tasks = tasks
+        self._model_start = self.start
+        self.last_update = ("rebuilt", None)
+        if previous is None:
+            return self._model, None
+        with record.phase("warm_start"):
+            return self._model, self._model.completeSolution(self.current_schedule)
+
+    #takes over the model and backend of other, an earlier copy of this
+    #schedule (e.g. unpickled from an earlier request), so that makeSchedule
+    #patches and warm starts instead of rebuilding. tasks are matched by
+    #position, type and name; if they do not match only the backend is kept
+    #(when it is the same kind as ours). returns whether the model was taken over
+    def adoptSolverState(self, other):
+        backend = other._backend
+        if backend is not None and (self._backend is None or (type(self._backend) is type(backend) and
+        self._backend.options == backend.options)):
+            self._backend = backend
+        tasks = self.completables + self.ongoings
+        theirs = other._model_tasks
+        if other._model is None or theirs is None or len(theirs) != len(tasks) or other._model_start != self.start:
+            return False
+        for mine, their in zip(tasks, theirs):
+            if type(mine) is not type(their) or mine.name != their.name:
+                return False
+        self._model = other._model
+        self._model_tasks = tasks
+        self._model_start = other._model_start
+        self._values = other._values
+        self.last_presolve = other.last_presolve
+        return True
+
+    #builds the pulp problem without solving it. returns (problem, x, whether)
+    #where x[i][j] is the decision variable for task i on day j.
+    #builder is "pulp" (one LpVariable per cell) or "sparse" (vectorized arrays)
+    def makeLpProblem(self, builder = "pulp"):
+        if builder == "sparse":
+            model = self.makeModel()
+            problem, variables = model.toLpProblem()
+            x = [variables[i * self.budget_days:(i + 1) * self.budget_days] for i in range(model.num_tasks)]
+            return problem, x, model.whether.tolist()
         #build the parameters
         num_completables = len(self.completables)
         num_ongoings = len(self.ongoings)
@@ -336,15 +746,8 @@ class Schedule:
         ong_batches = [o.batch_hours for o in self.ongoings]
         batches = compl_batches + ong_batches
 
-        #set dues
-        self.__assignDues()
-        dues = [0 for c in self.completables]
-        for i in range(num_completables):
-            if self.isDue(self.completables[i]):
-                dues[i] = self.dateToIndex(self.due_dates[self.completables[i]])
-
-        #make whether
-        whether = self.__makeWhether()
+        dues, whether = self.prepareModel()
+        whether = whether.tolist()
         
         total_hours = [c.total_hours for c in self.completables]
         
@@ -360,15 +763,6 @@ class Schedule:
 
         ong_wheth = [whether[i + num_completables] for i in range(num_ongoings)]
         
-        #trim current_schedule to proper dimensions
-        temp = [[0.0 for j in range(self.budget_days)] for i in range(num_tasks)]
-        for i in range(min(num_tasks,len(self.current_schedule))):
-            for j in range(min(self.budget_days,len(self.current_schedule[i]))):
-                temp[i][j] = self.current_schedule[i][j]
-        self.current_schedule = temp
-
-        self.__makePermTaskTime()
-        
         #build lp
         
         problem = LpProblem("Schedule", LpMinimize)
@@ -407,7 +801,7 @@ class Schedule:
 
         abval3 = [[LpVariable("abval3" + str(j) + str(s), 0, None, LpContinuous) for s in range(self.NUM_SCORES)] for j in range(self.budget_days)]
 
-        abval4 = [[LpVariable("abval4" + str(i) + str(w), 0, None, LpContinuous) for w in range(self.budget_days / 7)] for i in range(num_ongoings)]
+        abval4 = [[LpVariable("abval4" + str(i) + str(w), 0, None, LpContinuous) for w in range(self.budget_days // 7)] for i in range(num_ongoings)]
 
         # build objective
         line1 = LpAffineExpression([(a, self.UNSMOOTH_COST) for a in abval1])
@@ -418,7 +812,7 @@ class Schedule:
 
         line4 = lpSum([LpAffineExpression([(abval3[j][s], self.MISS_DAILY_SCORE_COSTS[s]) for s in range(self.NUM_SCORES)]) for j in range(self.budget_days)])
 
-        line5 = lpSum([LpAffineExpression([(abval4[i][w], miss_week_costs[i]) for w in range(self.budget_days/7)]) for i in range(num_ongoings)])
+        line5 = lpSum([LpAffineExpression([(abval4[i][w], miss_week_costs[i]) for w in range(self.budget_days//7)]) for i in range(num_ongoings)])
 
         objective = lpSum([line1,line2,line3,line4,line5])
 
@@ -486,7 +880,7 @@ class Schedule:
 
         #abval4 weekhours
         for i in range(num_ongoings):
-            for w in range(self.budget_days/7):
+            for w in range(self.budget_days//7):
                 l1 = [(ong_decisions[i][7 * w + d], -ong_batches[i] * ong_wheth[i][7 * w + d]) for d in range(7)]
                 l1.append((abval4[i][w], -1))
                 pos = LpAffineExpression(l1)
@@ -502,37 +896,293 @@ class Schedule:
         #sum day hours constraint
         for j in range(self.budget_days):
             exp = LpAffineExpression([(x[i][j], whether[i][j] * batches[i]) for i in range(num_tasks)])
-            problem += LpConstraint(e = exp, sense = LpConstraintLE, rhs = self.MAX_DAILY_HOURS)
+            problem += LpConstraint(e = exp, sense = LpConstraintLE, rhs = max(self.MAX_DAILY_HOURS - self.committed_hours[j], 0.0))
+
+        return problem, x, whether
+
+    #make schedule matrix and store it in current_schedule.
+    #backend is a solvers.SolverBackend, a name from solvers.BACKENDS, or None
+    #for the default (in-process HiGHS if available, else CBC).
+    #returns a solvers.SolveResult
+    #
+    #the built model and the backend are kept between calls. if only costs,
+    #bounds or right-hand sides changed (current_schedule, total_hours, a due
+    #date that stays past the horizon, week_hours, cost constants...) the model
+    #is patched in place; otherwise it is rebuilt. either way the previous
+    #schedule is passed to the backend as a warm start, which MIPs use as
+    #their first incumbent. an LP only starts warm when HighsBackend re-solves
+    #a patched model from its previous basis.
+    #incremental = False always rebuilds and solves cold.
+    #
+    #with presolve, columns and rows that cannot change the optimum (days a
+    #task cannot be done, abval2 when SHIFT_COST is 0, perm rows with rhs 0)
+    #are dropped before solving; the result is still for the full model. a
+    #change of those reductions gives the backend a new model, solved cold
+    #
+    #time_limit (seconds) and gap (relative) make the solve anytime (see
+    #anytime.py): a schedule rounded from the LP relaxation comes first and the
+    #solver improves on it until the time runs out or the gap is reached. the
+    #best schedule found is kept, with result.bound and result.gap saying how
+    #far from optimal it can be
+    #
+    #with record_solves or on_solve set, the call is recorded (see last_record)
+    def makeSchedule(self, backend = None, incremental = True, presolve = True, time_limit = None, gap = None):
+        record = NULL_RECORD
+        if self.record_solves or self.on_solve is not None:
+            record = SolveRecord()
+        self._record = record
+        try:
+            result = self.__solve(backend, incremental, presolve, time_limit, gap)
+        finally:
+            self._record = NULL_RECORD
+        if record.enabled:
+            record.update = self.last_update
+            record.setResult(result)
+            record.finish()
+            self.last_record = record
+            if self.on_solve is not None:
+                self.on_solve(self, record)
+        return result
+
+    def __solve(self, backend, incremental, presolve, time_limit, gap):
+        record = self._record
+        if backend is not None:
+            self._backend = getBackend(backend)
+        elif self._backend is None:
+            self._backend = getBackend()
+        model, warm_start = self.__currentModel(incremental)
+        anytime = time_limit is not None or gap is not None
+        solved = model
+        if presolve:
+            with record.phase("presolve"):
+                self.last_presolve = presolveModel(model, self.last_presolve)
+                solved = self.last_presolve.model
+                warm_start = self.last_presolve.reduceValues(warm_start)
+        if record.enabled:
+            record.setModels(model, solved if presolve else None)
+        cache = self.solution_cache
+        result = None
+        if cache is not None:
+            #keyed by the model the solver would see; time_limit only decides
+            #how good the result is, and only optimal results are kept
+            with record.phase("fingerprint"):
+                key = modelFingerprint(solved, gap)
+            result = cache.get(key)
+            if result is not None:
+                result = copy.copy(result)
+        if result is None:
+            with record.phase("solve"):
+                if anytime:
+                    result = solveAnytime(solved, self._backend, time_limit, gap, warm_start)
+                else:
+                    result = self._backend.solve(solved, warm_start)
+            if cache is not None and result.isOptimal():
+                cache.put(key, result)
+        with record.phase("extract"):
+            if presolve:
+                result = self.last_presolve.expandResult(result)
+            self._values = result.values
+            self._status = result.status
+            self._exact = result.isOptimal()
+            self._bound = result.bound
+            self._limits = (time_limit, gap) if anytime else None
+            self._sensitivity = None
+            if result.values is not None:
+                self.current_schedule.assign(model.scheduleFromSolution(result.values))
+                self.cost = result.objective
+        #a schedule cut short by the time limit is still the one for these inputs
+        self.is_up_to_date = result.isOptimal() or (anytime and result.values is not None)
+        return result
+
+    #solves the schedule once per scenarios.Scenario (other score targets and
+    #costs, TIME_COST, UNSMOOTH_COST, SHIFT_COST or MAX_DAILY_HOURS) on workers
+    #processes, building the model once. the schedule itself is left as it is.
+    #returns a scenarios.ScenarioTable
+    def solveScenarios(self, scenarios, workers = 1, backend = None, time_limit = None, gap = None):
+        dues, whether = self.prepareModel()
+        warm_start = self._values if self._model is not None else None
+        return runScenarios(self, dues, whether, scenarios, workers, backend, time_limit, gap, warm_start)
+
+    #cuts the hours of current_schedule that perm_blocks do not account for
+    #into time-of-day blocks between day_start and day_end (hours after
+    #midnight), around the committed time, and puts them in flex_blocks (see
+    #block_generation). returns the (task, date, hours) that did not fit
+    def makeFlexBlocks(self, day_start = 0.0, day_end = 24.0):
+        tasks = self.completables + self.ongoings
+        current, perm = self.__grids()
+        hours = current.array()
+        if perm.array().shape == hours.shape:
+            hours = hours - perm.array()
+        placed, unplaced = generateBlocks(hours, tasks, asDatetime(self.start), self.committed, day_start, day_end)
+        self.flex_blocks = [Block(name = tasks[i].name, start = start, duration = length, scores = tasks[i].scores,
+            rr = None, task = tasks[i]) for i, start, length in placed]
+        return [(tasks[i], self.indexToDate(j), left) for i, j, left in unplaced]
+
+    #makeSchedule for long budget_days: solves window_days detailed days plus a
+    #weekly tail, fixes the first step_days days and moves on (see
+    #rolling_horizon). returns a rolling_horizon.RollingResult whose objective
+    #is the cost of the fixed schedule in the full model; it is not optimal, and
+    #the schedule is left out of date
+    def makeScheduleRolling(self, window_days = 14, step_days = 7, backend = None):
+        if backend is not None:
+            self._backend = getBackend(backend)
+        elif self._backend is None:
+            self._backend = getBackend()
+        dues, whether = self.prepareModel()
+        model, result = solveRolling(self, dues, whether, window_days, step_days, self._backend)
+        self._sensitivity = None
+        if model is not None:
+            self._model = model
+            self._model_tasks = self.completables + self.ongoings
+            self._model_start = self.start
+            self.last_update = ("rebuilt", None)
+            self._values = result.values
+            self._status = result.status
+            self.current_schedule.assign(model.scheduleFromSolution(result.values))
+            self.cost = result.objective
+        #not the optimum, so costOfBlock and estimateCostOfBlock solve exactly first
+        self._exact = False
+        self._bound = None
+        self._limits = None
+        self.is_up_to_date = False
+        return result
+
+    #makeSchedule through an LP of aggregate tasks (see aggregation.py), for
+    #schedules with many similar tasks. returns an aggregation.AggregateResult,
+    #which is not optimal, and leaves the schedule out of date
+    def makeScheduleAggregated(self, score_tolerance = 0.05, due_window = 1, backend = None):
+        if backend is not None:
+            self._backend = getBackend(backend)
+        elif self._backend is None:
+            self._backend = getBackend()
+        dues, whether = self.prepareModel()
+        model, result = solveAggregated(self, dues, whether, score_tolerance, due_window, self._backend)
+        self._sensitivity = None
+        if model is not None:
+            self._model = model
+            self._model_tasks = self.completables + self.ongoings
+            self._model_start = self.start
+            self.last_update = ("rebuilt", None)
+            self._values = result.values
+            self._status = result.status
+            self.current_schedule.assign(model.scheduleFromSolution(result.values))
+            self.cost = result.objective
+        #not the optimum, so costOfBlock and estimateCostOfBlock solve exactly first
+        self._exact = False
+        self._bound = None
+        self._limits = None
+        self.is_up_to_date = False
+        return result
+
+
+    #(day, hours) of the time of block in the horizon that committed does not
+    #cover already, split at midnight
+    def __blockHours(self, block):
+        start = asDatetime(block.start)
+        end = start + timedelta(hours = block.duration)
+        day0 = asDatetime(self.start)
+        out = []
+        for j, hours in hoursByDay(start, block.duration, day0, 0, self.budget_days):
+            if self.committed is not None:
+                day = day0 + timedelta(days = j)
+                hours -= self.committed.coveredHours(max(start, day), min(end, day + timedelta(days = 1)))
+            if hours > 1e-9:
+                out.append((j, hours))
+        return out
 
-    
-        problem.solve(COIN_CMD())
-        self.current_schedule = [[compl_decisions[i][j].value() * self.completables[i].batch_hours * compl_wheth[i][j] \
-        for j in range(self.budget_days)] for i in range(num_completables)] + \
-        [[ong_decisions[i][j].value() * self.ongoings[i].batch_hours * ong_wheth[i][j] \
-        for j in range(self.budget_days)] for i in range(num_ongoings)]
-
-        self.cost = value(problem.objective)
-        self.is_up_to_date = True
-        return problem
-
-
-    #double check passing parameters directly allows mutability
-    #TODO: test this
-    def costOfBlock(self, block):
-        test_sched = Schedule(#TODO add the rest here
-        start = self.start, budget_days = self.budget_days,
-        current_schedule = self.current_schedule, perm_task_time = self.perm_task_time,
-        completables = self.completables, ongoings = self.ongoings, flex_blocks = self.flex_blocks,
-        perm_blocks = self.perm_blocks)
-        task = CompletableTask(name = "test",max_day_hours = block.duration, max_block_length = block.duration,
-        min_block_length = 0, is_batch = False, batch_hours = 1.0, scores = block.scores, due = block.start,
-        total_hours = block.duration, prereqs = set())
-        test_sched.addCompletables([task])
-        assert len(self.completables) == len(test_sched.completables) - 1
-        if not test_sched.makeSchedule():
-            return float("inf")
-        if not self.is_up_to_date:
+    #estimated change in cost from committing block.duration hours with
+    #block.scores on the block's day, read off the duals of the current solve
+    #without re-solving. returns a block_pricing.BlockPrice; its cost is only
+    #the true optimal change when price.exact
+    def estimateCostOfBlock(self, block):
+        if not self.is_up_to_date or self._model is None:
             self.makeSchedule()
-        return test_sched.cost - self.cost
+        day_hours = self.__blockHours(block)
+        if not day_hours:
+            return BlockPrice(0.0, True, "dual", "outside the horizon or already committed")
+        if self._values is None:
+            return BlockPrice(None, False, "dual", "the schedule has no solution to price against (%s)" %
+                LpStatus[self._status])
+        if not self._exact:
+            return BlockPrice(None, False, "dual", "the schedule is not a proven optimum")
+        model = self._model
+        if self._sensitivity is None:
+            self._sensitivity = modelSensitivity(model, self._values, self._backend)
+        if self._sensitivity is None:
+            return BlockPrice(None, False, "dual", "no LP sensitivity available (needs highspy)")
+        rows, deltas = spanRowDeltas(model, day_hours, block.scores)
+        cost = self.TIME_COST * sum(h for j, h in day_hours) + priceRowDeltas(self._sensitivity, rows, deltas)
+        if model.isMip():
+            return BlockPrice(cost, False, "dual", "integer columns fixed at the base solution")
+        if not basisStaysFeasible(model, self._sensitivity, self._values, rows, deltas):
+            return BlockPrice(cost, False, "dual", "outside the ranging interval")
+        return BlockPrice(cost, True, "dual")
+
+    #change in cost from committing block.duration hours with block.scores on
+    #the block's day. with estimate = True the dual-price estimate is returned
+    #when it is exact, and the model is only re-solved when it is not
+    def costOfBlock(self, block, estimate = False):
+        return self.costOfBlocks([block], estimate = estimate)[0]
+
+    #costOfBlock for many blocks: the base model is solved at most once, and
+    #the re-solves (the current model with each block's day rows moved) are
+    #spread over workers processes, each with its own copy of the base model.
+    #returns the costs in the order of blocks
+    #
+    #with a solution_cache the base schedule is always brought up to date
+    #(cheap when it is cached) and each block's cost is cached too
+    #
+    #after makeSchedule with a time_limit or gap the re-solves get the same
+    #limits, and when the schedule was not proven optimal the costs are taken
+    #against its bound, so they are upper bounds on the change
+    def costOfBlocks(self, blocks, workers = 1, estimate = False):
+        cache = self.solution_cache
+        if not self.is_up_to_date or self._model is None or cache is not None:
+            self.makeSchedule()
+        if self._values is None:
+            #no schedule to compare with
+            return [float("inf") if self.__blockHours(b) else 0.0 for b in blocks]
+        costs = [0.0 for b in blocks]
+        hours = [0.0 for b in blocks]
+        jobs = []
+        indices = []
+        for k in range(len(blocks)):
+            day_hours = self.__blockHours(blocks[k])
+            if not day_hours:
+                continue
+            hours[k] = sum(h for j, h in day_hours)
+            if estimate:
+                price = self.estimateCostOfBlock(blocks[k])
+                if price.exact:
+                    costs[k] = price.cost
+                    continue
+            jobs.append(spanRowDeltas(self._model, day_hours, blocks[k].scores))
+            indices.append(k)
+        objectives = [None] * len(jobs)
+        keys = []
+        if cache is not None:
+            base = modelFingerprint(self._model)
+            keys = [queryFingerprint(base, "block", rows, deltas) for rows, deltas in jobs]
+            cached = [cache.get(key) for key in keys]
+            objectives = [c[0] if c is not None else None for c in cached]
+            todo = [n for n in range(len(jobs)) if cached[n] is None]
+        else:
+            todo = range(len(jobs))
+        time_limit, gap = self._limits if self._limits is not None else (None, None)
+        solved = resolveAll(self._model, self._values, self._backend, [jobs[n] for n in todo], workers, time_limit, gap)
+        for n, objective in zip(todo, solved):
+            objectives[n] = objective
+            if cache is not None:
+                #infeasible re-solves (None) are cached as well
+                cache.put(keys[n], (objective,))
+        reference = self.cost
+        if not self._exact and self._bound is not None:
+            reference = self._bound
+        for k, objective in zip(indices, objectives):
+            if objective is None:
+                costs[k] = float("inf")
+            else:
+                costs[k] = self.TIME_COST * hours[k] + objective - reference
+        return costs
 
 
@@ -0,0 +1,207 @@
+"""
+Archive of the days a schedule has moved past, for totals over any range of them.
+
+Schedule.bringUpToDate archives the columns of current_schedule it drops,
+as the hours each task had on those days, keyed by task id (see
+task_registry) so tasks can come and go. The archive is append-only. Each
+task's hours are kept as running totals in chunks of CHUNK_DAYS days, as are
+the hours and score totals (with the scores the tasks had when archived) of
+each day. So the hours of a task over any range of days, its hours in a week
+or over the trailing N days, and the score totals of any range are two
+lookups and a subtraction, however long the history.
+
+Weeks are counted from origin, the first day archived. makeSchedule credits
+each ongoing with the hours it did from the start of the current week to
+start against its week_hours, and lines up the abval4 weeks with those weeks.
+"""
+
+from datetime import timedelta
+
+import numpy as np
+
+CHUNK_DAYS = 256
+
+
+class _Series(object):
+    #running totals of a row of width values per day from day first on,
+    #in CHUNK_DAYS x width chunks
+    def __init__(self, first, width = 1):
+        self.first = first
+        self.width = width
+        self.length = 0
+        self.chunks = []
+        self.last = np.zeros(width)
+
+    def end(self):
+        return self.first + self.length
+
+    #appends days x width values
+    def extend(self, values):
+        values = np.asarray(values, dtype = float).reshape(-1, self.width)
+        if not len(values):
+            return
+        sums = self.last + np.cumsum(values, axis = 0)
+        k = 0
+        while k < len(sums):
+            at = self.length % CHUNK_DAYS
+            if at == 0:
+                self.chunks.append(np.zeros((CHUNK_DAYS, self.width)))
+            n = min(CHUNK_DAYS - at, len(sums) - k)
+            self.chunks[-1][at:at + n] = sums[k:k + n]
+            self.length += n
+            k += n
+        self.last = sums[-1]
+
+    #zeros up to day
+    def padTo(self, day):
+        if day > self.end():
+            self.extend(np.zeros((day - self.end(), self.width)))
+
+    #total of the days before day
+    def before(self, day):
+        k = min(day - self.first, self.length)
+        if k <= 0:
+            return np.zeros(self.width)
+        return self.chunks[(k - 1) // CHUNK_DAYS][(k - 1) % CHUNK_DAYS]
+
+    #days x width values from day on (from day first on by default)
+    def values(self, day = None):
+        k = 0 if day is None else max(day - self.first, 0)
+        if k >= self.length:
+            return np.zeros((0, self.width))
+        c = k // CHUNK_DAYS
+        sums = np.concatenate(self.chunks[c:])[k - c * CHUNK_DAYS:self.length - c * CHUNK_DAYS]
+        return np.diff(np.vstack((self.before(self.first + k)[None, :], sums)), axis = 0)
+
+
+class ScheduleHistory(object):
+    def __init__(self, origin = None):
+        #first day archived
+        self.origin = origin
+        self.num_days = 0
+        #task id -> _Series of its hours
+        self._tasks = dict()
+        #_Series of the hours and score totals of each day
+        self._days = None
+
+    def end(self):
+        return None if self.origin is None else self.origin + timedelta(days = self.num_days)
+
+    def __len__(self):
+        return self.num_days
+
+    #archives hours, tasks x days hours from start on, of the tasks with
+    #task_ids and scores (tasks x scores). days already archived are skipped
+    #and days missed between the end and start count as zero hours
+    def archive(self, start, hours, task_ids, scores):
+        hours = np.asarray(hours, dtype = float)
+        scores = np.asarray(scores, dtype = float)
+        #already tasks x days and tasks x scores when there are no tasks
+        if hours.ndim != 2:
+            hours = hours.reshape(len(task_ids), -1)
+        if scores.ndim != 2:
+            scores = scores.reshape(len(task_ids), -1)
+        if self.origin is None:
+            self.origin = start
+        offset = (start - self.origin).days
+        if offset < 0:
+            raise ValueError("%s is before the history starts (%s)" % (start, self.origin))
+        if offset < self.num_days:
+            hours = hours[:, self.num_days - offset:]
+            offset = self.num_days
+        if self._days is None:
+            self._days = _Series(0, 1 + scores.shape[1])
+        elif self._days.width != 1 + scores.shape[1]:
+            raise ValueError("the history has %d scores, not %d" % (self._days.width - 1, scores.shape[1]))
+        for row, task_id in enumerate(task_ids):
+            series = self._tasks.get(task_id)
+            if series is None:
+                series = self._tasks[task_id] = _Series(offset)
+            series.padTo(offset)
+            series.extend(hours[row])
+        self._days.padTo(offset)
+        self._days.extend(np.column_stack((hours.sum(axis = 0), hours.T.dot(scores))))
+        self.num_days = offset + hours.shape[1]
+
+    #index of date d, clamped to the archived days
+    def __index(self, d):
+        return min(max((d - self.origin).days, 0), self.num_days)
+
+    #hours of task task_id from date a to before date b
+    def hours(self, task_id, a, b):
+        series = self._tasks.get(task_id)
+        if series is None or self.origin is None:
+            return 0.0
+        return float(series.before(self.__index(b))[0] - series.before(self.__index(a))[0])
+
+    #hours of all tasks from date a to before date b
+    def totalHours(self, a, b):
+        if self._days is None:
+            return 0.0
+        return float(self._days.before(self.__index(b))[0] - self._days.before(self.__index(a))[0])
+
+    #score totals from date a to before date b
+    def scoreTotals(self, a, b):
+        if self._days is None:
+            return np.zeros(0)
+        return (self._days.before(self.__index(b)) - self._days.before(self.__index(a)))[1:]
+
+    #first day of the week (counted from origin) of date d
+    def weekStart(self, d):
+        return self.origin + timedelta(days = 7 * ((d - self.origin).days // 7))
+
+    #hours of task task_id in the week of date d, up to the end of the history
+    def weekHours(self, task_id, d):
+        a = self.weekStart(d)
+        return self.hours(task_id, a, a + timedelta(days = 7))
+
+    #hours of task task_id over the days days before date d
+    def trailingHours(self, task_id, d, days):
+        return self.hours(task_id, d - timedelta(days = days), d)
+
+    #history of the days from date d on (d being in the history), with the
+    #same task ids. weeks stay the same when d starts one
+    def since(self, d):
+        if self.origin is None:
+            return ScheduleHistory()
+        k = self.__index(d)
+        history = ScheduleHistory(self.origin + timedelta(days = k))
+        history.num_days = self.num_days - k
+        for task_id, series in self._tasks.items():
+            if series.end() > k:
+                history._tasks[task_id] = _Series(max(series.first - k, 0))
+                history._tasks[task_id].extend(series.values(k))
+        if self._days is not None:
+            history._days = _Series(0, self._days.width)
+            history._days.extend(self._days.values(k))
+        return history
+
+    def taskIds(self):
+        return sorted(self._tasks)
+
+    #(task ids, their first days, tasks x days hours, days x (1 + scores)
+    #hours and score totals) for schedule_store
+    def asArrays(self):
+        ids = self.taskIds()
+        hours = np.zeros((len(ids), self.num_days))
+        for row, task_id in enumerate(ids):
+            series = self._tasks[task_id]
+            hours[row, series.first:series.end()] = series.values()[:, 0]
+        days = self._days.values() if self._days is not None else np.zeros((0, 1))
+        return np.array(ids, dtype = np.int64), np.array([self._tasks[k].first for k in ids], dtype = np.int64), \
+            hours, days
+
+    @staticmethod
+    def fromArrays(origin, ids, firsts, hours, days):
+        history = ScheduleHistory(origin)
+        history.num_days = hours.shape[1] if np.ndim(hours) == 2 else 0
+        for row, (task_id, first) in enumerate(zip(ids, firsts)):
+            series = history._tasks[int(task_id)] = _Series(int(first))
+            series.extend(hours[row, first:])
+        if len(days):
+            history._days = _Series(0, days.shape[1])
+            history._days.extend(days)
+        return history
+
+    def __repr__(self):
+        return "ScheduleHistory(%s, %d days, %d tasks)" % (self.origin, self.num_days, len(self._tasks))
@@ -0,0 +1,134 @@
+"""
+Checks ScheduleHistory against dense arrays of every archived day, over
+random archives with gaps, overlaps, tasks coming and going and runs longer
+than CHUNK_DAYS, and that since and asArrays/fromArrays keep the totals.
+
+    python -m pytest history_test.py (or python history_test.py)
+"""
+
+import random
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from history import ScheduleHistory, CHUNK_DAYS
+
+_TOL = 1e-6
+_ORIGIN = date(2024, 3, 4)
+_SCORES = 2
+
+
+def _at(day):
+    return _ORIGIN + timedelta(days = day)
+
+
+class _Dense(object):
+    #the archive as a tasks x days dict of arrays and days x (1 + scores) totals
+    def __init__(self):
+        self.num_days = 0
+        self.tasks = dict()
+        self.days = np.zeros((0, 1 + _SCORES))
+
+    def archive(self, offset, hours, task_ids, scores):
+        #a task is kept even when all its days were archived already
+        for task_id in task_ids:
+            self.tasks.setdefault(task_id, np.zeros(self.num_days))
+        new = offset + hours.shape[1] - self.num_days
+        if new <= 0:
+            return
+        end = self.num_days + new
+        for task_id in self.tasks:
+            self.tasks[task_id] = np.concatenate((self.tasks[task_id], np.zeros(new)))
+        self.days = np.vstack((self.days, np.zeros((new, 1 + _SCORES))))
+        skip = max(self.num_days - offset, 0)
+        for row, task_id in enumerate(task_ids):
+            self.tasks[task_id][offset + skip:end] += hours[row, skip:]
+            self.days[offset + skip:end, 0] += hours[row, skip:]
+            self.days[offset + skip:end, 1:] += np.outer(hours[row, skip:], scores[row])
+        self.num_days = end
+
+    def hours(self, task_id, a, b):
+        if task_id not in self.tasks:
+            return 0.0
+        return self.tasks[task_id][max(a, 0):max(b, 0)].sum()
+
+
+class ScheduleHistoryTest(unittest.TestCase):
+    #a random history and the same archive as _Dense
+    def randomHistory(self, rng):
+        history = ScheduleHistory()
+        dense = _Dense()
+        ids = list(range(8))
+        end = 0
+        for k in range(rng.randint(1, 8)):
+            offset = 0 if k == 0 else max(end + rng.randint(-4, 5), 0)
+            width = rng.choice((0, 1, 3, 7, 40, CHUNK_DAYS - 1, CHUNK_DAYS + 5))
+            task_ids = rng.sample(ids, rng.randint(0, 5))
+            hours = np.array([[rng.choice((0.0, 0.5, 1.0, 2.5)) for j in range(width)] for i in task_ids])
+            hours = hours.reshape(len(task_ids), width)
+            scores = np.array([[rng.randint(0, 3) for s in range(_SCORES)] for i in task_ids],
+                dtype = float).reshape(len(task_ids), _SCORES)
+            history.archive(_at(offset), hours, task_ids, scores)
+            dense.archive(offset, hours, task_ids, scores)
+            end = max(end, offset + width)
+        return history, dense
+
+    def check(self, history, dense, rng, first = 0):
+        ids = list(range(9))
+        self.assertEqual(len(history), dense.num_days - first)
+        for q in range(30):
+            a = rng.randint(first - 10, dense.num_days + 10)
+            b = rng.randint(a, dense.num_days + 20)
+            lo, hi = max(a, first), max(b, first)
+            for task_id in ids:
+                self.assertAlmostEqual(history.hours(task_id, _at(a), _at(b)), dense.hours(task_id, lo, hi), 6,
+                    (task_id, a, b))
+            self.assertAlmostEqual(history.totalHours(_at(a), _at(b)), dense.days[lo:hi, 0].sum(), 6, (a, b))
+            if dense.num_days > 0:
+                self.assertTrue(np.allclose(history.scoreTotals(_at(a), _at(b)), dense.days[lo:hi, 1:].sum(axis = 0),
+                    atol = _TOL), (a, b))
+            d = rng.randint(first, dense.num_days + 10)
+            week = first + 7 * ((d - first) // 7)
+            self.assertEqual(history.weekStart(_at(d)), _at(week))
+            days = rng.randint(1, 30)
+            for task_id in ids:
+                self.assertAlmostEqual(history.weekHours(task_id, _at(d)),
+                    dense.hours(task_id, week, week + 7), 6, (task_id, d))
+                self.assertAlmostEqual(history.trailingHours(task_id, _at(d), days),
+                    dense.hours(task_id, max(d - days, first), d), 6, (task_id, d, days))
+
+    def testQueries(self):
+        rng = random.Random(0)
+        for n in range(60):
+            history, dense = self.randomHistory(rng)
+            self.assertEqual(history.end(), _at(dense.num_days))
+            self.check(history, dense, rng)
+
+    def testEarlierStart(self):
+        history = ScheduleHistory()
+        history.archive(_at(3), np.ones((1, 2)), [0], np.ones((1, _SCORES)))
+        self.assertRaises(ValueError, history.archive, _at(2), np.ones((1, 2)), [0], np.ones((1, _SCORES)))
+        self.assertRaises(ValueError, history.archive, _at(5), np.ones((1, 2)), [0], np.ones((1, _SCORES + 1)))
+
+    def testSince(self):
+        rng = random.Random(1)
+        for n in range(60):
+            history, dense = self.randomHistory(rng)
+            if not dense.num_days:
+                continue
+            #from the start of a week, so weeks stay the same
+            first = 7 * rng.randint(0, (dense.num_days - 1) // 7)
+            self.check(history.since(_at(first)), dense, rng, first)
+
+    def testArrays(self):
+        rng = random.Random(2)
+        for n in range(60):
+            history, dense = self.randomHistory(rng)
+            ids, firsts, hours, days = history.asArrays()
+            self.assertEqual(list(ids), sorted(dense.tasks))
+            self.check(ScheduleHistory.fromArrays(history.origin, ids, firsts, hours, days), dense, rng)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,297 @@
+"""
+Streaming iCalendar (RFC 5545) reader for perm_blocks.
+
+readEvents goes through the lines of a calendar once and yields its VEVENTs
+as they are read; nothing but the event being read is kept, apart from the
+recurring events themselves (so that RECURRENCE-ID overrides read later can
+cancel the occurrence they replace). Events that ended before a given time
+are skipped.
+
+Recurrences are not expanded when read. A Recurrence lists its occurrences
+in a window on request, and for rules without COUNT it first moves DTSTART
+forward by whole periods to just before the window, so the cost of a window
+depends on the window and not on how long ago the event started.
+
+Times are taken as wall-clock times: TZID parameters and a trailing Z are
+ignored. All-day events have no hours.
+"""
+
+import re
+from datetime import datetime, timedelta
+
+from dateutil.relativedelta import relativedelta
+from dateutil.rrule import rrulestr
+
+
+def asDatetime(d):
+    if isinstance(d, datetime):
+        return d.replace(tzinfo = None)
+    return datetime(d.year, d.month, d.day)
+
+
+#(day index, hours) of the part of [start, start + hours) on each of the
+#days first..num_days - 1 counted from day0
+def hoursByDay(start, hours, day0, first, num_days):
+    out = []
+    end = start + timedelta(hours = hours)
+    j = max((start - day0).days, first)
+    while j < num_days:
+        day_start = day0 + timedelta(days = j)
+        day_end = day_start + timedelta(days = 1)
+        if day_start >= end:
+            break
+        overlap = (min(end, day_end) - max(start, day_start)).total_seconds() / 3600.0
+        if overlap > 0:
+            out.append((j, overlap))
+        j += 1
+    return out
+
+
+#whole periods of each FREQ, for moving DTSTART forward
+_PERIODS = {'SECONDLY': timedelta(seconds = 1), 'MINUTELY': timedelta(minutes = 1), 'HOURLY': timedelta(hours = 1),
+    'DAILY': timedelta(days = 1), 'WEEKLY': timedelta(days = 7)}
+_MONTHS = {'MONTHLY': 1, 'YEARLY': 12}
+
+
+class Recurrence(object):
+    def __init__(self, rule, dtstart, exdates = (), rdates = ()):
+        #the RRULE value, e.g. "FREQ=WEEKLY;BYDAY=MO,WE"
+        self.rule = rule
+        self.dtstart = dtstart
+        self.exdates = set(exdates)
+        self.rdates = sorted(rdates)
+        fields = dict(p.split("=", 1) for p in rule.upper().split(";") if "=" in p)
+        self.freq = fields.get('FREQ')
+        self.interval = int(fields.get('INTERVAL', 1))
+        self.count = int(fields['COUNT']) if 'COUNT' in fields else None
+        self.until = _parseDate(fields['UNTIL'])[0] if 'UNTIL' in fields else None
+
+    def __rule(self, dtstart):
+        #UNTIL is compared with the naive DTSTART, so it loses its Z too
+        return rrulestr("RRULE:" + re.sub(r"(UNTIL=[0-9T]+)Z", r"\1", self.rule, flags = re.I), dtstart = dtstart)
+
+    #a DTSTART no later than a that starts the same sequence of occurrences
+    #from a on, or the original one when that cannot be done safely
+    def startBefore(self, a):
+        d = self.dtstart
+        if self.count is not None or d >= a:
+            return d
+        if self.freq in _PERIODS:
+            period = _PERIODS[self.freq] * self.interval
+            k = int((a - d).total_seconds() // period.total_seconds()) - 1
+            if k > 0:
+                return d + period * k
+        elif self.freq in _MONTHS and d.day <= 28:
+            months = _MONTHS[self.freq] * self.interval
+            k = ((a.year - d.year) * 12 + a.month - d.month) // months - 1
+            if k > 0:
+                return d + relativedelta(months = k * months)
+        return d
+
+    #occurrences in [a, b)
+    def between(self, a, b):
+        if self.until is not None and self.until < a:
+            found = []
+        else:
+            found = self.__rule(self.startBefore(a)).between(a, b, inc = True)
+        found = [d for d in found if d < b and d not in self.exdates]
+        extra = [d for d in self.rdates if a <= d < b and d not in self.exdates]
+        if extra:
+            found = sorted(set(found + extra))
+        return found
+
+    def __iter__(self):
+        rdates = [d for d in self.rdates if d not in self.exdates]
+        occurrences = (d for d in self.__rule(self.dtstart) if d not in self.exdates)
+        if not rdates:
+            return occurrences
+        return iter(sorted(set(rdates) | set(occurrences))) if self.count is not None or self.until is not None \
+            else _merge(occurrences, rdates)
+
+    def __repr__(self):
+        return "Recurrence(%r, dtstart=%s)" % (self.rule, self.dtstart)
+
+
+#an increasing iterator merged with an increasing list
+def _merge(iterator, values):
+    k = 0
+    for d in iterator:
+        while k < len(values) and values[k] <= d:
+            if values[k] < d:
+                yield values[k]
+            k += 1
+        yield d
+    for v in values[k:]:
+        yield v
+
+
+class IcalEvent(object):
+    def __init__(self):
+        self.uid = None
+        self.summary = ""
+        self.description = ""
+        self.categories = []
+        self.start = None
+        self.end = None
+        self.duration = None
+        self.all_day = False
+        #Recurrence of a recurring event, else None
+        self.recurrence = None
+        #start of the occurrence this event replaces, for overrides
+        self.recurrence_id = None
+        self._rule = None
+        self._exdates = []
+        self._rdates = []
+
+    #length in hours; all-day events count 0
+    @property
+    def hours(self):
+        if self.all_day:
+            return 0.0
+        if self.end is not None:
+            return max((self.end - self.start).total_seconds() / 3600.0, 0.0)
+        if self.duration is not None:
+            return self.duration.total_seconds() / 3600.0
+        return 0.0
+
+    def __repr__(self):
+        return "IcalEvent(%r, %s)" % (self.summary, self.start)
+
+
+#logical lines of a calendar, with folded lines joined
+def _unfold(lines):
+    current = None
+    for line in lines:
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        line = line.rstrip("\r\n")
+        if line[:1] in (" ", "\t") and current is not None:
+            current += line[1:]
+            continue
+        if current is not None:
+            yield current
+        current = line
+    if current:
+        yield current
+
+
+#(name, params, value) of a content line
+def _parseLine(line):
+    k = line.find(":")
+    if k < 0:
+        return None
+    if '"' in line[:k]:
+        #the value starts after the first colon that is not inside a quoted parameter
+        quoted = False
+        for k, ch in enumerate(line):
+            if ch == '"':
+                quoted = not quoted
+            elif ch == ":" and not quoted:
+                break
+        else:
+            return None
+    head, value = line[:k], line[k + 1:]
+    parts = head.split(";")
+    params = dict(p.split("=", 1) for p in parts[1:] if "=" in p)
+    return parts[0].upper(), params, value
+
+
+#(naive datetime, is a date) of a DATE or DATE-TIME value
+def _parseDate(value):
+    value = value.strip().upper()
+    d = datetime(int(value[:4]), int(value[4:6]), int(value[6:8]))
+    if value[8:9] == "T":
+        return d.replace(hour = int(value[9:11]), minute = int(value[11:13]), second = int(value[13:15])), False
+    return d, True
+
+
+_DURATION = re.compile(r"([+-]?)P(?:(\d+)W)?(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?)?$")
+
+
+def _parseDuration(value):
+    m = _DURATION.match(value.strip().upper())
+    if m is None:
+        return None
+    sign, weeks, days, hours, minutes, seconds = m.groups()
+    d = timedelta(weeks = int(weeks or 0), days = int(days or 0), hours = int(hours or 0),
+        minutes = int(minutes or 0), seconds = int(seconds or 0))
+    return -d if sign == "-" else d
+
+
+def _unescape(text):
+    return text.replace("\\n", "\n").replace("\\N", "\n").replace("\\,", ",").replace("\\;", ";").replace("\\\\", "\\")
+
+
+def _finish(event):
+    if event.end is None and event.duration is None and event.all_day:
+        event.end = event.start + timedelta(days = 1)
+    if event._rule is not None and event.recurrence_id is None:
+        event.recurrence = Recurrence(event._rule, event.start, event._exdates, event._rdates)
+    elif event._rdates:
+        #RDATE without RRULE: the start plus the extra dates
+        event.recurrence = Recurrence("FREQ=DAILY;COUNT=1", event.start, event._exdates, event._rdates)
+
+
+#still has time at or after since
+def _current(event, since):
+    if since is None:
+        return True
+    length = timedelta(hours = event.hours)
+    if event.recurrence is None:
+        return event.start + length > since
+    r = event.recurrence
+    return r.until is None or r.until + length > since or any(d + length > since for d in r.rdates)
+
+
+#VEVENTs of an iCalendar (an iterable of lines, e.g. an open file), read as
+#they come. with since, events without time at or after it are skipped
+def readEvents(lines, since = None):
+    event = None
+    #recurring events by UID, and occurrences replaced before their event was read
+    recurring = dict()
+    replaced = dict()
+    for line in _unfold(lines):
+        parsed = _parseLine(line)
+        if parsed is None:
+            continue
+        name, params, value = parsed
+        if name == "BEGIN" and value.upper() == "VEVENT":
+            event = IcalEvent()
+            continue
+        if event is None:
+            continue
+        if name == "END" and value.upper() == "VEVENT":
+            _finish(event)
+            if event.recurrence_id is not None:
+                if event.uid in recurring:
+                    recurring[event.uid].exdates.add(event.recurrence_id)
+                else:
+                    replaced.setdefault(event.uid, set()).add(event.recurrence_id)
+            elif event.recurrence is not None and event.uid is not None:
+                event.recurrence.exdates.update(replaced.pop(event.uid, ()))
+                recurring[event.uid] = event.recurrence
+            if event.start is not None and _current(event, since):
+                yield event
+            event = None
+        elif name == "UID":
+            event.uid = value
+        elif name == "SUMMARY":
+            event.summary = _unescape(value)
+        elif name == "DESCRIPTION":
+            event.description = _unescape(value)
+        elif name == "CATEGORIES":
+            event.categories += [_unescape(c) for c in re.split(r"(?<!\\),", value)]
+        elif name == "DTSTART":
+            event.start, event.all_day = _parseDate(value)
+        elif name == "DTEND":
+            event.end = _parseDate(value)[0]
+        elif name == "DURATION":
+            event.duration = _parseDuration(value)
+        elif name == "RRULE":
+            event._rule = value
+        elif name == "EXDATE":
+            event._exdates += [_parseDate(v)[0] for v in value.split(",")]
+        elif name == "RDATE" and params.get("VALUE", "").upper() != "PERIOD":
+            event._rdates += [_parseDate(v)[0] for v in value.split(",")]
+        elif name == "RECURRENCE-ID":
+            event.recurrence_id = _parseDate(value)[0]
@@ -0,0 +1,200 @@
+"""
+Prerequisite graph of a schedule's completables.
+
+Sorts the prereqs graph topologically once, memoizes each task's hours from
+square one (its own hours plus those of every task it transitively depends
+on, each counted once) and propagates due dates from tasks to their
+prerequisites in one pass over the edges. Cycles are reported as CycleError.
+
+refresh() compares the tasks with what the graph last saw: if tasks or prereq
+sets changed the graph is rebuilt, otherwise only the tasks downstream of a
+changed total_hours, due or max_day_hours are recomputed.
+"""
+
+import binascii
+import math
+from datetime import timedelta
+
+import numpy as np
+
+
+class CycleError(ValueError):
+    def __init__(self, cycle):
+        #the tasks of one cycle, each a prerequisite of the one before it
+        self.cycle = cycle
+        ValueError.__init__(self, "prerequisite cycle: " + " -> ".join(str(getattr(t, 'name', t)) for t in cycle
+        + cycle[:1]))
+
+
+#sum of weights[k] over the set bits k of the integer bits
+def _bitSum(bits, weights):
+    h = '%x' % bits
+    if len(h) % 2:
+        h = '0' + h
+    mask = np.unpackbits(np.frombuffer(binascii.unhexlify(h), dtype = np.uint8))[::-1]
+    n = min(len(mask), len(weights))
+    return float(np.dot(mask[:n], weights[:n]))
+
+
+class PrereqGraph(object):
+    def __init__(self):
+        self.tasks = []
+        self._signature = None
+
+    #what the graph depends on, per task
+    @staticmethod
+    def __taskKey(task):
+        return (task.total_hours, task.max_day_hours, task.due)
+
+    #brings the graph up to date with tasks (a schedule's completables) and
+    #start, and returns the number of tasks whose dues were recomputed
+    def refresh(self, tasks, start):
+        index = dict((tasks[k], k) for k in range(len(tasks)))
+        structure = [tuple(sorted(index[p] for p in t.prereqs if p in index)) for t in tasks]
+        if self._signature is None or self.tasks != list(tasks) or self._structure != structure:
+            self.__build(tasks, index, structure)
+            self.__squares(self.order[::-1])
+            self.__propagate(self.order, start)
+            return len(tasks)
+        keys = [PrereqGraph.__taskKey(t) for t in tasks]
+        changed = [k for k in range(len(tasks)) if keys[k] != self._signature[k]]
+        if start != self.start:
+            seeds = range(len(tasks))
+        else:
+            seeds = changed
+        self._signature = keys
+        if not seeds:
+            return 0
+        #hours from square one change for the tasks that depend on a changed task
+        hours_changed = [k for k in changed if tasks[k].total_hours != self.hours[k]]
+        self.hours = np.array([t.total_hours for t in tasks], dtype = float)
+        dependents = self.__reach(hours_changed, self.dependents)
+        self.__squares(sorted(dependents, key = lambda k: -self.position[k]))
+        #and dues change below any task whose due, hours or square one changed
+        affected = self.__reach(set(seeds) | dependents, self.prereqs)
+        self.__propagate(sorted(affected, key = lambda k: self.position[k]), start)
+        return len(affected)
+
+    def __build(self, tasks, index, structure):
+        n = len(tasks)
+        self.tasks = list(tasks)
+        self._structure = structure
+        self._signature = [PrereqGraph.__taskKey(t) for t in tasks]
+        self.index = index
+        self.prereqs = structure
+        self.dependents = [[] for k in range(n)]
+        for k in range(n):
+            for p in structure[k]:
+                self.dependents[p].append(k)
+        #prereqs outside the schedule do not constrain anything
+        self.missing = [(t, p) for t in tasks for p in t.prereqs if p not in index]
+        self.hours = np.array([t.total_hours for t in tasks], dtype = float)
+
+        #Kahn's algorithm, dependents before their prereqs
+        waiting = [len(self.dependents[k]) for k in range(n)]
+        order = [k for k in range(n) if waiting[k] == 0]
+        head = 0
+        while head < len(order):
+            for p in structure[order[head]]:
+                waiting[p] -= 1
+                if waiting[p] == 0:
+                    order.append(p)
+            head += 1
+        if len(order) < n:
+            raise CycleError([tasks[k] for k in self.__cycle(set(range(n)) - set(order))])
+        self.order = order
+        self.position = [0] * n
+        for k in range(n):
+            self.position[order[k]] = k
+        self.closure = [0] * n
+        self.square = np.zeros(n)
+        self.due = [None] * n
+        self.pre_due = [None] * n
+
+    #one cycle among the tasks left over by the topological sort
+    def __cycle(self, left):
+        k = min(left)
+        seen = []
+        on_path = dict()
+        while k not in on_path:
+            on_path[k] = len(seen)
+            seen.append(k)
+            k = [p for p in self.prereqs[k] if p in left][0]
+        return seen[on_path[k]:]
+
+    #every task reachable from seeds through edges, seeds included
+    def __reach(self, seeds, edges):
+        seen = set(seeds)
+        stack = list(seen)
+        while stack:
+            for k in edges[stack.pop()]:
+                if k not in seen:
+                    seen.add(k)
+                    stack.append(k)
+        return seen
+
+    #hours from square one of nodes, given in prereqs-first order. a task with
+    #at most one prereq adds its own hours to the prereq's; otherwise the
+    #union of the prereqs' closures is summed so shared ancestors count once
+    def __squares(self, nodes):
+        for k in nodes:
+            prereqs = self.prereqs[k]
+            if not self.closure[k]:
+                bits = 1 << k
+                for p in prereqs:
+                    bits |= self.closure[p]
+                self.closure[k] = bits
+            if len(prereqs) == 0:
+                self.square[k] = self.hours[k]
+            elif len(prereqs) == 1:
+                self.square[k] = self.hours[k] + self.square[prereqs[0]]
+            else:
+                self.square[k] = _bitSum(self.closure[k], self.hours)
+
+    #dues of nodes, given in dependents-first order: the task's own due or an
+    #earlier one left by a dependent, which keeps the last share of its days
+    #(in proportion to its hours from square one) for itself
+    def __propagate(self, nodes, start):
+        self.start = start
+        for k in nodes:
+            task = self.tasks[k]
+            due = task.due
+            for u in self.dependents[k]:
+                if self.pre_due[u] is not None and (due is None or self.pre_due[u] < due):
+                    due = self.pre_due[u]
+            self.due[k] = due
+            self.pre_due[k] = None
+            if due is None:
+                continue
+            num_days = (due - start).days
+            if num_days < task.minDays():
+                continue
+            last_days = 0
+            if self.square[k] > 0:
+                last_days = int(math.floor(num_days * task.total_hours / self.square[k]))
+            self.pre_due[k] = due - timedelta(days = last_days)
+
+    #task -> due date after propagation (None for tasks without one)
+    def dueDates(self):
+        return dict((self.tasks[k], self.due[k]) for k in range(len(self.tasks)))
+
+    #tasks whose due date leaves fewer days than they need; nothing is
+    #propagated from them
+    def infeasible(self):
+        return [self.tasks[k] for k in range(len(self.tasks)) if self.due[k] is not None
+        and (self.due[k] - self.start).days < self.tasks[k].minDays()]
+
+    def squareOne(self, task):
+        return float(self.square[self.index[task]])
+
+    #first day index each task may be worked on: the day before its latest
+    #prereq's due date, or num_days when a prereq has no due date
+    def startIndices(self, num_days):
+        starts = [0] * len(self.tasks)
+        for k in range(len(self.tasks)):
+            for p in self.prereqs[k]:
+                if self.due[p] is None:
+                    starts[k] = num_days
+                    break
+                starts[k] = max(starts[k], (self.due[p] - self.start).days - 1)
+        return starts
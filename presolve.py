@@ -0,0 +1,191 @@
+"""
+Presolve for the schedule LP.
+
+Drops what cannot change the optimum before a ScheduleModel reaches the
+solver:
+
+- slack columns: cost 0, unbounded in the direction that relaxes every row
+  they appear in (the abval2 shift columns when SHIFT_COST is 0). Their rows
+  can always be satisfied, so the rows go too and the column gets the
+  smallest value that satisfies them afterwards.
+- redundant rows: rows the column bounds already imply, e.g. perm_task_time
+  rows with a right-hand side of 0.
+- empty columns: columns left with no coefficients (x[i][j] with
+  whether[i][j] == 0), fixed at their cheapest bound.
+
+A Presolved keeps the mapping back to the full model, so solutions expand to
+full column vectors (and from there to the full current_schedule grid).
+"""
+
+import copy
+
+import numpy as np
+
+from solvers import SolveResult
+
+INF = np.inf
+
+
+class Presolved(object):
+    def __init__(self, full, col_keep, row_keep, slack_cols, fixed):
+        #the model that was presolved
+        self.full = full
+        #kept column and row indices of the full model, in order
+        self.col_keep = col_keep
+        self.row_keep = row_keep
+        #dropped slack columns, filled in by expand
+        self.slack_cols = slack_cols
+        #full column vector with the value of every dropped column
+        self.fixed = fixed
+        self.model = None
+        self.version = None
+
+    @property
+    def removed_cols(self):
+        return self.full.num_cols - len(self.col_keep)
+
+    @property
+    def removed_rows(self):
+        return self.full.num_rows - len(self.row_keep)
+
+    #{family: (columns or rows removed, total)} for the full model's families
+    def removedByFamily(self):
+        full = self.full
+        removed = dict()
+        for keep, slices, n in ((self.col_keep, full.col_slices, full.num_cols), (self.row_keep, full.row_slices,
+        full.num_rows)):
+            kept = np.zeros(n, dtype = bool)
+            kept[keep] = True
+            for family, sl in slices.items():
+                removed[family] = (int((~kept[sl]).sum()), sl.stop - sl.start)
+        return removed
+
+    def sameReductions(self, other):
+        return other is not None and np.array_equal(self.col_keep, other.col_keep) and np.array_equal(self.row_keep,
+        other.row_keep) and np.array_equal(self.slack_cols, other.slack_cols) and np.array_equal(self.fixed, other.fixed)
+
+    #costs and bounds of the reduced model from the full model's current values
+    def __values(self):
+        full = self.full
+        dropped = np.setdiff1d(np.arange(full.num_cols), self.col_keep)
+        shift = full.A[self.row_keep][:, dropped].dot(self.fixed[dropped])
+        return (full.c[self.col_keep], full.col_lower[self.col_keep], full.col_upper[self.col_keep],
+            full.row_lower[self.row_keep] - shift, full.row_upper[self.row_keep] - shift)
+
+    def reduce(self):
+        full = self.full
+        model = copy.copy(full)
+        model.c, model.col_lower, model.col_upper, model.row_lower, model.row_upper = self.__values()
+        model.A = full.A[self.row_keep][:, self.col_keep].tocsr()
+        model.integrality = full.integrality[self.col_keep]
+        model.col_slices = Presolved.__slices(full.col_slices, self.col_keep, full.num_cols)
+        model.row_slices = Presolved.__slices(full.row_slices, self.row_keep, full.num_rows)
+        self.model = model
+        self.version = full.version
+        return model
+
+    #copies the full model's current values into the reduced model in place
+    #(so a persistent backend only sees the values that changed)
+    def update(self):
+        c, col_lower, col_upper, row_lower, row_upper = self.__values()
+        self.model.c[:] = c
+        self.model.col_lower[:] = col_lower
+        self.model.col_upper[:] = col_upper
+        self.model.row_lower[:] = row_lower
+        self.model.row_upper[:] = row_upper
+        self.version = self.full.version
+
+    @staticmethod
+    def __slices(slices, keep, n):
+        #kept entries of each family stay contiguous
+        kept = np.zeros(n, dtype = bool)
+        kept[keep] = True
+        before = np.concatenate([[0], np.cumsum(kept)])
+        return dict((family, slice(int(before[sl.start]), int(before[sl.stop]))) for family, sl in slices.items())
+
+    #full column vector from reduced values (e.g. a warm start the other way)
+    def expand(self, values):
+        full = self.full
+        x = self.fixed.copy()
+        x[self.col_keep] = values
+        if len(self.slack_cols):
+            #smallest value of each slack that satisfies its rows
+            A = full.A.tocsc()[:, self.slack_cols].tocoo()
+            k = self.slack_cols[A.col]
+            activity = full.A.dot(x)[A.row]
+            need = np.where(A.data < 0, (activity - full.row_upper[A.row]) / -A.data,
+                (full.row_lower[A.row] - activity) / A.data)
+            x[self.slack_cols] = full.col_lower[self.slack_cols]
+            np.maximum.at(x, k, need)
+        return x
+
+    def reduceValues(self, values):
+        if values is None:
+            return None
+        return np.asarray(values)[self.col_keep]
+
+    #a SolveResult of the reduced model as one of the full model
+    def expandResult(self, result):
+        if result.values is None:
+            return result
+        values = self.expand(result.values)
+        bound = result.bound
+        if bound is not None:
+            #the dropped columns' share of the objective is the same in every solution
+            bound += self.full.objectiveValue(values) - result.objective
+        return SolveResult(result.status, self.full.objectiveValue(values), values, result.solve_time,
+        result.backend, result.message, bound, result.iterations, result.nodes)
+
+    def __repr__(self):
+        return "Presolved(removed %d of %d columns, %d of %d rows)" % (self.removed_cols, self.full.num_cols,
+        self.removed_rows, self.full.num_rows)
+
+
+#Presolves model. previous (the Presolved of an earlier call) is reused when
+#model is the same object and the reductions did not change; its reduced
+#model is then updated in place
+def presolveModel(model, previous = None):
+    A = model.A.tocsc()
+    n = model.num_cols
+    c = model.c
+    col_lower = model.col_lower
+    col_upper = model.col_upper
+    row_lower = model.row_lower
+    row_upper = model.row_upper
+    row_drop = np.zeros(model.num_rows, dtype = bool)
+
+    #slack columns
+    coo = A.tocoo()
+    helpful = ((coo.data < 0) & (row_lower[coo.row] == -INF)) | ((coo.data > 0) & (row_upper[coo.row] == INF))
+    unhelpful = np.bincount(coo.col[~helpful], minlength = n)
+    nnz = np.diff(A.indptr)
+    slack = (c == 0) & (col_upper == INF) & (unhelpful == 0) & (nnz > 0) & ~model.integrality
+    row_drop[coo.row[slack[coo.col]]] = True
+
+    #rows implied by the column bounds
+    A_pos = A.maximum(0).tocsr()
+    A_neg = A.minimum(0).tocsr()
+    tol = 1e-9
+    with np.errstate(invalid = 'ignore'):
+        #nan (inf - inf) compares False, so such rows are kept
+        min_act = A_pos.dot(col_lower) + A_neg.dot(col_upper)
+        max_act = A_pos.dot(col_upper) + A_neg.dot(col_lower)
+        row_drop |= (min_act >= row_lower - tol) & (max_act <= row_upper + tol)
+    row_keep = np.flatnonzero(~row_drop)
+
+    #columns left without coefficients; free columns with a cost are kept
+    #(the model is unbounded and the solver should say so)
+    left = np.diff(A[row_keep].tocsc().indptr)
+    fixed = np.zeros(n)
+    fixed_at = np.where(c > 0, col_lower, np.where(c < 0, col_upper, np.where(np.isfinite(col_lower), col_lower,
+        np.where(np.isfinite(col_upper), col_upper, 0.0))))
+    empty = (left == 0) & np.isfinite(fixed_at) & ~slack
+    fixed[empty] = fixed_at[empty]
+    col_keep = np.flatnonzero(~(empty | slack))
+
+    presolved = Presolved(model, col_keep, row_keep, np.flatnonzero(slack), fixed)
+    if previous is not None and previous.full is model and presolved.sameReductions(previous):
+        previous.update()
+        return previous
+    presolved.reduce()
+    return presolved
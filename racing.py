@@ -0,0 +1,210 @@
+"""
+Racing solves: several solver configurations on one model at once.
+
+A RaceConfig is a backend (a name from solvers.BACKENDS with its options)
+and, optionally, a seed for a random order of the model's columns and rows.
+MIP branching and simplex pivoting both depend on that order, so the same
+model can take very different times in different orders. RaceBackend starts
+every configuration in its own process. The first run that proves optimality
+wins and the others are terminated. If none does within the time limit, the
+best solution found by then is returned, with the best bound any run proved.
+
+Each race is kept in RaceBackend.last_race as a RaceReport. When log is set,
+the race is also appended to that file as one line of JSON, so that the
+configurations that keep winning can be made the defaults.
+"""
+
+import copy
+import json
+import multiprocessing
+import time
+
+try:
+    from Queue import Empty
+except ImportError:
+    from queue import Empty
+
+import numpy as np
+
+from solvers import SolverBackend, SolveResult, BACKENDS, STATUS_NOT_SOLVED
+
+
+class RaceConfig(object):
+    def __init__(self, backend = "highs", seed = None, **options):
+        self.backend = backend
+        #random order of columns and rows, None for the model's own order
+        self.seed = seed
+        self.options = options
+        parts = [backend] + (["seed=%d" % seed] if seed is not None else [])
+        self.name = "/".join(parts + ["%s=%s" % item for item in sorted(options.items())])
+
+    def makeBackend(self):
+        return BACKENDS[self.backend](**self.options)
+
+    def __repr__(self):
+        return "RaceConfig(%s)" % self.name
+
+
+#a few configurations of the available backends, at most size of them
+def defaultConfigs(size = None):
+    if size is None:
+        size = multiprocessing.cpu_count()
+    configs = []
+    if BACKENDS['highs']().available():
+        configs += [RaceConfig("highs"), RaceConfig("highs", seed = 1, random_seed = 1),
+            RaceConfig("highs", seed = 2, random_seed = 2, mip_heuristic_effort = 0.3),
+            RaceConfig("highs", seed = 3, random_seed = 3, presolve = "off")]
+    if BACKENDS['scipy']().available():
+        configs.append(RaceConfig("scipy", seed = 4))
+    if BACKENDS['cbc']().available():
+        configs.append(RaceConfig("cbc", msg = False))
+    return configs[:max(size, 1)]
+
+
+#copy of model with its columns and rows in a random order, and that order
+#(new position -> old index) for columns and rows
+def permutedModel(model, seed):
+    rs = np.random.RandomState(seed)
+    cols = rs.permutation(model.num_cols)
+    rows = rs.permutation(model.num_rows)
+    permuted = copy.copy(model)
+    permuted.A = model.A.tocsr()[rows][:, cols]
+    permuted.c = model.c[cols]
+    permuted.col_lower = model.col_lower[cols]
+    permuted.col_upper = model.col_upper[cols]
+    permuted.integrality = model.integrality[cols]
+    permuted.row_lower = model.row_lower[rows]
+    permuted.row_upper = model.row_upper[rows]
+    return permuted, cols
+
+
+#solves one configuration and puts (index, SolveResult) on results, with the
+#values back in the model's column order
+def _run(results, index, config, model, warm_start, time_limit, gap):
+    try:
+        backend = config.makeBackend()
+        cols = None
+        if config.seed is not None:
+            model, cols = permutedModel(model, config.seed)
+            if warm_start is not None:
+                warm_start = np.asarray(warm_start)[cols]
+        result = backend.solve(model, warm_start, time_limit, gap)
+        if cols is not None and result.values is not None:
+            values = np.empty(len(cols))
+            values[cols] = result.values
+            result.values = values
+        results.put((index, result))
+    except Exception as e:
+        results.put((index, repr(e)))
+
+
+class RaceReport(object):
+    def __init__(self, configs):
+        self.configs = [config.name for config in configs]
+        #config name -> dict of status, objective, bound, solve_time, finished, error
+        self.runs = dict((name, dict(finished = False)) for name in self.configs)
+        self.winner = None
+        self.proven = False
+        self.total = None
+        self.created = time.strftime("%Y-%m-%dT%H:%M:%S")
+
+    def asDict(self):
+        return dict(created = self.created, configs = self.configs, runs = self.runs, winner = self.winner,
+            proven = self.proven, total = self.total)
+
+    def __str__(self):
+        lines = ["race of %d configurations, %s %s in %.2fs" % (len(self.configs), "proven optimum by" if
+            self.proven else "best result from", self.winner, self.total or 0.0)]
+        for name in self.configs:
+            run = self.runs[name]
+            if not run['finished']:
+                lines.append("  %-40s cancelled" % name)
+            elif 'error' in run:
+                lines.append("  %-40s error %s" % (name, run['error']))
+            else:
+                lines.append("  %-40s status %s, objective %r, %.2fs" % (name, run['status'], run['objective'],
+                    run['solve_time']))
+        return "\n".join(lines)
+
+
+class RaceBackend(SolverBackend):
+    name = "race"
+
+    def __init__(self, configs = None, log = None, grace = 5.0):
+        self.configs = configs if configs is not None else defaultConfigs()
+        #file to append each race to as a line of JSON, or None
+        self.log = log
+        #seconds past time_limit to wait for runs to report before cancelling them
+        self.grace = grace
+        self.last_race = None
+
+    #what adoptSolverState compares to tell whether two backends are the same
+    @property
+    def options(self):
+        return dict(configs = [config.name for config in self.configs], log = self.log, grace = self.grace)
+
+    def available(self):
+        return any(BACKENDS[config.backend]().available() for config in self.configs)
+
+    def copy(self):
+        return RaceBackend(self.configs, self.log, self.grace)
+
+    def solve(self, model, warm_start = None, time_limit = None, gap = None):
+        t = time.time()
+        configs = [config for config in self.configs if BACKENDS[config.backend]().available()]
+        report = RaceReport(configs)
+        results = multiprocessing.Queue()
+        processes = [multiprocessing.Process(target = _run, args = (results, k, config, model, warm_start,
+            time_limit, gap)) for k, config in enumerate(configs)]
+        for p in processes:
+            p.daemon = True
+            p.start()
+        deadline = None if time_limit is None else t + time_limit + self.grace
+        finished = dict()
+        best = None
+        try:
+            while len(finished) < len(processes):
+                wait = None if deadline is None else max(deadline - time.time(), 0.0)
+                try:
+                    k, result = results.get(timeout = wait)
+                except Empty:
+                    break
+                finished[k] = result
+                run = report.runs[configs[k].name]
+                run['finished'] = True
+                if not isinstance(result, SolveResult):
+                    run['error'] = result
+                    continue
+                run.update(status = result.status, objective = result.objective, bound = result.bound,
+                    solve_time = result.solve_time)
+                if result.values is not None and (best is None or result.objective < best[1].objective):
+                    best = (k, result)
+                if result.isOptimal():
+                    best = (k, result)
+                    break
+        finally:
+            for p in processes:
+                if p.is_alive():
+                    p.terminate()
+            for p in processes:
+                p.join()
+        report.total = time.time() - t
+        if best is None:
+            errors = [r for r in finished.values() if not isinstance(r, SolveResult)]
+            solved = [r for r in finished.values() if isinstance(r, SolveResult)]
+            result = solved[0] if solved else SolveResult(STATUS_NOT_SOLVED, None, None, report.total, self.name,
+                "; ".join(errors) or "no run finished")
+        else:
+            k, result = best
+            report.winner = configs[k].name
+            report.proven = result.isOptimal()
+            bounds = [r.bound for r in finished.values() if isinstance(r, SolveResult) and r.bound is not None]
+            #every run's bound is a valid bound for the model
+            bound = max(bounds) if bounds else None
+            result = SolveResult(result.status, result.objective, result.values, report.total,
+                self.name + ":" + report.winner, result.message, bound, result.iterations, result.nodes)
+        self.last_race = report
+        if self.log is not None:
+            with open(self.log, "a") as output:
+                output.write(json.dumps(report.asDict(), sort_keys = True) + "\n")
+        return result
@@ -0,0 +1,179 @@
+"""
+Rolling-horizon solve for schedules with a long budget_days.
+
+Each step solves a model with window_days detailed day columns followed by a
+coarse tail that covers the rest of the horizon in weekly buckets, then fixes
+the first step_days days of the solution and moves the window forward. The
+tail only steers the detailed days (its batch counts are relaxed to
+continuous) and is never fixed itself.
+
+Across window boundaries, due rows keep the batches still missing before each
+due date, and the abval4 week containing the window start is credited with the
+ongoing hours already fixed in that week. Weeks are the full model's: they
+start week_offset days before the schedule's start, and the first one has the
+schedule's week_credit (see history.py). The fixed schedule is priced on the
+full monolithic model at the end, so its cost is directly comparable with
+makeSchedule's. The fixed schedule is feasible but not proven optimal, so its
+status is STATUS_NOT_SOLVED, as for a schedule cut short by a time limit.
+"""
+
+import time
+
+import numpy as np
+
+from sparse_model import Horizon, buildModel, priceSchedule
+from presolve import presolveModel
+from solvers import SolveResult, STATUS_NOT_SOLVED, STATUS_INFEASIBLE, getBackend
+
+
+#status is optimal when every window solved and the fixed schedule is feasible
+#for the full model; the objective is its full-model cost, not a proven optimum
+class RollingResult(SolveResult):
+    def __init__(self, status, objective, values, solve_time, backend, message = "", windows = None):
+        super(RollingResult, self).__init__(status, objective, values, solve_time, backend, message)
+        #SolveResult of every window, in order
+        self.windows = windows if windows is not None else []
+
+
+#completable whose total_hours is what is left of the original after the
+#fixed days
+class _RemainingTask(object):
+    def __init__(self, task, total_hours):
+        self.task = task
+        self.total_hours = total_hours
+        self.batch_hours = task.batch_hours
+        self.max_day_hours = task.max_day_hours
+        self.scores = task.scores
+
+    def isBatch(self):
+        return self.task.isBatch()
+
+
+#what buildModel reads from a schedule, for one window
+class _WindowView(object):
+    def __init__(self, sched, completables, num_columns, current, perm, committed):
+        for name in ('NUM_SCORES', 'DAILY_SCORE_TARGETS', 'MISS_DAILY_SCORE_COSTS', 'TIME_COST', 'UNSMOOTH_COST',
+        'SHIFT_COST', 'MAX_DAILY_HOURS'):
+            setattr(self, name, getattr(sched, name))
+        self.completables = completables
+        self.ongoings = sched.ongoings
+        self.budget_days = num_columns
+        self.current_schedule = current
+        self.perm_task_time = perm
+        self.committed_hours = committed
+
+
+#(first day, days) of every column of the window starting at day t0: single
+#days up to t0 + window_days, then buckets ending at week boundaries (weeks
+#starting week_offset days before day 0), due dates and the end of the horizon
+def windowColumns(t0, window_days, num_days, dues, week_offset = 0):
+    detail_end = min(t0 + window_days, num_days)
+    columns = [(j, 1) for j in range(t0, detail_end)]
+    cuts = set(range(7 * ((detail_end + week_offset) // 7 + 1) - week_offset, num_days, 7))
+    cuts.update(d for d in dues if detail_end < d < num_days)
+    cuts.add(num_days)
+    first = detail_end
+    for cut in sorted(cuts):
+        if cut > first:
+            columns.append((first, cut - first))
+            first = cut
+    return columns
+
+
+#tasks x days grid summed over the columns of a window
+def _aggregate(grid, t0, offsets):
+    return np.add.reduceat(grid[:, t0:], offsets - t0, axis = 1)
+
+
+#Solves the model of sched (with dues and whether from its prepared model) one
+#window at a time. Returns (model, result): the full monolithic model and a
+#RollingResult with the fixed schedule as column values of that model
+def solveRolling(sched, dues, whether, window_days = 14, step_days = 7, backend = None):
+    if step_days < 1 or window_days < step_days:
+        raise ValueError("need 1 <= step_days <= window_days")
+    backend = getBackend(backend)
+    t = time.time()
+    completables = sched.completables
+    nc = len(completables)
+    T = nc + len(sched.ongoings)
+    D = sched.budget_days
+    week_offset = getattr(sched, 'week_offset', 0) or 0
+    credit = getattr(sched, 'week_credit', None)
+    W = (D + week_offset) // 7
+    dues = np.asarray(dues, dtype = np.int64).reshape(nc)
+    whether = np.asarray(whether, dtype = float).reshape(T, D)
+    current = np.asarray(sched.current_schedule, dtype = float).reshape(T, D)
+    perm = np.asarray(sched.perm_task_time, dtype = float).reshape(T, D)
+    committed = getattr(sched, 'committed_hours', None)
+    committed = np.zeros((1, D)) if committed is None else np.asarray(committed, dtype = float).reshape(1, D)
+    batches = np.array([task.batch_hours for task in list(completables) + list(sched.ongoings)], dtype = float)
+    total_hours = np.array([c.total_hours for c in completables], dtype = float)
+    #batches each due row asks for before its due date in the full model
+    due_need = np.zeros(nc)
+    for k in np.flatnonzero(dues > 0):
+        due_need[k] = int(total_hours[k] / batches[k] * float(min(dues[k], D)) / dues[k])
+
+    fixed = np.zeros((T, D))
+    windows = []
+    t0 = 0
+    while t0 < D:
+        columns = windowColumns(t0, window_days, D, dues, week_offset)
+        offsets = np.array([first for first, days in columns])
+        weights = np.array([days for first, days in columns], dtype = float)
+        #day -> column of this window
+        column_of = np.repeat(np.arange(len(columns)), weights.astype(np.int64))
+
+        first_week = (t0 + week_offset) // 7
+        week = (offsets + week_offset) // 7
+        week_index = np.where(week < W, week - first_week, -1)
+        num_weeks = max(W - first_week, 0)
+        week_credit = None
+        if num_weeks and (t0 + week_offset) % 7:
+            #hours of the week before t0: fixed ones, and before day 0 the credit
+            week_start = 7 * first_week - week_offset
+            week_credit = np.zeros((T - nc, num_weeks))
+            week_credit[:, 0] = fixed[nc:, max(week_start, 0):t0].sum(axis = 1)
+            if week_start < 0 and credit is not None:
+                week_credit[:, 0] += credit
+        horizon = Horizon(weights, offsets - t0, week_index, num_weeks, D - t0, week_credit)
+
+        done = fixed[:, :t0].sum(axis = 1)
+        remaining = [_RemainingTask(completables[k], max(total_hours[k] - done[k], 0.0)) for k in range(nc)]
+        local_dues = np.where(dues > t0, dues - t0, 0)
+        allowed = _aggregate(whether, t0, offsets)
+        view = _WindowView(sched, remaining, len(columns), _aggregate(current, t0, offsets), _aggregate(perm, t0, offsets),
+            _aggregate(committed, t0, offsets)[0])
+        model = buildModel(view, local_dues, (allowed > 0).astype(float), horizon)
+
+        #batches still missing before each due date, and bucket capacity
+        #limited to the allowed days in the bucket
+        due_rows = model.row_slices['due'].start + np.arange(len(model.due_rows))
+        for r, k in zip(due_rows, model.due_rows):
+            model.row_lower[r] = max(due_need[k] - fixed[k, :t0].sum() / batches[k], 0.0)
+        x = model.col_slices['x']
+        col_upper = model.col_upper[x].reshape(T, len(columns))
+        col_upper[:] = np.where(weights > 1, col_upper / weights * allowed, col_upper)
+        model.col_upper[x] = col_upper.ravel()
+        coarse = np.zeros((T, len(columns)), dtype = bool)
+        coarse[:, weights > 1] = True
+        model.integrality[x] = model.integrality[x] & ~coarse.ravel()
+
+        presolved = presolveModel(model)
+        result = presolved.expandResult(backend.solve(presolved.model))
+        windows.append(result)
+        if not result.isOptimal():
+            return None, RollingResult(result.status, None, None, time.time() - t, backend.name,
+            "window at day %d: %s" % (t0, result.message), windows)
+        hours = model.scheduleFromSolution(result.values)
+        step = step_days if t0 + window_days < D else D - t0
+        fixed[:, t0:t0 + step] = hours[:, column_of[:step]]
+        t0 += step
+
+    #price the fixed schedule on the full model
+    full, values, feasible = priceSchedule(sched, dues, whether, fixed)
+    status = STATUS_NOT_SOLVED if feasible else STATUS_INFEASIBLE
+    message = "%d windows" % len(windows)
+    if not feasible:
+        message += ", fixed schedule violates the full model"
+    return full, RollingResult(status, full.objectiveValue(values), values, time.time() - t, backend.name,
+    message, windows)
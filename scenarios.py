@@ -0,0 +1,182 @@
+"""
+What-if solves of one schedule under several sets of constants.
+
+A Scenario only changes constants that reach the objective and the row
+bounds: the score targets and their miss costs, TIME_COST, UNSMOOTH_COST,
+SHIFT_COST and MAX_DAILY_HOURS (a number, one value per day, or a dict of
+weekday -> hours, e.g. {5: 6.0, 6: 6.0} for short weekends). So the model is
+built once, and each scenario is that model with new cost and bound vectors,
+checked against its structure key.
+
+runScenarios hands the scenarios out to worker processes that each get one
+copy of the model and a backend. A worker patches its copy in place for every
+scenario and re-solves warm from the one before (HiGHS keeps its basis, MIPs
+start from the schedule's last solution). The results come back as a
+ScenarioTable with the cost, score totals and hours per day of each scenario.
+"""
+
+import multiprocessing
+
+import numpy as np
+
+from sparse_model import buildModel, scenarioValues
+from solvers import getBackend, STATUS_OPTIMAL
+
+SCENARIO_CONSTANTS = ('DAILY_SCORE_TARGETS', 'MISS_DAILY_SCORE_COSTS', 'TIME_COST', 'UNSMOOTH_COST', 'SHIFT_COST',
+    'MAX_DAILY_HOURS')
+
+
+class Scenario(object):
+    def __init__(self, name, **constants):
+        unknown = sorted(set(constants) - set(SCENARIO_CONSTANTS))
+        if unknown:
+            raise ValueError("a scenario can only change %s, not %s" % (", ".join(SCENARIO_CONSTANTS),
+                ", ".join(unknown)))
+        self.name = name
+        self.constants = constants
+
+    def __repr__(self):
+        return "Scenario(%r, %s)" % (self.name, ", ".join("%s=%r" % item for item in sorted(self.constants.items())))
+
+
+#what buildModel reads from a schedule, with a scenario's constants
+class _ScenarioView(object):
+    def __init__(self, sched, scenario):
+        for name in ('NUM_SCORES', 'completables', 'ongoings', 'budget_days', 'current_schedule', 'perm_task_time',
+        'committed_hours', 'week_offset', 'week_credit') + SCENARIO_CONSTANTS:
+            setattr(self, name, getattr(sched, name, None))
+        for name, value in scenario.constants.items():
+            setattr(self, name, value)
+        if isinstance(self.MAX_DAILY_HOURS, dict):
+            default = sched.MAX_DAILY_HOURS
+            self.MAX_DAILY_HOURS = [self.MAX_DAILY_HOURS.get(sched.indexToDate(j).weekday(), default)
+                for j in range(sched.budget_days)]
+
+
+class ScenarioResult(object):
+    def __init__(self, name, status, objective, hours, score_labels, scores, solve_time, message = ""):
+        self.name = name
+        self.status = status
+        #cost of the scenario's schedule under its own constants
+        self.objective = objective
+        #tasks x days hours, None if the solve found no solution
+        self.hours = hours
+        self.score_labels = score_labels
+        self.solve_time = solve_time
+        self.message = message
+        if hours is not None:
+            self.day_hours = hours.sum(axis = 0)
+            #days x scores totals, and their sums over the horizon
+            self.day_scores = hours.T.dot(scores)
+            self.score_totals = self.day_scores.sum(axis = 0)
+        else:
+            self.day_hours = self.day_scores = self.score_totals = None
+
+    def isOptimal(self):
+        return self.status == STATUS_OPTIMAL
+
+    def asDict(self):
+        out = dict(name = self.name, status = self.status, objective = self.objective, solve_time = self.solve_time,
+            message = self.message)
+        if self.hours is not None:
+            out.update(day_hours = self.day_hours.tolist(),
+                score_totals = dict(zip(self.score_labels, self.score_totals.tolist())))
+        return out
+
+    def __repr__(self):
+        return "ScenarioResult(%r, status=%s, objective=%r)" % (self.name, self.status, self.objective)
+
+
+#ScenarioResults in the order the scenarios were given
+class ScenarioTable(object):
+    def __init__(self, results):
+        self.results = results
+
+    def __len__(self):
+        return len(self.results)
+
+    def __iter__(self):
+        return iter(self.results)
+
+    def __getitem__(self, name):
+        for result in self.results:
+            if result.name == name:
+                return result
+        raise KeyError(name)
+
+    def asDicts(self):
+        return [result.asDict() for result in self.results]
+
+    def __str__(self):
+        if not self.results:
+            return "no scenarios"
+        labels = self.results[0].score_labels
+        width = max([8] + [len(str(r.name)) for r in self.results])
+        lines = ["%-*s %6s %14s  %s  | hours per day" % (width, "scenario", "status", "cost",
+            " ".join("%10s" % label[:10] for label in labels))]
+        for r in self.results:
+            if r.hours is None:
+                lines.append("%-*s %6s %14s  %s" % (width, r.name, r.status, "-", r.message))
+                continue
+            lines.append("%-*s %6s %14.2f  %s  | %s" % (width, r.name, r.status, r.objective,
+                " ".join("%10.1f" % v for v in r.score_totals), " ".join("%.1f" % h for h in r.day_hours)))
+        return "\n".join(lines)
+
+
+#per-process copy of the base model, backend and warm start for runScenarios
+_worker_state = None
+
+
+def _initWorker(model, backend, warm_start, time_limit, gap):
+    global _worker_state
+    _worker_state = (model, backend, warm_start, time_limit, gap)
+
+
+def _solveJob(job):
+    return _solve(_worker_state, job)
+
+
+#patches model with a scenario's vectors and solves it; returns what the
+#ScenarioResult needs, with the schedule as hours rather than all the columns
+def _solve(state, job):
+    model, backend, warm_start, time_limit, gap = state
+    name, (c, col_lower, col_upper, row_lower, row_upper) = job
+    model.c[:] = c
+    model.col_lower[:] = col_lower
+    model.col_upper[:] = col_upper
+    model.row_lower[:] = row_lower
+    model.row_upper[:] = row_upper
+    model.version += 1
+    result = backend.solve(model, warm_start, time_limit = time_limit, gap = gap)
+    hours = model.scheduleFromSolution(result.values) if result.values is not None else None
+    return name, result.status, result.objective, hours, result.solve_time, result.message
+
+
+#solves sched (with dues and whether from its prepared model) once per
+#scenario over workers processes and returns a ScenarioTable. warm_start is a
+#column vector of an earlier solve of the same model structure, or None
+def runScenarios(sched, dues, whether, scenarios, workers = 1, backend = None, time_limit = None, gap = None,
+warm_start = None):
+    model = buildModel(sched, dues, whether)
+    if warm_start is not None and len(warm_start) != model.num_cols:
+        warm_start = None
+    jobs = [(s.name, scenarioValues(model, _ScenarioView(sched, s), dues, whether)) for s in scenarios]
+    backend = getBackend(backend)
+    if workers <= 1 or len(jobs) <= 1:
+        state = (model, backend, warm_start, time_limit, gap)
+        solved = [_solve(state, job) for job in jobs]
+    else:
+        pool = multiprocessing.Pool(min(workers, len(jobs)), _initWorker, (model, backend, warm_start, time_limit,
+            gap))
+        try:
+            #neighbouring scenarios go to the same worker, which re-solves them warm
+            solved = pool.map(_solveJob, jobs, chunksize = max(1, len(jobs) // (2 * workers)))
+        finally:
+            pool.close()
+            pool.join()
+    S = sched.NUM_SCORES
+    tasks = list(sched.completables) + list(sched.ongoings)
+    scores = np.array([list(t.scores)[:S] for t in tasks], dtype = float).reshape(len(tasks), S)
+    labels = tuple(sched.SCORE_LABELS[:S])
+    return ScenarioTable([ScenarioResult(name, status, objective, hours, labels, scores, solve_time, message)
+        for name, status, objective, hours, solve_time, message in solved])
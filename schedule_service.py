@@ -0,0 +1,533 @@
+"""
+Scheduling service: solves the schedules of many users on one bounded pool of
+worker processes that stay up between requests.
+
+Requests are queued by priority (higher first, then oldest first) and handed
+to idle workers. Each worker keeps the last solved Schedule of the users it
+served (up to cache_size of them), and a user's requests go back to the same
+worker when it is idle, so a repeated solve patches the kept model and warm
+starts its backend instead of rebuilding (see Schedule.adoptSolverState).
+
+A request for a user who already has one waiting replaces the waiting one's
+schedule and keeps the higher priority; both callers get the result of the
+newer schedule. A request identical to one that is running waits for that
+one's result. Jobs can be cancelled; a running solve is not interrupted, its
+result just goes nowhere.
+
+serve() puts a ScheduleService behind a unix socket and ServiceClient talks to
+it. Messages are pickles, so the socket must only be reachable by trusted
+local users.
+"""
+
+import copy
+import heapq
+import itertools
+import multiprocessing
+import os
+import socket
+import struct
+import threading
+import time
+import traceback
+from collections import OrderedDict
+from datetime import timedelta
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+try:
+    import SocketServer as socketserver
+except ImportError:
+    import socketserver
+
+try:
+    import Queue as queue
+except ImportError:
+    import queue
+
+
+class JobResult(object):
+    def __init__(self, user, result = None, current_schedule = None, cost = None, error = None, worker = None,
+    wait_time = None, run_time = None, update = None):
+        self.user = user
+        #solvers.SolveResult of makeSchedule, without column values
+        self.result = result
+        #tasks x days hours as lists, None if the solve raised
+        self.current_schedule = current_schedule
+        self.cost = cost
+        #traceback of an exception raised in the worker
+        self.error = error
+        self.worker = worker
+        #seconds spent queued and solving
+        self.wait_time = wait_time
+        self.run_time = run_time
+        #Schedule.last_update of the solve: whether the kept model was patched
+        self.update = update
+
+    def __nonzero__(self):
+        return self.error is None and self.result is not None and self.result.isOptimal()
+
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        if self.error is not None:
+            return "JobResult(user=%r, error)" % (self.user,)
+        return "JobResult(user=%r, cost=%r, worker=%r, run_time=%.3f)" % (self.user, self.cost, self.worker,
+        self.run_time or 0.0)
+
+
+#what a caller holds for one request
+class Job(object):
+    def __init__(self, service, user):
+        self.service = service
+        self.user = user
+        self.result = None
+        self._task = None
+        self._cancelled = False
+        self._event = threading.Event()
+        self._callbacks = []
+
+    def done(self):
+        return self._event.is_set()
+
+    def cancelled(self):
+        return self._cancelled
+
+    #returns True if the job will not deliver a result
+    def cancel(self):
+        return self.service._cancel(self)
+
+    #the JobResult, or None if the job was cancelled or timeout ran out
+    def wait(self, timeout = None):
+        self._event.wait(timeout)
+        return self.result
+
+    #calls fn(job) once the job is done or cancelled (right away if it is)
+    def addDoneCallback(self, fn):
+        with self.service._lock:
+            if not self.done():
+                self._callbacks.append(fn)
+                return
+        fn(self)
+
+    def _finish(self, result, cancelled = False):
+        self.result = result
+        self._cancelled = cancelled
+        self._event.set()
+        for fn in self._callbacks:
+            fn(self)
+        self._callbacks = []
+
+
+#one queued or running solve, shared by the Jobs merged into it
+class _Request(object):
+    def __init__(self, user, payload, priority):
+        self.user = user
+        self.payload = payload
+        self.priority = priority
+        self.jobs = []
+        self.state = "waiting"
+        self.entry = None
+        self.submitted = time.time()
+        self.started = None
+
+
+#pickled (schedule, options) for a worker. the solver state and caches are
+#left out: the worker keeps or rebuilds its own, and equal schedules give
+#equal payloads. of the history only the weeks makeSchedule reads are sent
+#(the current one, or the last archived); the registry goes along since the
+#history refers to tasks by its ids
+def _payload(schedule, options):
+    light = copy.copy(schedule)
+    for name in _SOLVER_STATE:
+        light.__dict__.pop(name, None)
+    history = schedule.history
+    if history is not None and len(history) and schedule.start >= history.origin:
+        last = history.end() - timedelta(days = 1)
+        light.history = history.since(history.weekStart(min(schedule.start, last)))
+    return pickle.dumps((light, options), pickle.HIGHEST_PROTOCOL)
+
+_SOLVER_STATE = ('_model', '_model_tasks', '_model_start', '_backend', '_values', '_sensitivity', 'last_update',
+    '_prereq_graph', 'last_presolve', 'last_record', 'on_solve', 'solution_cache', 'committed', '_untasked',
+    'committed_hours', '_perm_key', '_perm_start', '_perm_days', '_availability', '_availability_key')
+
+
+def _workerMain(conn, cache_size):
+    #imported here so the solver libraries load once per worker
+    import final_scheduler
+    schedules = OrderedDict()
+    while True:
+        message = conn.recv()
+        if message is None:
+            break
+        user, payload = message
+        t = time.time()
+        try:
+            schedule, options = pickle.loads(payload)
+            previous = schedules.pop(user, None)
+            if previous is not None:
+                schedule.adoptSolverState(previous)
+            result = schedule.makeSchedule(**options)
+            schedules[user] = schedule
+            while len(schedules) > cache_size:
+                schedules.popitem(last = False)
+            result.values = None
+            reply = JobResult(user, result, schedule.current_schedule.tolist(), schedule.cost,
+            run_time = time.time() - t, update = schedule.last_update)
+        except Exception:
+            reply = JobResult(user, error = traceback.format_exc(), run_time = time.time() - t)
+        conn.send(reply)
+    conn.close()
+
+
+class ScheduleService(object):
+    #keep_finished queues every finished or cancelled Job for results(); leave
+    #it off when results() is not used, or the queue keeps them all
+    def __init__(self, workers = 2, cache_size = 32, keep_finished = False):
+        self._lock = threading.Condition()
+        self._heap = []
+        self._order = itertools.count()
+        #user -> waiting _Request, worker -> running _Request
+        self._waiting = dict()
+        self._running = dict()
+        #user -> worker that last solved for the user
+        self._home = dict()
+        self._idle = []
+        #workers whose process is gone
+        self._dead = set()
+        self._finished = queue.Queue() if keep_finished else None
+        self._closed = False
+        self._conns = []
+        self._processes = []
+        self._threads = []
+        for k in range(workers):
+            conn, child = multiprocessing.Pipe()
+            process = multiprocessing.Process(target = _workerMain, args = (child, cache_size))
+            process.daemon = True
+            process.start()
+            child.close()
+            self._conns.append(conn)
+            self._processes.append(process)
+            self._idle.append(k)
+            self.__startThread(self.__collect, k)
+        self.__startThread(self.__dispatch)
+
+    def __startThread(self, target, *args):
+        thread = threading.Thread(target = target, args = args)
+        thread.daemon = True
+        thread.start()
+        self._threads.append(thread)
+
+    @property
+    def workers(self):
+        return len(self._conns)
+
+    #queues a makeSchedule of schedule (with options, e.g. time_limit) for
+    #user and returns its Job
+    def submit(self, user, schedule, priority = 0, **options):
+        payload = _payload(schedule, options)
+        job = Job(self, user)
+        with self._lock:
+            if self._closed:
+                raise RuntimeError("service is closed")
+            request = self._waiting.get(user)
+            running = [r for r in self._running.values() if r.user == user and r.payload == payload]
+            if request is not None:
+                request.payload = payload
+                if priority > request.priority:
+                    request.priority = priority
+                    self.__push(request)
+            elif running:
+                request = running[0]
+            else:
+                request = _Request(user, payload, priority)
+                self._waiting[user] = request
+                self.__push(request)
+                self._lock.notify_all()
+            request.jobs.append(job)
+            job._task = request
+        return job
+
+    #submit and wait for the JobResult
+    def solve(self, user, schedule, priority = 0, **options):
+        return self.submit(user, schedule, priority, **options).wait()
+
+    #finished Jobs in the order they finish; blocks for up to timeout seconds
+    #for each (None for no limit) and stops when none finished in time. needs
+    #keep_finished
+    def results(self, timeout = None):
+        if self._finished is None:
+            raise RuntimeError("results() needs a ScheduleService(keep_finished = True)")
+        return self.__results(timeout)
+
+    def __results(self, timeout):
+        while True:
+            try:
+                yield self._finished.get(timeout = timeout) if timeout is not None else self._finished.get()
+            except queue.Empty:
+                return
+
+    #number of waiting and running requests
+    def pending(self):
+        with self._lock:
+            return len(self._waiting), len(self._running)
+
+    def __push(self, request):
+        #stale heap entries are skipped by comparing with request.entry
+        request.entry = (-request.priority, next(self._order), request)
+        heapq.heappush(self._heap, request.entry)
+
+    #the next request to run and its worker: the highest priority first, and
+    #among equal priorities the oldest request whose user's worker is idle
+    def __next(self):
+        while self._heap:
+            entry = self._heap[0]
+            request = entry[2]
+            if request.entry is entry and request.state == "waiting":
+                break
+            heapq.heappop(self._heap)
+        else:
+            return None, None
+        home = [e for e in self._heap if e[0] == entry[0] and e[2].entry is e and e[2].state == "waiting" and
+            self._home.get(e[2].user) in self._idle]
+        if home:
+            entry = min(home)
+            return entry[2], self._home[entry[2].user]
+        return request, self._idle[0]
+
+    def _cancel(self, job):
+        with self._lock:
+            request = job._task
+            if job.done() or request is None or job not in request.jobs:
+                return False
+            request.jobs.remove(job)
+            if not request.jobs and request.state == "waiting":
+                request.state = "cancelled"
+                del self._waiting[request.user]
+        job._finish(None, cancelled = True)
+        self.__keep(job)
+        return True
+
+    def __keep(self, job):
+        if self._finished is not None:
+            self._finished.put(job)
+
+    #takes worker k out of the pool; with the lock held
+    def __dropWorker(self, k):
+        self._dead.add(k)
+        if k in self._idle:
+            self._idle.remove(k)
+        for user in [user for user, home in self._home.items() if home == k]:
+            del self._home[user]
+
+    def __dispatch(self):
+        while True:
+            failed = []
+            with self._lock:
+                while not self._closed and not (self._waiting and (self._idle or len(self._dead) == self.workers)):
+                    self._lock.wait()
+                if self._closed:
+                    return
+                if not self._idle:
+                    #every worker is gone
+                    failed = [(request, list(request.jobs), None) for request in self._waiting.values()]
+                    self._waiting.clear()
+                    error = "no workers left"
+                else:
+                    request, k = self.__next()
+                    if request is None:
+                        continue
+                    request.entry = None
+                    self._idle.remove(k)
+                    del self._waiting[request.user]
+                    request.state = "running"
+                    request.started = time.time()
+                    self._running[k] = request
+                    self._home[request.user] = k
+                    try:
+                        self._conns[k].send((request.user, request.payload))
+                    except (IOError, OSError, EOFError):
+                        del self._running[k]
+                        self.__dropWorker(k)
+                        failed = [(request, list(request.jobs), k)]
+                        error = "worker %d exited" % k
+                        self._lock.notify_all()
+                for request, jobs, k in failed:
+                    request.state = "done"
+            for request, jobs, k in failed:
+                reply = JobResult(request.user, error = error, worker = k)
+                for job in jobs:
+                    job._finish(reply)
+                    self.__keep(job)
+
+    def __collect(self, k):
+        conn = self._conns[k]
+        while True:
+            try:
+                reply = conn.recv()
+            except (EOFError, IOError, OSError):
+                reply = None
+            with self._lock:
+                request = self._running.pop(k, None)
+                if reply is not None:
+                    self._idle.append(k)
+                else:
+                    self.__dropWorker(k)
+                self._lock.notify_all()
+                if request is None:
+                    return
+                request.state = "done"
+                jobs = list(request.jobs)
+            if reply is None:
+                #the worker is gone and is not given more work
+                reply = JobResult(request.user, error = "worker %d exited" % k)
+            reply.worker = k
+            reply.wait_time = request.started - request.submitted
+            for job in jobs:
+                job._finish(reply)
+                self.__keep(job)
+            if reply.error is not None and reply.run_time is None:
+                return
+
+    #stops the workers after the running solves; waiting jobs are cancelled
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            waiting = list(self._waiting.values())
+            self._waiting.clear()
+            for request in waiting:
+                request.state = "cancelled"
+            self._lock.notify_all()
+        for request in waiting:
+            for job in request.jobs:
+                job._finish(None, cancelled = True)
+        for conn in self._conns:
+            try:
+                conn.send(None)
+            except (IOError, OSError, EOFError):
+                pass
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+#length-prefixed pickles over a socket
+def _sendMessage(sock, message):
+    data = pickle.dumps(message, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(struct.pack("!I", len(data)) + data)
+
+
+def _recvExactly(sock, n):
+    chunks = []
+    while n > 0:
+        chunk = sock.recv(n)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        n -= len(chunk)
+    return b"".join(chunks)
+
+
+def _recvMessage(sock):
+    header = _recvExactly(sock, 4)
+    if header is None:
+        return None
+    data = _recvExactly(sock, struct.unpack("!I", header)[0])
+    if data is None:
+        return None
+    return pickle.loads(data)
+
+
+#one client connection: ("solve", tag, user, schedule, priority, options) and
+#("cancel", tag) in, (tag, JobResult or None if cancelled) out as jobs finish
+class _Handler(socketserver.BaseRequestHandler):
+    def handle(self):
+        service = self.server.service
+        send_lock = threading.Lock()
+        jobs = dict()
+
+        def reply(tag, job):
+            with send_lock:
+                try:
+                    _sendMessage(self.request, (tag, job.result))
+                except socket.error:
+                    pass
+
+        while True:
+            message = _recvMessage(self.request)
+            if message is None:
+                break
+            if message[0] == "solve":
+                tag, user, schedule, priority, options = message[1:]
+                job = service.submit(user, schedule, priority, **options)
+                jobs[tag] = job
+                job.addDoneCallback(lambda job, tag = tag: reply(tag, job))
+            elif message[0] == "cancel" and message[1] in jobs:
+                jobs[message[1]].cancel()
+        #the client went away
+        for job in jobs.values():
+            job.cancel()
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+#a server for service on the unix socket at path. it handles requests once
+#serve_forever() is called on it (e.g. on a thread), until shutdown()
+def serve(service, path):
+    if os.path.exists(path):
+        os.remove(path)
+    server = _Server(path, _Handler)
+    server.service = service
+    return server
+
+
+class ServiceClient(object):
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(path)
+        self._tags = itertools.count()
+
+    #queues a solve and returns its tag
+    def submit(self, user, schedule, priority = 0, **options):
+        tag = next(self._tags)
+        _sendMessage(self.sock, ("solve", tag, user, schedule, priority, options))
+        return tag
+
+    def cancel(self, tag):
+        _sendMessage(self.sock, ("cancel", tag))
+
+    #(tag, JobResult) pairs as the jobs finish, until count have arrived;
+    #the JobResult is None for a cancelled job
+    def results(self, count):
+        for k in range(count):
+            message = _recvMessage(self.sock)
+            if message is None:
+                return
+            yield message
+
+    #submit and wait for the result; results of other jobs that arrive in
+    #the meantime are dropped
+    def solve(self, user, schedule, priority = 0, **options):
+        tag = self.submit(user, schedule, priority, **options)
+        while True:
+            message = _recvMessage(self.sock)
+            if message is None:
+                return None
+            if message[0] == tag:
+                return message[1]
+
+    def close(self):
+        self.sock.close()
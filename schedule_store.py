@@ -0,0 +1,361 @@
+"""
+Versioned columnar file format for schedules, used by Schedule.save and
+Schedule.loadSchedule in place of pickling the whole object graph.
+
+A file is the magic bytes, the format version, a JSON header and then raw
+little-endian arrays, each starting on a 64 byte boundary:
+
+- one column per task field for the completables and the ongoings (hours,
+  flags, due dates, task ids, a tasks x scores matrix), with names,
+  descriptions and availability patterns in the header
+- the prerequisite edge list as an (edges x 2) array of (task, prereq) rows
+- current_schedule and perm_task_time as tasks x days arrays
+- the archived days of history (see history.py), as task ids x days hours
+  and days x (hours, score totals) arrays
+
+The schedule constants and the blocks (with their rrule as an RFC 5545 string
+and its position) live in the header. Solver state (models, backends, caches)
+is not stored; it is rebuilt on the next solve.
+
+ScheduleFile reads the header only and memory-maps arrays on request, so one
+grid, or one day of it, can be read without loading the rest. Readers ignore
+columns they do not know and fill in defaults for columns a file lacks, so
+adding a task field does not break older files. Files that do not start with
+the magic bytes are taken to be old pickles (see migrate).
+"""
+
+import json
+import math
+import os
+import pickle
+import struct
+import tempfile
+from collections import OrderedDict
+from datetime import date, datetime, timedelta
+
+import numpy as np
+
+from day_grid import DayGrid
+from availability import Availability
+from ical_import import Recurrence
+from task_registry import TaskRegistry
+from history import ScheduleHistory
+
+MAGIC = b"SCHEDCOL"
+FORMAT_VERSION = 1
+_ALIGN = 64
+#magic, version, header length
+_PREAMBLE = struct.Struct("<8sIQ")
+
+SCHEDULE_FIELDS = ('SHIFT_COST', 'TIME_COST', 'UNSMOOTH_COST', 'SCORE_LABELS', 'DAILY_SCORE_TARGETS',
+    'MISS_DAILY_SCORE_COSTS', 'MAX_DAILY_HOURS', 'budget_days', 'cost', 'is_up_to_date')
+#numeric task columns and their defaults
+TASK_COLUMNS = OrderedDict([('max_day_hours', 24.0), ('max_block_length', 24.0), ('min_block_length', 0.0),
+    ('is_batch', 0), ('batch_hours', 1.0)])
+COMPLETABLE_COLUMNS = OrderedDict([('total_hours', 0.0)])
+ONGOING_COLUMNS = OrderedDict([('week_hours', 0.0), ('miss_week_cost', 0.0)])
+
+
+class FormatError(ValueError):
+    pass
+
+
+def _dateToJson(d):
+    if d is None:
+        return None
+    if isinstance(d, datetime):
+        return {'datetime': d.isoformat()}
+    return {'date': d.isoformat()}
+
+
+def _dateFromJson(value):
+    if value is None:
+        return None
+    if 'date' in value:
+        return date(*[int(v) for v in value['date'].split("-")])
+    from dateutil import parser
+    return parser.parse(value['datetime'])
+
+
+def isScheduleFile(filename):
+    with open(filename, 'rb') as input:
+        return input.read(len(MAGIC)) == MAGIC
+
+
+def _aligned(n):
+    return (n + _ALIGN - 1) // _ALIGN * _ALIGN
+
+
+#writes meta (json-able) and arrays (name -> ndarray) to filename; the file
+#is replaced only once it is complete
+def _writeFile(filename, meta, arrays):
+    entries = OrderedDict()
+    offset = 0
+    for name, a in arrays.items():
+        a = np.ascontiguousarray(a, dtype = a.dtype.newbyteorder('<'))
+        arrays[name] = a
+        entries[name] = {'dtype': a.dtype.str, 'shape': list(a.shape), 'offset': offset}
+        offset = _aligned(offset + a.nbytes)
+    header = dict(meta, arrays = entries)
+    text = json.dumps(header, sort_keys = True).encode('utf-8')
+    data_start = _aligned(_PREAMBLE.size + len(text))
+    directory = os.path.dirname(os.path.abspath(filename))
+    fd, tmp = tempfile.mkstemp(dir = directory, suffix = ".tmp")
+    try:
+        with os.fdopen(fd, 'wb') as output:
+            output.write(_PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(text)))
+            output.write(text)
+            for name, a in arrays.items():
+                output.seek(data_start + entries[name]['offset'])
+                output.write(a.tobytes())
+        os.rename(tmp, filename)
+    except Exception:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+#scores of tasks as a tasks x width matrix padded with nan, and their lengths
+def _scoreMatrix(tasks):
+    lengths = np.array([len(t.scores) for t in tasks], dtype = np.int32)
+    width = int(lengths.max()) if len(tasks) else 0
+    scores = np.full((len(tasks), width), np.nan)
+    for i in range(len(tasks)):
+        scores[i, :lengths[i]] = tasks[i].scores
+    return scores, lengths
+
+
+def _taskArrays(prefix, tasks, columns, arrays, meta):
+    for name, default in list(TASK_COLUMNS.items()) + list(columns.items()):
+        dtype = np.uint8 if name == 'is_batch' else np.float64
+        arrays[prefix + name] = np.array([getattr(t, name) for t in tasks], dtype = dtype).reshape(len(tasks))
+    arrays[prefix + 'scores'], arrays[prefix + 'score_lengths'] = _scoreMatrix(tasks)
+    meta['name'] = [t.name for t in tasks]
+    meta['descr'] = [getattr(t, 'descr', "") for t in tasks]
+    meta['availability'] = [t.availability.asDict() if getattr(t, 'availability', None) is not None else None
+        for t in tasks]
+
+
+def _blockToJson(block, task_index):
+    rr = None
+    if block.rr is not None:
+        rule = block.rr.rr
+        if isinstance(rule, (list, tuple)):
+            rr = {'dates': [_dateToJson(d) for d in rule], 'index': block.rr.index}
+        elif isinstance(rule, Recurrence):
+            rr = {'recurrence': rule.rule, 'dtstart': _dateToJson(rule.dtstart),
+                'exdates': [_dateToJson(d) for d in sorted(rule.exdates)],
+                'rdates': [_dateToJson(d) for d in rule.rdates], 'index': block.rr.index}
+        else:
+            rr = {'rule': str(rule), 'index': block.rr.index}
+    task = task_index.get(id(block.task)) if block.task is not None else None
+    return {'name': block.name, 'start': _dateToJson(block.start), 'duration': block.duration,
+        'scores': list(block.scores) if block.scores is not None else None, 'task': task,
+        'window_days': getattr(block, 'window_days', 1), 'rr': rr}
+
+
+#writes schedule to filename in the columnar format
+def writeSchedule(schedule, filename):
+    completables = list(schedule.completables)
+    ongoings = list(schedule.ongoings)
+    #prereqs outside the schedule are stored as unscheduled completables
+    index = dict((id(t), k) for k, t in enumerate(completables))
+    k = 0
+    while k < len(completables):
+        for p in completables[k].prereqs:
+            if id(p) not in index:
+                index[id(p)] = len(completables)
+                completables.append(p)
+        k += 1
+    edges = np.array([(index[id(t)], index[id(p)]) for t in completables for p in t.prereqs],
+        dtype = np.int64).reshape(-1, 2)
+
+    arrays = OrderedDict()
+    meta = OrderedDict()
+    meta['schedule'] = dict((name, getattr(schedule, name)) for name in SCHEDULE_FIELDS)
+    meta['schedule']['cost'] = float(schedule.cost)
+    meta['schedule']['is_up_to_date'] = bool(schedule.is_up_to_date)
+    meta['schedule']['start'] = _dateToJson(schedule.start)
+    meta['completables'] = dict()
+    _taskArrays('completables.', completables, COMPLETABLE_COLUMNS, arrays, meta['completables'])
+    meta['completables']['num_scheduled'] = len(schedule.completables)
+    dues = [t.due for t in completables]
+    arrays['completables.due_ordinal'] = np.array([0 if d is None else d.toordinal() for d in dues], dtype = np.int64)
+    #seconds into the day for datetime dues, nan for dates
+    arrays['completables.due_seconds'] = np.array([float((d - datetime.combine(d.date(), datetime.min.time()))
+        .total_seconds()) if isinstance(d, datetime) else np.nan for d in dues])
+    meta['ongoings'] = dict()
+    _taskArrays('ongoings.', ongoings, ONGOING_COLUMNS, arrays, meta['ongoings'])
+    #the schedule's task ids, -1 for prereqs outside it
+    ids = schedule.taskRegistry().ids()
+    arrays['completables.task_id'] = np.array([ids.get(t, -1) for t in completables], dtype = np.int64)
+    arrays['ongoings.task_id'] = np.array([ids[t] for t in ongoings], dtype = np.int64)
+    arrays['prereqs'] = edges
+    for name in ('current_schedule', 'perm_task_time'):
+        grid = getattr(schedule, name)
+        if not isinstance(grid, DayGrid):
+            grid = DayGrid.fromRows(grid, schedule.budget_days)
+        arrays[name] = grid.array()
+
+    history = getattr(schedule, 'history', None)
+    if history is not None and history.origin is not None:
+        meta['history'] = {'origin': _dateToJson(history.origin)}
+        ids, firsts, hours, days = history.asArrays()
+        arrays['history.task_id'] = ids
+        arrays['history.first'] = firsts
+        arrays['history.hours'] = hours
+        arrays['history.days'] = days
+
+    task_index = dict((id(t), ['completables', k]) for k, t in enumerate(schedule.completables))
+    task_index.update((id(t), ['ongoings', k]) for k, t in enumerate(ongoings))
+    meta['blocks'] = dict((name, [_blockToJson(b, task_index) for b in getattr(schedule, name)])
+        for name in ('flex_blocks', 'perm_blocks'))
+    _writeFile(filename, meta, arrays)
+
+
+#header and lazily read arrays of a columnar schedule file
+class ScheduleFile(object):
+    def __init__(self, filename):
+        self.filename = filename
+        with open(filename, 'rb') as input:
+            preamble = input.read(_PREAMBLE.size)
+            if len(preamble) < _PREAMBLE.size:
+                raise FormatError("%s: not a schedule file" % filename)
+            magic, version, length = _PREAMBLE.unpack(preamble)
+            if magic != MAGIC:
+                raise FormatError("%s: not a schedule file" % filename)
+            if version > FORMAT_VERSION:
+                raise FormatError("%s: format version %d is newer than this reader (%d)" % (filename, version,
+                FORMAT_VERSION))
+            self.version = version
+            self.meta = json.loads(input.read(length).decode('utf-8'))
+        self.data_start = _aligned(_PREAMBLE.size + length)
+        self._entries = self.meta.pop('arrays')
+
+    def names(self):
+        return sorted(self._entries)
+
+    def __contains__(self, name):
+        return name in self._entries
+
+    #the array called name, memory-mapped read-only unless mmap is False
+    def array(self, name, mmap = True):
+        entry = self._entries[name]
+        dtype = np.dtype(entry['dtype'])
+        shape = tuple(entry['shape'])
+        count = int(np.prod(shape)) if shape else 1
+        if count == 0:
+            return np.zeros(shape, dtype = dtype)
+        offset = self.data_start + entry['offset']
+        if mmap:
+            return np.memmap(self.filename, dtype = dtype, mode = 'r', offset = offset, shape = shape)
+        with open(self.filename, 'rb') as input:
+            input.seek(offset)
+            return np.fromfile(input, dtype = dtype, count = count).reshape(shape)
+
+    #hours of every task on day j of a grid (current_schedule or perm_task_time)
+    def day(self, j, grid = 'current_schedule'):
+        return np.array(self.array(grid)[:, j])
+
+    def column(self, table, name, default = None):
+        key = table + "." + name
+        if key in self._entries:
+            return self.array(key, mmap = False)
+        return np.full(len(self.meta[table]['name']), default)
+
+    def __tasks(self, table, cls, columns):
+        meta = self.meta[table]
+        n = len(meta['name'])
+        values = dict((name, self.column(table, name, default).astype(float).tolist()) for name, default in
+            list(TASK_COLUMNS.items()) + list(columns.items()))
+        values['is_batch'] = [bool(v) for v in values['is_batch']]
+        scores = self.column(table, 'scores').tolist()
+        lengths = self.column(table, 'score_lengths', 0).tolist()
+        descr = meta.get('descr', [""] * n)
+        availability = meta.get('availability', [None] * n)
+        tasks = []
+        for i in range(n):
+            kwargs = dict((name, values[name][i]) for name in values)
+            task = cls(name = meta['name'][i], scores = tuple(scores[i][:lengths[i]]), **kwargs)
+            task.descr = descr[i]
+            if availability[i] is not None:
+                task.availability = Availability.fromDict(availability[i])
+            tasks.append(task)
+        return tasks
+
+    def toSchedule(self):
+        from final_scheduler import Schedule, CompletableTask, OngoingTask, Block, RRule
+        meta = self.meta
+        completables = self.__tasks('completables', CompletableTask, COMPLETABLE_COLUMNS)
+        due_ordinal = self.column('completables', 'due_ordinal', 0).tolist()
+        due_seconds = self.column('completables', 'due_seconds', np.nan).tolist()
+        for k in range(len(completables)):
+            due = None
+            if due_ordinal[k]:
+                due = date.fromordinal(due_ordinal[k])
+                if not math.isnan(due_seconds[k]):
+                    due = datetime.combine(due, datetime.min.time()) + timedelta(seconds = due_seconds[k])
+            completables[k].due = due
+            completables[k].prereqs = set()
+        for t, p in self.array('prereqs', mmap = False).tolist():
+            completables[t].prereqs.add(completables[p])
+        completables = completables[:meta['completables']['num_scheduled']]
+        ongoings = self.__tasks('ongoings', OngoingTask, ONGOING_COLUMNS)
+
+        fields = dict(meta['schedule'])
+        constants = dict((name, fields[name]) for name in ('SHIFT_COST', 'TIME_COST', 'UNSMOOTH_COST',
+            'MAX_DAILY_HOURS', 'budget_days') if name in fields)
+        for name in ('SCORE_LABELS', 'DAILY_SCORE_TARGETS', 'MISS_DAILY_SCORE_COSTS'):
+            if name in fields:
+                constants[name] = tuple(fields[name])
+        schedule = Schedule(start = _dateFromJson(fields['start']), current_schedule = self.array('current_schedule',
+            mmap = False), perm_task_time = self.array('perm_task_time', mmap = False), completables = completables,
+            ongoings = ongoings, flex_blocks = [], perm_blocks = [], **constants)
+        schedule.cost = fields.get('cost', -1)
+        schedule.is_up_to_date = fields.get('is_up_to_date', False)
+        ids = dict((t, k) for t, k in zip(completables + ongoings, self.column('completables', 'task_id', -1)
+            .tolist()[:len(completables)] + self.column('ongoings', 'task_id', -1).tolist()) if k >= 0)
+        schedule._registry = TaskRegistry(completables, ongoings, ids)
+        if 'history' in meta:
+            schedule.history = ScheduleHistory.fromArrays(_dateFromJson(meta['history']['origin']),
+                self.array('history.task_id', mmap = False), self.array('history.first', mmap = False),
+                self.array('history.hours', mmap = False), self.array('history.days', mmap = False))
+
+        tasks = {'completables': completables, 'ongoings': ongoings}
+        for name in ('flex_blocks', 'perm_blocks'):
+            for b in meta.get('blocks', {}).get(name, []):
+                rr = None
+                if b['rr'] is not None:
+                    if 'dates' in b['rr']:
+                        rr = RRule([_dateFromJson(d) for d in b['rr']['dates']])
+                    elif 'recurrence' in b['rr']:
+                        rr = RRule(Recurrence(b['rr']['recurrence'], _dateFromJson(b['rr']['dtstart']),
+                            [_dateFromJson(d) for d in b['rr']['exdates']],
+                            [_dateFromJson(d) for d in b['rr']['rdates']]))
+                    else:
+                        from dateutil.rrule import rrulestr
+                        rr = RRule(rrulestr(b['rr']['rule']))
+                    rr.index = b['rr']['index']
+                task = tasks[b['task'][0]][b['task'][1]] if b['task'] is not None else None
+                block = Block(name = b['name'], start = _dateFromJson(b['start']), duration = b['duration'],
+                    scores = tuple(b['scores']) if b['scores'] is not None else None, rr = rr, task = task)
+                block.window_days = b.get('window_days', 1)
+                getattr(schedule, name).append(block)
+        return schedule
+
+
+#schedule from filename, in the columnar format or an old pickle
+def readSchedule(filename):
+    if isScheduleFile(filename):
+        return ScheduleFile(filename).toSchedule()
+    with open(filename, 'rb') as input:
+        #pickles from Python 2 keep date and datetime state in byte strings
+        return pickle.load(input, encoding = 'latin1')
+
+
+#rewrites a schedule pickled by an earlier save in the columnar format (to
+#target, or in place). returns the schedule
+def migrate(filename, target = None):
+    schedule = readSchedule(filename)
+    writeSchedule(schedule, target if target is not None else filename)
+    return schedule
@@ -0,0 +1,36 @@
+"""
+Checks that schedule_store reads schedules pickled by earlier versions,
+including pickles written by Python 2.
+
+    python -m pytest schedule_store_test.py (or python schedule_store_test.py)
+"""
+
+import os
+import tempfile
+import unittest
+from datetime import date, datetime
+
+from schedule_store import isScheduleFile, readSchedule
+
+#pickle.dumps([date(2024, 3, 4), datetime(2024, 3, 4, 9, 30), 'chores'], 2)
+#under Python 2, where date and datetime state is a byte string
+_PY2_PICKLE = (b"\x80\x02]q\x00(cdatetime\ndate\nq\x01U\x04\x07\xe8\x03\x04q\x02\x85q\x03Rq\x04cdatetime\ndatetime"
+    b"\nq\x05U\n\x07\xe8\x03\x04\t\x1e\x00\x00\x00\x00q\x06\x85q\x07Rq\x08U\x06choresq\te.")
+
+
+class ReadPickleTest(unittest.TestCase):
+    def setUp(self):
+        handle, self.filename = tempfile.mkstemp(suffix = ".sched")
+        with os.fdopen(handle, 'wb') as output:
+            output.write(_PY2_PICKLE)
+
+    def tearDown(self):
+        os.remove(self.filename)
+
+    def testPython2Pickle(self):
+        self.assertFalse(isScheduleFile(self.filename))
+        self.assertEqual(readSchedule(self.filename), [date(2024, 3, 4), datetime(2024, 3, 4, 9, 30), "chores"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,178 @@
+"""
+Cache of solves keyed by a fingerprint of the LP that was solved.
+
+The fingerprint is a hash of every array the solver sees (costs, bounds,
+right-hand sides, integrality and the constraint matrix), so it covers every
+input that reaches the model: task parameters, propagated due dates, whether,
+perm_task_time, current_schedule, the cost constants, start and budget_days.
+It is taken from the model after each edit has been applied, so a task
+changed in place simply gives a different key and can never be answered
+with a stale entry. The hash of the matrix is kept on the model until the
+matrix object is replaced, so a patched model only hashes its vectors again.
+
+SolutionCache keeps the most recently used entries in memory and, with a
+directory, every entry on disk too (one pickle per key, least recently used
+files removed past max_disk_entries). Schedule.solution_cache takes one; it
+can be shared between schedules.
+"""
+
+import hashlib
+import os
+import tempfile
+from collections import OrderedDict
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+import numpy as np
+
+
+def _hashArrays(h, arrays):
+    for a in arrays:
+        a = np.ascontiguousarray(a)
+        h.update(str(a.dtype).encode())
+        h.update(str(a.shape).encode())
+        h.update(a.data if a.size else b"")
+
+
+#hex digest of the LP model describes; extra (strings and numbers) is hashed
+#in too, e.g. solve options that change the answer
+def modelFingerprint(model, *extra):
+    A = model.A
+    memo = getattr(model, '_matrix_digest', None)
+    if memo is None or memo[0] is not A:
+        csr = A.tocsr()
+        h = hashlib.sha1()
+        _hashArrays(h, (np.array(csr.shape), csr.indptr, csr.indices, csr.data))
+        memo = (A, h.hexdigest())
+        model._matrix_digest = memo
+    h = hashlib.sha1(memo[1].encode())
+    _hashArrays(h, (model.c, model.col_lower, model.col_upper, model.row_lower, model.row_upper,
+        model.integrality.astype(np.uint8)))
+    h.update(repr(extra).encode())
+    return h.hexdigest()
+
+
+#fingerprint of a derived query (e.g. a block re-solve) on top of a model's
+def queryFingerprint(base, *parts):
+    h = hashlib.sha1(base.encode())
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            _hashArrays(h, (part,))
+        else:
+            h.update(repr(part).encode())
+    return h.hexdigest()
+
+
+class SolutionCache(object):
+    def __init__(self, max_entries = 128, directory = None, max_disk_entries = 10000):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_disk_entries = max_disk_entries
+        self._entries = OrderedDict()
+        self._disk_count = None
+        self.resetCounters()
+        if directory is not None and not os.path.isdir(directory):
+            os.makedirs(directory)
+
+    def resetCounters(self):
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries or (self.directory is not None and os.path.exists(self.__path(key)))
+
+    def __path(self, key):
+        return os.path.join(self.directory, key + ".pkl")
+
+    #the value stored under key, or None
+    def get(self, key):
+        value = self._entries.pop(key, None)
+        if value is not None:
+            self._entries[key] = value
+            self.hits += 1
+            return value
+        if self.directory is not None:
+            path = self.__path(key)
+            try:
+                with open(path, 'rb') as input:
+                    value = pickle.load(input)
+            except (IOError, OSError, EOFError, pickle.UnpicklingError):
+                value = None
+            if value is not None:
+                #the modification time orders the files for eviction
+                os.utime(path, None)
+                self.disk_hits += 1
+                self.__remember(key, value)
+                return value
+        self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._entries.pop(key, None)
+        self.__remember(key, value)
+        if self.directory is not None:
+            self.__write(key, value)
+
+    def __remember(self, key, value):
+        self._entries[key] = value
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last = False)
+            self.evictions += 1
+
+    def __write(self, key, value):
+        path = self.__path(key)
+        new = not os.path.exists(path)
+        #written under a temporary name first so readers never see half a file
+        fd, tmp = tempfile.mkstemp(dir = self.directory, suffix = ".tmp")
+        with os.fdopen(fd, 'wb') as output:
+            pickle.dump(value, output, pickle.HIGHEST_PROTOCOL)
+        os.rename(tmp, path)
+        if self._disk_count is None:
+            self._disk_count = len(self.__files())
+        elif new:
+            self._disk_count += 1
+        if self._disk_count > self.max_disk_entries:
+            files = sorted(self.__files(), key = lambda f: os.path.getmtime(os.path.join(self.directory, f)))
+            for f in files[:len(files) - self.max_disk_entries]:
+                os.remove(os.path.join(self.directory, f))
+                self.evictions += 1
+            self._disk_count = min(len(files), self.max_disk_entries)
+
+    def __files(self):
+        return [f for f in os.listdir(self.directory) if f.endswith(".pkl")]
+
+    #drops key, or every entry (memory and disk) when key is None
+    def invalidate(self, key = None):
+        keys = list(self._entries) if key is None else [key]
+        for k in keys:
+            self._entries.pop(k, None)
+        if self.directory is not None:
+            files = self.__files() if key is None else [key + ".pkl"]
+            for f in files:
+                path = os.path.join(self.directory, f)
+                if os.path.exists(path):
+                    os.remove(path)
+            self._disk_count = None
+
+    def stats(self):
+        return dict(entries = len(self._entries), hits = self.hits, disk_hits = self.disk_hits, misses = self.misses,
+            evictions = self.evictions)
+
+    #the memory tier is not pickled with a schedule; the disk tier stays where it is
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_entries'] = OrderedDict()
+        state['_disk_count'] = None
+        return state
+
+    def __repr__(self):
+        return "SolutionCache(%d entries, %d hits, %d disk hits, %d misses)" % (len(self._entries), self.hits,
+        self.disk_hits, self.misses)
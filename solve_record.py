@@ -0,0 +1,130 @@
+"""
+Instrumentation of Schedule.makeSchedule.
+
+A SolveRecord holds the seconds spent in each phase of one call (due
+assignment, whether, grids, model build or patch, presolve, solve, reading
+the schedule back), the size of the model by column and row family, and what
+the solver reported. makeSchedule only fills one in when asked to (see
+Schedule.record_solves and Schedule.on_solve); otherwise it times its phases
+against NULL_RECORD, which does nothing.
+"""
+
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+
+class _PhaseTimer(object):
+    def __init__(self, record, name):
+        self.record = record
+        self.name = name
+
+    def __enter__(self):
+        self.t = time.time()
+        return self
+
+    def __exit__(self, *exc):
+        phases = self.record.phases
+        phases[self.name] = phases.get(self.name, 0.0) + time.time() - self.t
+        return False
+
+
+#columns and rows of each family, nonzeros and integer columns of a model
+def modelStats(model):
+    return dict(cols = dict((f, sl.stop - sl.start) for f, sl in model.col_slices.items()),
+        rows = dict((f, sl.stop - sl.start) for f, sl in model.row_slices.items()),
+        num_cols = model.num_cols, num_rows = model.num_rows, nnz = int(model.A.nnz),
+        integers = int(np.count_nonzero(model.integrality)))
+
+
+class SolveRecord(object):
+    enabled = True
+
+    def __init__(self):
+        #phase name -> seconds, in the order the phases first ran
+        self.phases = OrderedDict()
+        #modelStats of the full model and of the presolved one (None without presolve)
+        self.model = None
+        self.presolved = None
+        #Schedule.last_update of the call
+        self.update = None
+        self.status = None
+        self.objective = None
+        self.bound = None
+        self.iterations = None
+        self.nodes = None
+        self.backend = None
+        self.message = None
+        self.started = time.time()
+        self.total = None
+
+    #context manager that adds the time spent inside it to phase name
+    def phase(self, name):
+        return _PhaseTimer(self, name)
+
+    def setModels(self, model, presolved = None):
+        self.model = modelStats(model)
+        if presolved is not None:
+            self.presolved = modelStats(presolved)
+
+    def setResult(self, result):
+        self.status = result.status
+        self.objective = result.objective
+        self.bound = result.bound
+        self.iterations = result.iterations
+        self.nodes = result.nodes
+        self.backend = result.backend
+        self.message = result.message
+
+    def finish(self):
+        self.total = time.time() - self.started
+
+    #plain dict (for json and logs)
+    def asDict(self):
+        return dict(phases = dict(self.phases), model = self.model, presolved = self.presolved,
+            update = self.update, status = self.status, objective = self.objective, bound = self.bound,
+            iterations = self.iterations, nodes = self.nodes, backend = self.backend, message = self.message,
+            total = self.total)
+
+    def __str__(self):
+        lines = ["%-14s %8.4fs" % (name, seconds) for name, seconds in self.phases.items()]
+        if self.total is not None:
+            lines.append("%-14s %8.4fs" % ("total", self.total))
+        if self.model is not None:
+            lines.append("model: %(num_cols)d columns, %(num_rows)d rows, %(nnz)d nonzeros, %(integers)d integer"
+                % self.model)
+        if self.presolved is not None:
+            lines.append("presolved: %(num_cols)d columns, %(num_rows)d rows, %(nnz)d nonzeros" % self.presolved)
+        lines.append("status %s, objective %r, %s iterations, %s nodes (%s)" % (self.status, self.objective,
+            self.iterations, self.nodes, self.backend))
+        return "\n".join(lines)
+
+
+class _NullTimer(object):
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+#stands in for a SolveRecord when makeSchedule is not being recorded
+class _NullRecord(object):
+    enabled = False
+    _timer = _NullTimer()
+
+    def phase(self, name):
+        return self._timer
+
+    def setModels(self, model, presolved = None):
+        pass
+
+    def setResult(self, result):
+        pass
+
+    def finish(self):
+        pass
+
+
+NULL_RECORD = _NullRecord()
@@ -0,0 +1,337 @@
+"""
+Solver backends for the array model built by sparse_model.
+
+Every backend takes a ScheduleModel and returns a SolveResult, so makeSchedule
+can report status, objective and solve time the same way whichever solver ran.
+Status codes follow pulp's LpStatus so existing callers can keep doing
+LpStatus[result.status].
+"""
+
+import time
+
+import numpy as np
+
+try:
+    from scipy.optimize import milp, LinearConstraint, Bounds
+except ImportError:
+    milp = None
+
+try:
+    import pulp
+except ImportError:
+    pulp = None
+
+try:
+    import highspy
+except ImportError:
+    highspy = None
+
+#same values as pulp.LpStatusOptimal etc.
+STATUS_NOT_SOLVED = 0
+STATUS_OPTIMAL = 1
+STATUS_INFEASIBLE = -1
+STATUS_UNBOUNDED = -2
+STATUS_UNDEFINED = -3
+
+
+class SolveResult(object):
+    def __init__(self, status, objective, values, solve_time, backend, message = "", bound = None, iterations = None,
+    nodes = None):
+        self.status = status
+        self.objective = objective
+        #column values in model order, or None if no solution was found
+        self.values = values
+        self.solve_time = solve_time
+        self.backend = backend
+        self.message = message
+        #lower bound on the optimal objective, if the solver reported one
+        self.bound = bound
+        #simplex iterations and branch-and-bound nodes, if the solver reported them
+        self.iterations = iterations
+        self.nodes = nodes
+
+    #relative gap between objective and bound, None if either is missing
+    @property
+    def gap(self):
+        if self.objective is None or self.bound is None:
+            return None
+        return max(self.objective - self.bound, 0.0) / max(abs(self.objective), 1.0)
+
+    def isOptimal(self):
+        return self.status == STATUS_OPTIMAL
+
+    def __nonzero__(self):
+        return self.isOptimal()
+
+    __bool__ = __nonzero__
+
+    def __repr__(self):
+        return "SolveResult(backend=%s, status=%d, objective=%r, solve_time=%.3f)" % (self.backend,
+        self.status, self.objective, self.solve_time)
+
+
+#LP sensitivity information. duals[r] is the change in objective per unit
+#increase of row r's bound; the basis stays optimal while that bound alone
+#stays in [row_bound_dn[r], row_bound_up[r]]. basic_variables lists the
+#optimal basis, a column index k >= 0 or -1 - r for row r's logical
+class Sensitivity(object):
+    def __init__(self, objective, duals, reduced_costs, row_bound_up, row_bound_dn, basic_variables):
+        self.objective = objective
+        self.duals = duals
+        self.reduced_costs = reduced_costs
+        self.row_bound_up = row_bound_up
+        self.row_bound_dn = row_bound_dn
+        self.basic_variables = basic_variables
+        #factorization of the basis matrix, filled in on first use
+        self.basis_lu = None
+
+
+class SolverBackend(object):
+    name = "base"
+
+    def available(self):
+        return True
+
+    #warm_start is a column vector (e.g. ScheduleModel.completeSolution or the
+    #values of a previous SolveResult); backends that cannot use it ignore it.
+    #time_limit (seconds) and gap (relative MIP gap) override the backend's
+    #options for this solve only
+    def solve(self, model, warm_start = None, time_limit = None, gap = None):
+        raise NotImplementedError
+
+    #a backend of the same kind and options that does not share solver state
+    def copy(self):
+        return self.__class__(**self.options)
+
+
+#Solves in-process with HiGHS through scipy.optimize.milp (scipy >= 1.9).
+#No files or subprocesses are involved.
+class ScipyBackend(SolverBackend):
+    name = "scipy"
+    #scipy.optimize.milp status -> pulp status
+    STATUS_MAP = {0: STATUS_OPTIMAL, 1: STATUS_NOT_SOLVED, 2: STATUS_INFEASIBLE, 3: STATUS_UNBOUNDED, 4: STATUS_UNDEFINED}
+
+    def __init__(self, **options):
+        #passed straight to milp, e.g. time_limit, mip_rel_gap, disp
+        self.options = options
+
+    def available(self):
+        return milp is not None
+
+    def solve(self, model, warm_start = None, time_limit = None, gap = None):
+        t = time.time()
+        options = dict(self.options)
+        if time_limit is not None:
+            options['time_limit'] = time_limit
+        if gap is not None:
+            options['mip_rel_gap'] = gap
+        res = milp(c = model.c,
+            constraints = LinearConstraint(model.A, model.row_lower, model.row_upper),
+            bounds = Bounds(model.col_lower, model.col_upper),
+            integrality = model.integrality.astype(np.uint8),
+            options = options)
+        solve_time = time.time() - t
+        values = None if res.x is None else np.asarray(res.x)
+        objective = None if values is None else float(res.fun)
+        status = ScipyBackend.STATUS_MAP.get(res.status, STATUS_UNDEFINED)
+        bound = getattr(res, 'mip_dual_bound', None) if model.isMip() else None
+        if status == STATUS_OPTIMAL and bound is None:
+            bound = objective
+        return SolveResult(status, objective, values, solve_time, self.name, res.message, bound,
+        getattr(res, 'nit', None), getattr(res, 'mip_node_count', None))
+
+
+#Writes the model out through pulp and runs the CBC executable (COIN_CMD).
+#Kept as the fallback when no in-process solver is installed.
+class CbcBackend(SolverBackend):
+    name = "cbc"
+
+    def __init__(self, **options):
+        #passed to pulp.COIN_CMD, e.g. msg, timeLimit, gapRel
+        self.options = options
+
+    def available(self):
+        return pulp is not None and pulp.COIN_CMD(**self.options).available() is not False
+
+    def solve(self, model, warm_start = None, time_limit = None, gap = None):
+        t = time.time()
+        problem, variables = model.toLpProblem()
+        options = dict(self.options)
+        if time_limit is not None:
+            options['timeLimit'] = time_limit
+        if gap is not None:
+            options['gapRel'] = gap
+        if warm_start is not None and model.isMip():
+            for v, value in zip(variables, warm_start):
+                v.setInitialValue(value)
+            options['warmStart'] = True
+        problem.solve(pulp.COIN_CMD(**options))
+        solve_time = time.time() - t
+        values = [v.value() for v in variables]
+        if any(v is None for v in values):
+            values = None
+        else:
+            values = np.array(values, dtype = float)
+        objective = None if values is None else float(pulp.value(problem.objective))
+        #pulp does not pass CBC's bound on; an LP solved to optimality is its own bound
+        bound = objective if problem.status == STATUS_OPTIMAL and not model.isMip() else None
+        return SolveResult(problem.status, objective, values, solve_time, self.name, pulp.LpStatus[problem.status],
+        bound)
+
+
+#Keeps one HiGHS instance alive between solves (needs the highspy package).
+#When it is handed the same model again after ScheduleModel values were patched
+#in place, only the changed costs and bounds are pushed to HiGHS, which then
+#re-solves from the previous optimal basis. Any other model starts cold (e.g.
+#a rebuilt one, or a presolved one whose reductions changed): MIPs get the
+#warm start as their first incumbent, but LPs ignore it, since HiGHS does not
+#start the simplex from a primal solution without a basis.
+class HighsBackend(SolverBackend):
+    name = "highs"
+
+    def __init__(self, **options):
+        #HiGHS options, e.g. time_limit, mip_rel_gap
+        self.options = options
+        self._highs = None
+        self._model = None
+        self._sent = None
+
+    def available(self):
+        return highspy is not None
+
+    def __getstate__(self):
+        #the HiGHS instance cannot be pickled; it is rebuilt on the next solve
+        return {'options': self.options, '_highs': None, '_model': None, '_sent': None}
+
+    def __passModel(self, model):
+        h = highspy.Highs()
+        h.setOptionValue("output_flag", False)
+        for key, value in self.options.items():
+            h.setOptionValue(key, value)
+        lp = highspy.HighsLp()
+        lp.num_col_ = model.num_cols
+        lp.num_row_ = model.num_rows
+        lp.col_cost_ = model.c
+        lp.col_lower_ = model.col_lower
+        lp.col_upper_ = model.col_upper
+        lp.row_lower_ = model.row_lower
+        lp.row_upper_ = model.row_upper
+        A = model.A.tocsr()
+        lp.a_matrix_.format_ = highspy.MatrixFormat.kRowwise
+        lp.a_matrix_.num_col_ = model.num_cols
+        lp.a_matrix_.num_row_ = model.num_rows
+        lp.a_matrix_.start_ = A.indptr
+        lp.a_matrix_.index_ = A.indices
+        lp.a_matrix_.value_ = A.data
+        if model.isMip():
+            lp.integrality_ = [highspy.HighsVarType.kInteger if k else highspy.HighsVarType.kContinuous
+                for k in model.integrality]
+        h.passModel(lp)
+        self._highs = h
+        self._model = model
+
+    #pushes the values that differ from what HiGHS last saw
+    def __patch(self, model):
+        h = self._highs
+        c, col_lower, col_upper, row_lower, row_upper = self._sent
+        idx = np.flatnonzero(c != model.c)
+        if len(idx):
+            h.changeColsCost(len(idx), idx.astype(np.int32), model.c[idx])
+        idx = np.flatnonzero((col_lower != model.col_lower) | (col_upper != model.col_upper))
+        if len(idx):
+            h.changeColsBounds(len(idx), idx.astype(np.int32), model.col_lower[idx], model.col_upper[idx])
+        idx = np.flatnonzero((row_lower != model.row_lower) | (row_upper != model.row_upper))
+        if len(idx):
+            h.changeRowsBounds(len(idx), idx.astype(np.int32), model.row_lower[idx], model.row_upper[idx])
+
+    def solve(self, model, warm_start = None, time_limit = None, gap = None):
+        t = time.time()
+        if self._highs is None or model is not self._model:
+            self.__passModel(model)
+        else:
+            self.__patch(model)
+        self._sent = (model.c.copy(), model.col_lower.copy(), model.col_upper.copy(),
+            model.row_lower.copy(), model.row_upper.copy())
+        h = self._highs
+        h.setOptionValue("time_limit", float(self.options.get('time_limit', highspy.kHighsInf) if time_limit is None
+            else time_limit))
+        h.setOptionValue("mip_rel_gap", float(self.options.get('mip_rel_gap', 1e-4) if gap is None else gap))
+        if warm_start is not None and model.isMip():
+            solution = highspy.HighsSolution()
+            solution.col_value = list(warm_start)
+            solution.value_valid = True
+            h.setSolution(solution)
+        h.run()
+        solve_time = time.time() - t
+        status = HighsBackend.statusOf(h.getModelStatus())
+        info = h.getInfo()
+        values = None
+        objective = None
+        bound = None
+        if info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible:
+            values = np.array(h.getSolution().col_value)
+            objective = float(info.objective_function_value)
+            if model.isMip():
+                bound = float(info.mip_dual_bound)
+            elif status == STATUS_OPTIMAL:
+                bound = objective
+        return SolveResult(status, objective, values, solve_time, self.name, h.modelStatusToString(h.getModelStatus()),
+        bound, int(info.simplex_iteration_count), int(info.mip_node_count) if model.isMip() else None)
+
+    #duals, reduced costs and row-bound ranging of the last solve, if it was an
+    #optimal LP solve of model and model has not been patched since. else None
+    def sensitivity(self, model):
+        h = self._highs
+        if h is None or model is not self._model or model.isMip() or h.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            return None
+        c, col_lower, col_upper, row_lower, row_upper = self._sent
+        if not (np.array_equal(c, model.c) and np.array_equal(col_lower, model.col_lower) and np.array_equal(col_upper,
+        model.col_upper) and np.array_equal(row_lower, model.row_lower) and np.array_equal(row_upper, model.row_upper)):
+            return None
+        solution = h.getSolution()
+        status, ranging = h.getRanging()
+        basis_status, basic_variables = h.getBasicVariables()
+        if status != highspy.HighsStatus.kOk or basis_status != highspy.HighsStatus.kOk:
+            return None
+        return Sensitivity(objective = float(h.getInfo().objective_function_value),
+            duals = np.array(solution.row_dual), reduced_costs = np.array(solution.col_dual),
+            row_bound_up = np.array(ranging.row_bound_up.value_), row_bound_dn = np.array(ranging.row_bound_dn.value_),
+            basic_variables = np.array(basic_variables, dtype = np.int64))
+
+    @staticmethod
+    def statusOf(model_status):
+        s = highspy.HighsModelStatus
+        if model_status == s.kOptimal:
+            return STATUS_OPTIMAL
+        if model_status == s.kInfeasible:
+            return STATUS_INFEASIBLE
+        if model_status in (s.kUnbounded, s.kUnboundedOrInfeasible):
+            return STATUS_UNBOUNDED
+        if model_status in (s.kTimeLimit, s.kIterationLimit, s.kSolutionLimit, s.kInterrupt):
+            return STATUS_NOT_SOLVED
+        return STATUS_UNDEFINED
+
+
+BACKENDS = {HighsBackend.name: HighsBackend, ScipyBackend.name: ScipyBackend, CbcBackend.name: CbcBackend}
+
+
+#returns the first available backend, preferring in-process solvers
+def defaultBackend():
+    for cls in (HighsBackend, ScipyBackend, CbcBackend):
+        backend = cls()
+        if backend.available():
+            return backend
+    raise RuntimeError("no solver backend available; install scipy >= 1.9 or pulp with CBC")
+
+
+#resolves a backend given as None, a name from BACKENDS or "race", or an instance
+def getBackend(backend = None):
+    if backend is None:
+        return defaultBackend()
+    if isinstance(backend, SolverBackend):
+        return backend
+    if backend == "race":
+        #racing imports this module
+        from racing import RaceBackend
+        return RaceBackend()
+    return BACKENDS[backend]()
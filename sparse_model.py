@@ -0,0 +1,451 @@
+"""
+Array-backed builder for the schedule LP.
+
+Builds the same model as the pulp path in Schedule.makeSchedule, but puts the
+objective, constraint matrix, row/column bounds and integrality mask straight
+into NumPy/SciPy arrays instead of creating one LpVariable per cell.
+"""
+
+import copy
+
+import numpy as np
+import scipy.sparse as sp
+
+INF = np.inf
+
+
+class ScheduleModel(object):
+    #column families, in the order they appear in the variable vector
+    COL_FAMILIES = ('x', 'abval1', 'abval2', 'abval3', 'abval4')
+    #row families, in the order they appear in the constraint matrix
+    ROW_FAMILIES = ('due', 'total', 'perm', 'abval1_pos', 'abval1_neg', 'abval2_pos', 'abval2_neg',
+    'abval3_pos', 'abval3_neg', 'abval4_pos', 'abval4_neg', 'day')
+
+    def __init__(self, c, A, row_lower, row_upper, col_lower, col_upper, integrality,
+    col_slices, row_slices, num_completables, num_ongoings, num_days, num_scores,
+    batches, whether, due_rows, horizon = None):
+        self.c = c
+        self.A = A
+        self.row_lower = row_lower
+        self.row_upper = row_upper
+        self.col_lower = col_lower
+        self.col_upper = col_upper
+        self.integrality = integrality
+        self.col_slices = col_slices
+        self.row_slices = row_slices
+        self.num_completables = num_completables
+        self.num_ongoings = num_ongoings
+        self.num_tasks = num_completables + num_ongoings
+        self.num_days = num_days
+        #what each day column stands for, see Horizon
+        self.horizon = horizon if horizon is not None else Horizon.daily(num_days)
+        self.num_weeks = self.horizon.num_weeks
+        self.num_scores = num_scores
+        self.batches = batches
+        self.whether = whether
+        #completable index of each row in the 'due' family
+        self.due_rows = due_rows
+        #bumped whenever updateModel patches values in place
+        self.version = 0
+        self.structure_key = None
+
+    @property
+    def num_cols(self):
+        return self.A.shape[1]
+
+    @property
+    def num_rows(self):
+        return self.A.shape[0]
+
+    def isMip(self):
+        return bool(self.integrality.any())
+
+    def xIndex(self, i, j):
+        return i * self.num_days + j
+
+    #hours[i][j] = batches[i] * x[i][j] * whether[i][j]
+    def scheduleFromSolution(self, values):
+        x = np.asarray(values)[self.col_slices['x']].reshape(self.num_tasks, self.num_days)
+        return x * self.batches[:, None] * self.whether
+
+    def objectiveValue(self, values):
+        return float(np.dot(self.c, values))
+
+    #copy of the model with every integer column fixed at its value in values
+    #and integrality dropped, i.e. the LP whose duals price a MIP solution
+    def fixedIntegers(self, values):
+        fixed = copy.copy(self)
+        fixed.col_lower = self.col_lower.copy()
+        fixed.col_upper = self.col_upper.copy()
+        k = np.flatnonzero(self.integrality)
+        fixed.col_lower[k] = fixed.col_upper[k] = np.round(np.asarray(values)[k])
+        fixed.integrality = np.zeros_like(self.integrality)
+        return fixed
+
+    #column vector with the given x hours grid (tasks x days) clipped to the
+    #bounds and every abval column set to the smallest value that satisfies its
+    #pos/neg rows; used as a warm start
+    def completeSolution(self, hours):
+        values = np.zeros(self.num_cols)
+        batches = np.where(self.batches > 0, self.batches, 1.0)
+        x = np.asarray(hours, dtype = float).reshape(self.num_tasks, self.num_days) / batches[:, None]
+        sl = self.col_slices['x']
+        x = np.clip(x.ravel(), self.col_lower[sl], self.col_upper[sl])
+        values[sl] = np.where(self.integrality[sl], np.round(x), x)
+        return self.minimalAbvals(values)
+
+    #copy of values with every abval column set to the smallest value that
+    #satisfies its pos/neg rows under row_upper (the model's by default)
+    def minimalAbvals(self, values, row_upper = None):
+        if row_upper is None:
+            row_upper = self.row_upper
+        values = np.array(values, dtype = float)
+        for k in range(1, 5):
+            values[self.col_slices['abval' + str(k)]] = 0.0
+        activity = self.A.dot(values)
+        for k in range(1, 5):
+            family = 'abval' + str(k)
+            pos = self.row_slices[family + '_pos']
+            neg = self.row_slices[family + '_neg']
+            values[self.col_slices[family]] = np.maximum(0.0, np.maximum(activity[pos] - row_upper[pos],
+                activity[neg] - row_upper[neg]))
+        return values
+
+    #builds an equivalent pulp problem; used by solvers that only speak pulp
+    def toLpProblem(self, name = "Schedule"):
+        import pulp
+        names = []
+        for family in ScheduleModel.COL_FAMILIES:
+            sl = self.col_slices[family]
+            names += [family + "_" + str(k) for k in range(sl.stop - sl.start)]
+        variables = [pulp.LpVariable(names[k],
+            None if self.col_lower[k] == -INF else self.col_lower[k],
+            None if self.col_upper[k] == INF else self.col_upper[k],
+            pulp.LpInteger if self.integrality[k] else pulp.LpContinuous) for k in range(self.num_cols)]
+        problem = pulp.LpProblem(name, pulp.LpMinimize)
+        problem += pulp.LpAffineExpression([(variables[k], self.c[k]) for k in np.flatnonzero(self.c)])
+        A = self.A.tocsr()
+        for r in range(self.num_rows):
+            lo, hi = A.indptr[r], A.indptr[r + 1]
+            exp = pulp.LpAffineExpression([(variables[k], v) for k, v in zip(A.indices[lo:hi], A.data[lo:hi])])
+            if self.row_lower[r] == self.row_upper[r]:
+                problem += pulp.LpConstraint(e = exp, sense = pulp.LpConstraintEQ, rhs = self.row_lower[r])
+                continue
+            if self.row_lower[r] != -INF:
+                problem += pulp.LpConstraint(e = exp, sense = pulp.LpConstraintGE, rhs = self.row_lower[r])
+            if self.row_upper[r] != INF:
+                problem += pulp.LpConstraint(e = exp, sense = pulp.LpConstraintLE, rhs = self.row_upper[r])
+        return problem, variables
+
+
+class _Rows(object):
+    #accumulates COO triplets family by family
+    def __init__(self):
+        self.rows = []
+        self.cols = []
+        self.vals = []
+        self.slices = dict()
+        self.count = 0
+
+    def add(self, family, num_rows, rows, cols, vals):
+        rows = np.asarray(rows, dtype = np.int64).ravel()
+        vals = np.asarray(vals, dtype = float).ravel()
+        keep = vals != 0.0
+        self.rows.append(rows[keep] + self.count)
+        self.cols.append(np.asarray(cols, dtype = np.int64).ravel()[keep])
+        self.vals.append(vals[keep])
+        self.slices[family] = slice(self.count, self.count + num_rows)
+        self.count += num_rows
+
+    def matrix(self, num_cols):
+        return sp.coo_matrix((np.concatenate(self.vals), (np.concatenate(self.rows), np.concatenate(self.cols))),
+            shape = (self.count, num_cols)).tocsr()
+
+
+class Horizon(object):
+    #What each model column (a "day" of the grids) stands for. The default is
+    #one column per day, with abval4 weeks covering the whole weeks from start.
+    #Rolling-horizon windows use it for columns that aggregate several days.
+    def __init__(self, weights, offsets, week_index, num_weeks, real_days, week_credit = None):
+        #days covered by each column
+        self.weights = np.asarray(weights, dtype = float)
+        #first day of each column, counted from the start of the model
+        self.offsets = np.asarray(offsets, dtype = np.int64)
+        #abval4 week of each column, -1 for columns outside every week
+        self.week_index = np.asarray(week_index, dtype = np.int64)
+        self.num_weeks = num_weeks
+        #days from the start of the model to the end of the last column
+        self.real_days = real_days
+        #ongoing x week hours already done outside the model, credited
+        #against week_hours
+        self.week_credit = week_credit
+
+    #one column per day. with week_offset days of the first week before the
+    #start, the first abval4 week is its remaining days, with week_credit
+    #(hours of each ongoing) already done in the days before
+    @staticmethod
+    def daily(num_days, week_offset = 0, week_credit = None):
+        j = np.arange(num_days)
+        num_weeks = (num_days + week_offset) // 7
+        week = (j + week_offset) // 7
+        credit = None
+        if week_credit is not None and num_weeks:
+            credit = np.zeros((len(week_credit), num_weeks))
+            credit[:, 0] = week_credit
+        return Horizon(np.ones(num_days), j, np.where(week < num_weeks, week, -1), num_weeks, num_days, credit)
+
+
+class _Inputs(object):
+    #numeric inputs of the LP, read once from a schedule
+    def __init__(self, sched, dues, whether, horizon = None):
+        completables = sched.completables
+        ongoings = sched.ongoings
+        tasks = list(completables) + list(ongoings)
+        self.nc = len(completables)
+        self.no = len(ongoings)
+        self.T = T = self.nc + self.no
+        self.D = D = sched.budget_days
+        self.S = S = sched.NUM_SCORES
+        if horizon is None:
+            horizon = Horizon.daily(D, getattr(sched, 'week_offset', 0), getattr(sched, 'week_credit', None))
+        self.horizon = horizon
+        self.W = horizon.num_weeks
+        self.batches = np.array([t.batch_hours for t in tasks], dtype = float)
+        self.max_day_hours = np.array([t.max_day_hours for t in tasks], dtype = float)
+        self.is_batch = np.array([t.isBatch() for t in tasks], dtype = bool)
+        self.scores = np.array([list(t.scores)[:S] for t in tasks], dtype = float).reshape(T, S)
+        self.whether = np.asarray(whether, dtype = float).reshape(T, D)
+        self.current = np.asarray(sched.current_schedule, dtype = float).reshape(T, D)
+        self.perm = np.asarray(sched.perm_task_time, dtype = float).reshape(T, D)
+        self.dues = np.asarray(dues, dtype = np.int64).reshape(self.nc)
+        self.total_hours = np.array([c.total_hours for c in completables], dtype = float)
+        self.week_targets = np.repeat(np.array([o.week_hours for o in ongoings], dtype = float), self.W).reshape(self.no, self.W)
+        if horizon.week_credit is not None:
+            self.week_targets = self.week_targets - horizon.week_credit
+        self.miss_week_costs = np.array([o.miss_week_cost for o in ongoings], dtype = float)
+        self.targets = np.array(sched.DAILY_SCORE_TARGETS[:S], dtype = float)
+        self.miss_daily_costs = np.array(sched.MISS_DAILY_SCORE_COSTS[:S], dtype = float)
+        self.time_cost = float(sched.TIME_COST)
+        self.unsmooth_cost = float(sched.UNSMOOTH_COST)
+        self.shift_cost = float(sched.SHIFT_COST)
+        #a number, or one per column (scenarios can vary it by day)
+        self.max_daily_hours = np.asarray(sched.MAX_DAILY_HOURS, dtype = float)
+        #hours of each column already committed to blocks outside the tasks
+        committed = getattr(sched, 'committed_hours', None)
+        self.committed = np.zeros(D) if committed is None else np.asarray(committed, dtype = float).reshape(D)
+        #completables with a due row, and how many columns each due row covers
+        self.due_rows = np.flatnonzero(self.dues > 0)
+        self.due_extent = np.searchsorted(horizon.offsets, self.dues[self.due_rows])
+
+    #everything that decides the shape and coefficients of the constraint matrix
+    def structureKey(self):
+        return (self.nc, self.no, self.D, self.S, self.batches.tobytes(), self.is_batch.tobytes(),
+        self.scores.tobytes(), self.whether.tobytes(), self.due_rows.tobytes(), self.due_extent.tobytes(),
+        self.horizon.weights.tobytes(), self.horizon.week_index.tobytes())
+
+
+def _colSlices(inp):
+    sizes = (inp.T * inp.D, max(inp.D - 1, 0), inp.T * inp.D, inp.D * inp.S, inp.no * inp.W)
+    col_slices = dict()
+    offset = 0
+    for family, size in zip(ScheduleModel.COL_FAMILIES, sizes):
+        col_slices[family] = slice(offset, offset + size)
+        offset += size
+    return col_slices, offset
+
+
+#objective, column bounds and row bounds; the parts that can change without
+#touching the constraint matrix
+def _values(inp, col_slices, num_cols):
+    T, D, S, W = inp.T, inp.D, inp.S, inp.W
+    h = inp.batches[:, None] * inp.whether
+    weights = inp.horizon.weights
+
+    c = np.zeros(num_cols)
+    c[col_slices['x']] = (inp.time_cost * h).ravel()
+    c[col_slices['abval1']] = inp.unsmooth_cost
+    c[col_slices['abval2']] = inp.shift_cost
+    c[col_slices['abval3']] = np.tile(inp.miss_daily_costs, D)
+    c[col_slices['abval4']] = np.repeat(inp.miss_week_costs, W)
+
+    col_lower = np.zeros(num_cols)
+    col_upper = np.full(num_cols, INF)
+    #days a task cannot be done on are not left to the solver
+    col_upper[col_slices['x']] = np.where(inp.whether > 0, np.outer(inp.max_day_hours / inp.batches, weights),
+        0.0).ravel()
+
+    real_days = inp.horizon.real_days
+    due_rhs = np.array([int(inp.total_hours[k] / inp.batches[k] * float(min(inp.dues[k], real_days)) / inp.dues[k])
+        for k in inp.due_rows], dtype = float)
+    n_a1 = max(D - 1, 0)
+    bounds = (
+        ('due', due_rhs, INF),
+        ('total', -INF, inp.total_hours),
+        ('perm', inp.perm.ravel(), INF),
+        ('abval1_pos', -INF, np.zeros(n_a1)),
+        ('abval1_neg', -INF, np.zeros(n_a1)),
+        ('abval2_pos', -INF, inp.current.ravel()),
+        ('abval2_neg', -INF, -inp.current.ravel()),
+        ('abval3_pos', -INF, np.outer(weights, inp.targets).ravel()),
+        ('abval3_neg', -INF, -np.outer(weights, inp.targets).ravel()),
+        ('abval4_pos', -INF, -inp.week_targets.ravel()),
+        ('abval4_neg', -INF, inp.week_targets.ravel()),
+        ('day', -INF, np.maximum(inp.max_daily_hours * weights - inp.committed, 0.0)))
+    row_lower = []
+    row_upper = []
+    for family, lower, upper in bounds:
+        size = np.size(upper) if np.ndim(upper) else np.size(lower)
+        row_lower.append(np.broadcast_to(np.asarray(lower, dtype = float), (size,)))
+        row_upper.append(np.broadcast_to(np.asarray(upper, dtype = float), (size,)))
+    return c, col_lower, col_upper, np.concatenate(row_lower), np.concatenate(row_upper)
+
+
+#the full model of sched, the column values of hours (a tasks x days schedule
+#made some other way) in it, and whether those values satisfy every row
+def priceSchedule(sched, dues, whether, hours):
+    full = buildModel(sched, dues, whether)
+    values = full.completeSolution(hours)
+    activity = full.A.dot(values)
+    tol = 1e-6 * np.maximum(1.0, np.abs(activity))
+    feasible = bool(np.all(activity >= full.row_lower - tol) and np.all(activity <= full.row_upper + tol))
+    return full, values, feasible
+
+
+#Builds the schedule LP from a schedule's task lists and grids.
+#dues and whether are the outputs of the due-date and whether passes in makeSchedule.
+#horizon (see Horizon) defaults to one column per day.
+def buildModel(sched, dues, whether, horizon = None):
+    inp = _Inputs(sched, dues, whether, horizon)
+    nc, no, T, D, S, W = inp.nc, inp.no, inp.T, inp.D, inp.S, inp.W
+    col_slices, n = _colSlices(inp)
+    n_x = T * D
+    n_a1 = max(D - 1, 0)
+    n_a3 = D * S
+    n_a4 = no * W
+    a1 = col_slices['abval1'].start
+    a2 = col_slices['abval2'].start
+    a3 = col_slices['abval3'].start
+    a4 = col_slices['abval4'].start
+
+    #hours contributed by one unit of x[i][j]
+    whether = inp.whether
+    h = inp.batches[:, None] * whether
+    xcol = np.arange(n_x).reshape(T, D)
+
+    integrality = np.zeros(n, dtype = bool)
+    integrality[:n_x] = np.repeat(inp.is_batch, D)
+
+    #row bounds are filled in by _values; only the coefficients are laid out here
+    rows = _Rows()
+
+    #due constraints: enough batches before the due date
+    nd = len(inp.due_rows)
+    mask = np.arange(D)[None, :] < inp.due_extent[:, None]
+    r, j = np.nonzero(mask)
+    i = inp.due_rows[r]
+    rows.add('due', nd, r, xcol[i, j], whether[i, j])
+
+    #total hours of each completable
+    r, j = np.nonzero(np.ones((nc, D), dtype = bool))
+    rows.add('total', nc, r, xcol[r, j], h[r, j])
+
+    #permtask constraints
+    r = np.arange(T * D)
+    rows.add('perm', T * D, r, r, h.ravel())
+
+    #abval1 unsmoothness between consecutive days (per-day averages when a
+    #column covers several days)
+    per_day = h / inp.horizon.weights[None, :]
+    day_r = np.repeat(np.arange(n_a1), T)
+    today = xcol[:, :-1].T.ravel()
+    tomorrow = xcol[:, 1:].T.ravel()
+    h_today = per_day[:, :-1].T.ravel()
+    h_tomorrow = per_day[:, 1:].T.ravel()
+    for family, sign in (('abval1_pos', 1.0), ('abval1_neg', -1.0)):
+        rows.add(family, n_a1,
+            np.concatenate([day_r, day_r, np.arange(n_a1)]),
+            np.concatenate([today, tomorrow, a1 + np.arange(n_a1)]),
+            np.concatenate([sign * h_today, -sign * h_tomorrow, -np.ones(n_a1)]))
+
+    #abval2 shift from previous schedule
+    r = np.arange(T * D)
+    for family, sign in (('abval2_pos', 1.0), ('abval2_neg', -1.0)):
+        rows.add(family, T * D,
+            np.concatenate([r, r]),
+            np.concatenate([r, a2 + r]),
+            np.concatenate([sign * h.ravel(), -np.ones(T * D)]))
+
+    #abval3 daily score targets, row j * S + s
+    jj, ss, ii = np.meshgrid(np.arange(D), np.arange(S), np.arange(T), indexing = 'ij')
+    rr = (jj * S + ss).ravel()
+    score_coefs = (inp.scores[ii, ss] * h[ii, jj]).ravel()
+    for family, sign in (('abval3_pos', 1.0), ('abval3_neg', -1.0)):
+        rows.add(family, n_a3,
+            np.concatenate([rr, np.arange(n_a3)]),
+            np.concatenate([xcol[ii, jj].ravel(), a3 + np.arange(n_a3)]),
+            np.concatenate([sign * score_coefs, -np.ones(n_a3)]))
+
+    #abval4 weekly hours of ongoings, row o * W + w
+    week_index = inp.horizon.week_index
+    oo, tj = np.meshgrid(np.arange(no), np.flatnonzero(week_index >= 0), indexing = 'ij')
+    rr = (oo * W + week_index[tj]).ravel()
+    ti = nc + oo
+    week_coefs = h[ti, tj].ravel()
+    for family, sign in (('abval4_pos', -1.0), ('abval4_neg', 1.0)):
+        rows.add(family, n_a4,
+            np.concatenate([rr, np.arange(n_a4)]),
+            np.concatenate([xcol[ti, tj].ravel(), a4 + np.arange(n_a4)]),
+            np.concatenate([sign * week_coefs, -np.ones(n_a4)]))
+
+    #sum day hours constraint
+    i, j = np.nonzero(np.ones((T, D), dtype = bool))
+    rows.add('day', D, j, xcol[i, j], h[i, j])
+
+    c, col_lower, col_upper, row_lower, row_upper = _values(inp, col_slices, n)
+    model = ScheduleModel(c = c, A = rows.matrix(n),
+        row_lower = row_lower, row_upper = row_upper,
+        col_lower = col_lower, col_upper = col_upper, integrality = integrality,
+        col_slices = col_slices, row_slices = rows.slices,
+        num_completables = nc, num_ongoings = no, num_days = D, num_scores = S,
+        batches = inp.batches, whether = whether, due_rows = inp.due_rows, horizon = inp.horizon)
+    model.structure_key = inp.structureKey()
+    return model
+
+
+#The objective, bounds and right-hand sides sched gives on the structure of
+#model, as (c, col_lower, col_upper, row_lower, row_upper), without changing
+#model. Raises ValueError if sched's inputs need a different matrix.
+def scenarioValues(model, sched, dues, whether, horizon = None):
+    inp = _Inputs(sched, dues, whether, horizon)
+    if inp.structureKey() != model.structure_key:
+        raise ValueError("the scenario changes the structure of the model")
+    return _values(inp, model.col_slices, model.num_cols)
+
+
+#Patches the objective, bounds and right-hand sides of an existing model in place.
+#Returns the names of the changed families (column families for c and bounds,
+#row families for row bounds), or None if the inputs change the matrix itself
+#and the model has to be rebuilt.
+def updateModel(model, sched, dues, whether, horizon = None):
+    inp = _Inputs(sched, dues, whether, horizon)
+    if inp.structureKey() != model.structure_key:
+        return None
+    c, col_lower, col_upper, row_lower, row_upper = _values(inp, model.col_slices, model.num_cols)
+    changed = []
+    for family in ScheduleModel.COL_FAMILIES:
+        sl = model.col_slices[family]
+        if not (np.array_equal(c[sl], model.c[sl]) and np.array_equal(col_lower[sl], model.col_lower[sl])
+        and np.array_equal(col_upper[sl], model.col_upper[sl])):
+            changed.append(family)
+    for family in ScheduleModel.ROW_FAMILIES:
+        sl = model.row_slices[family]
+        if not (np.array_equal(row_lower[sl], model.row_lower[sl]) and np.array_equal(row_upper[sl], model.row_upper[sl])):
+            changed.append(family)
+    if changed:
+        model.c[:] = c
+        model.col_lower[:] = col_lower
+        model.col_upper[:] = col_upper
+        model.row_lower[:] = row_lower
+        model.row_upper[:] = row_upper
+        model.version += 1
+    return changed
@@ -0,0 +1,99 @@
+"""
+Index of a schedule's tasks: a stable id for each task and the grid row it is on.
+
+Rows are the tasks in Schedule order (completables, then ongoings). Ids are
+handed out in the order tasks join and stay with a task for as long as it is
+in the schedule, whatever rows are inserted or removed around it, so they can
+be used to refer to a task from outside (requests, files, logs). Looking up a
+task's row or id, or a task by id, is a dict lookup.
+
+The registry holds on to the schedule's two task lists. Schedule.addCompletables,
+addOngoings and removeTasks tell it what they changed; any other edit of the
+lists is picked up the next time the schedule asks for the registry, when a
+list has been replaced or has changed length, by reindexing all of them.
+"""
+
+from itertools import chain
+
+
+class TaskRegistry(object):
+    #ids maps tasks to the ids they should keep (e.g. ids read from a file);
+    #the other tasks get new ones
+    def __init__(self, completables = (), ongoings = (), ids = None):
+        #task -> id, id -> task, task -> row
+        self._ids = dict()
+        self._tasks = dict()
+        self._rows = dict()
+        self._next_id = 0
+        if ids:
+            self._next_id = max(ids.values()) + 1
+        self.sync(completables, ongoings, ids)
+
+    #changes whenever a task list is replaced or changes length
+    @staticmethod
+    def listKey(completables, ongoings):
+        return (id(completables), len(completables), id(ongoings), len(ongoings))
+
+    def isCurrent(self, completables, ongoings):
+        return self._key == TaskRegistry.listKey(completables, ongoings)
+
+    #reindexes every task of completables and ongoings. tasks that are no
+    #longer there lose their ids
+    def sync(self, completables, ongoings, ids = None):
+        rows = dict((task, i) for i, task in enumerate(chain(completables, ongoings)))
+        for task in [task for task in self._ids if task not in rows]:
+            del self._tasks[self._ids.pop(task)]
+        self._completables = completables
+        self._ongoings = ongoings
+        self._rows = rows
+        self.__assignIds(rows, ids)
+        self._key = TaskRegistry.listKey(completables, ongoings)
+
+    def __assignIds(self, tasks, ids = None):
+        for task in tasks:
+            if task in self._ids:
+                continue
+            task_id = ids.get(task) if ids else None
+            if task_id is None or task_id in self._tasks:
+                task_id = self._next_id
+                self._next_id += 1
+            self._ids[task] = task_id
+            self._tasks[task_id] = task
+
+    #records that num_completables and num_ongoings tasks were appended to the
+    #lists; the ongoings' rows move down past the new completables
+    def appended(self, num_completables, num_ongoings):
+        C = len(self._completables)
+        new = self._completables[C - num_completables:]
+        if num_completables:
+            for i, task in enumerate(self._ongoings):
+                self._rows[task] = C + i
+            for i in range(C - num_completables, C):
+                self._rows[self._completables[i]] = i
+        new += self._ongoings[len(self._ongoings) - num_ongoings:]
+        for i in range(len(self._ongoings) - num_ongoings, len(self._ongoings)):
+            self._rows[self._ongoings[i]] = C + i
+        self.__assignIds(new)
+        self._key = TaskRegistry.listKey(self._completables, self._ongoings)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def __contains__(self, task):
+        return task in self._rows
+
+    def rowOf(self, task):
+        return self._rows[task]
+
+    def idOf(self, task):
+        return self._ids[task]
+
+    def taskOf(self, task_id):
+        return self._tasks[task_id]
+
+    #task -> id of every task
+    def ids(self):
+        return dict(self._ids)
+
+    def __repr__(self):
+        return "TaskRegistry(%d tasks)" % len(self._rows)
@@ -0,0 +1,196 @@
+"""
+Checks TaskRegistry over random edits of the task lists, and that a
+schedule's grid rows, due dates and task ids follow its tasks through
+addCompletables, addOngoings, removeTasks and merge.
+
+    python -m pytest task_registry_test.py (or python task_registry_test.py)
+"""
+
+import random
+import unittest
+from datetime import date, timedelta
+
+import numpy as np
+
+from final_scheduler import Schedule, CompletableTask, OngoingTask
+from task_registry import TaskRegistry
+
+
+class _Task(object):
+    def __init__(self, name):
+        self.name = name
+
+    def __repr__(self):
+        return self.name
+
+
+class TaskRegistryTest(unittest.TestCase):
+    def check(self, registry, completables, ongoings, ids):
+        tasks = completables + ongoings
+        self.assertEqual(len(registry), len(tasks))
+        for row, task in enumerate(tasks):
+            self.assertTrue(task in registry)
+            self.assertEqual(registry.rowOf(task), row)
+            self.assertIs(registry.taskOf(registry.idOf(task)), task)
+            if task in ids:
+                self.assertEqual(registry.idOf(task), ids[task], task)
+        self.assertEqual(len(set(registry.ids().values())), len(tasks))
+
+    def testRandomEdits(self):
+        rng = random.Random(0)
+        for n in range(200):
+            completables = [_Task("c%d" % k) for k in range(rng.randint(0, 5))]
+            ongoings = [_Task("o%d" % k) for k in range(rng.randint(0, 5))]
+            registry = TaskRegistry(completables, ongoings)
+            ids = registry.ids()
+            used = set(ids.values())
+            count = 0
+            for step in range(20):
+                edit = rng.randrange(4)
+                if edit == 0:
+                    #appended through the registry
+                    new_c = [_Task("c+%d" % (count + k)) for k in range(rng.randint(0, 3))]
+                    new_o = [_Task("o+%d" % (count + k)) for k in range(rng.randint(0, 3))]
+                    count += 6
+                    completables.extend(new_c)
+                    ongoings.extend(new_o)
+                    registry.appended(len(new_c), len(new_o))
+                elif edit == 1:
+                    #lists replaced
+                    completables = [t for t in completables if rng.random() < 0.8]
+                    ongoings = [t for t in ongoings if rng.random() < 0.8]
+                    registry.sync(completables, ongoings)
+                else:
+                    #edited in place, picked up by isCurrent
+                    tasks = completables if edit == 2 else ongoings
+                    if tasks and rng.random() < 0.5:
+                        del tasks[rng.randrange(len(tasks))]
+                    else:
+                        tasks.insert(rng.randint(0, len(tasks)), _Task("i%d" % count))
+                        count += 1
+                    self.assertFalse(registry.isCurrent(completables, ongoings))
+                    registry.sync(completables, ongoings)
+                self.assertTrue(registry.isCurrent(completables, ongoings))
+                self.check(registry, completables, ongoings, ids)
+                #ids of tasks that left are not handed out again
+                for task, task_id in registry.ids().items():
+                    if task not in ids:
+                        self.assertFalse(task_id in used, (task, task_id))
+                        used.add(task_id)
+                ids = registry.ids()
+
+    def testGivenIds(self):
+        tasks = [_Task("t%d" % k) for k in range(6)]
+        registry = TaskRegistry(tasks[:4], tasks[4:], {tasks[0]: 7, tasks[2]: 3, tasks[5]: 7})
+        self.assertEqual(registry.idOf(tasks[2]), 3)
+        #a taken id is not given twice: one of the two gets a new one
+        self.assertEqual(min(registry.idOf(tasks[0]), registry.idOf(tasks[5])), 7)
+        self.assertTrue(max(registry.idOf(tasks[0]), registry.idOf(tasks[5])) > 7)
+        self.check(registry, tasks[:4], tasks[4:], {})
+
+
+def _schedule(start, completables, ongoings, days = 7):
+    schedule = Schedule(start = start, budget_days = days, current_schedule = [], perm_task_time = [],
+        completables = [], ongoings = [], flex_blocks = [], perm_blocks = [])
+    schedule.addCompletables(completables)
+    schedule.addOngoings(ongoings)
+    return schedule
+
+
+def _completable(name, start):
+    return CompletableTask(name = name, due = start + timedelta(days = 20), total_hours = 2.0)
+
+
+def _ongoing(name):
+    return OngoingTask(name, 24, 24, 0, False, 1.0, (0,) * 6, 3.0, 100)
+
+
+#sets every row of schedule's grids to a value of its task, marks[task]
+def _mark(schedule, marks):
+    for row, task in enumerate(schedule.completables + schedule.ongoings):
+        schedule.current_schedule.array()[row] = marks[task] + np.arange(schedule.budget_days) / 100.0
+        schedule.perm_task_time.array()[row] = -marks[task]
+
+
+class ScheduleTasksTest(unittest.TestCase):
+    def testAddAndRemove(self):
+        rng = random.Random(1)
+        start = date(2024, 3, 4)
+        for n in range(50):
+            completables = [_completable("c%d" % k, start) for k in range(rng.randint(0, 4))]
+            ongoings = [_ongoing("o%d" % k) for k in range(rng.randint(0, 4))]
+            schedule = _schedule(start, completables, ongoings)
+            marks = dict((t, k + 1.0) for k, t in enumerate(completables + ongoings))
+            _mark(schedule, marks)
+            ids = dict((t, schedule.taskId(t)) for t in marks)
+            for step in range(10):
+                if rng.random() < 0.6:
+                    new = [_completable("c+%d" % k, start) if rng.random() < 0.5 else _ongoing("o+%d" % k)
+                        for k in range(rng.randint(1, 3))]
+                    schedule.addCompletables([t for t in new if isinstance(t, CompletableTask)])
+                    schedule.addOngoings([t for t in new if isinstance(t, OngoingTask)])
+                    for task in new:
+                        marks[task] = 0.0
+                else:
+                    tasks = schedule.completables + schedule.ongoings
+                    gone = rng.sample(tasks, rng.randint(0, len(tasks)))
+                    self.assertEqual(set(schedule.removeTasks(gone)), set(gone))
+                    for task in gone:
+                        self.assertFalse(task in schedule.due_dates)
+                tasks = schedule.completables + schedule.ongoings
+                grid = schedule.current_schedule.array()
+                self.assertEqual(grid.shape[0], len(tasks))
+                for row, task in enumerate(tasks):
+                    self.assertEqual(schedule.taskRow(task), row)
+                    self.assertAlmostEqual(grid[row, 0], marks[task])
+                    self.assertAlmostEqual(schedule.perm_task_time.array()[row, 0], -marks[task])
+                    if task in ids:
+                        self.assertEqual(schedule.taskId(task), ids[task])
+                    if isinstance(task, CompletableTask):
+                        self.assertEqual(schedule.due_dates[task], task.due)
+
+    def testMerge(self):
+        rng = random.Random(2)
+        start = date(2024, 3, 4)
+        for n in range(50):
+            shared = [_completable("s%d" % k, start) for k in range(rng.randint(0, 3))] + \
+                [_ongoing("so%d" % k) for k in range(rng.randint(0, 2))]
+            mine_only = [_completable("m%d" % k, start) for k in range(rng.randint(0, 3))] + \
+                [_ongoing("mo%d" % k) for k in range(rng.randint(0, 2))]
+            theirs_only = [_completable("t%d" % k, start) for k in range(rng.randint(0, 3))] + \
+                [_ongoing("to%d" % k) for k in range(rng.randint(0, 2))]
+            mine_tasks = shared + mine_only
+            theirs_tasks = theirs_only + shared
+            rng.shuffle(mine_tasks)
+            rng.shuffle(theirs_tasks)
+            shift = rng.randint(-3, 3)
+            mine = _schedule(start, [t for t in mine_tasks if isinstance(t, CompletableTask)],
+                [t for t in mine_tasks if isinstance(t, OngoingTask)])
+            theirs = _schedule(start + timedelta(days = shift), [t for t in theirs_tasks if isinstance(t,
+                CompletableTask)], [t for t in theirs_tasks if isinstance(t, OngoingTask)])
+            my_marks = dict((t, k + 1.0) for k, t in enumerate(mine_tasks))
+            their_marks = dict((t, 100.0 + k) for k, t in enumerate(theirs_tasks))
+            _mark(mine, my_marks)
+            _mark(theirs, their_marks)
+            merged = mine.merge(theirs)
+
+            tasks = merged.completables + merged.ongoings
+            self.assertEqual(set(tasks), set(mine_tasks) | set(theirs_tasks))
+            self.assertEqual(tasks[:len(mine.completables)], mine.completables)
+            D = merged.budget_days
+            for row, task in enumerate(tasks):
+                self.assertEqual(merged.taskRow(task), row)
+                grid = merged.current_schedule.array()[row]
+                if task in my_marks:
+                    self.assertEqual(merged.taskId(task), mine.taskId(task))
+                    self.assertTrue(np.allclose(grid, my_marks[task] + np.arange(D) / 100.0), (task, grid))
+                else:
+                    #their days lined up by date; days they do not have are 0
+                    days = np.arange(D) - shift
+                    want = np.where((days >= 0) & (days < D), their_marks[task] + days / 100.0, 0.0)
+                    self.assertTrue(np.allclose(grid, want), (task, shift, grid, want))
+            self.assertEqual(len(set(merged.taskId(t) for t in tasks)), len(tasks))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,194 @@
+"""
+Sets of time intervals, for blocks and the time they commit.
+
+A TimeSet keeps its TimeIntervals sorted by start, with their starts and
+ends in arrays, so add and remove are a binary search and an insert or
+delete. Queries run on arrays made the first time they are needed after a
+change: the running maximum of the ends (which bounds the search for the
+intervals overlapping a window), and the union of the intervals as disjoint
+segments with prefix sums of their lengths. The time covered in a window is
+then two binary searches, and the covered hours of every day of a horizon
+one vectorized search.
+"""
+
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from ical_import import asDatetime
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _seconds(d):
+    return (asDatetime(d) - _EPOCH).total_seconds()
+
+
+def _time(seconds):
+    return _EPOCH + timedelta(seconds = float(seconds))
+
+
+class TimeInterval(object):
+    def __init__(self, start, end, data = None):
+        self.start = start
+        self.end = end
+        self.duration = end - start
+        #what the interval stands for, e.g. the Block it is an occurrence of
+        self.data = data
+
+    @property
+    def hours(self):
+        return self.duration.total_seconds() / 3600.0
+
+    def overlaps(self, other):
+        return self.start < other.end and other.start < self.end
+
+    def __repr__(self):
+        return "TimeInterval(%s, %s)" % (self.start, self.end)
+
+
+class TimeSet(object):
+    def __init__(self, intervals = ()):
+        self._intervals = []
+        #seconds since _EPOCH, in the order of _intervals
+        self._starts = np.zeros(0)
+        self._ends = np.zeros(0)
+        self._arrays = None
+        self.update(intervals)
+
+    def __len__(self):
+        return len(self._intervals)
+
+    def __iter__(self):
+        return iter(self._intervals)
+
+    def add(self, interval):
+        start = _seconds(interval.start)
+        k = int(np.searchsorted(self._starts, start, 'right'))
+        self._starts = np.insert(self._starts, k, start)
+        self._ends = np.insert(self._ends, k, _seconds(interval.end))
+        self._intervals.insert(k, interval)
+        self._arrays = None
+
+    #adds many intervals with one sort
+    def update(self, intervals):
+        intervals = list(intervals)
+        if not intervals:
+            return
+        starts = np.concatenate((self._starts, [_seconds(i.start) for i in intervals]))
+        ends = np.concatenate((self._ends, [_seconds(i.end) for i in intervals]))
+        order = np.argsort(starts, kind = 'mergesort')
+        items = self._intervals + intervals
+        self._intervals = [items[k] for k in order]
+        self._starts = starts[order]
+        self._ends = ends[order]
+        self._arrays = None
+
+    #removes interval (the object itself, not an equal one)
+    def remove(self, interval):
+        start = _seconds(interval.start)
+        k = int(np.searchsorted(self._starts, start, 'left'))
+        while k < len(self._starts) and self._starts[k] == start:
+            if self._intervals[k] is interval:
+                self._starts = np.delete(self._starts, k)
+                self._ends = np.delete(self._ends, k)
+                del self._intervals[k]
+                self._arrays = None
+                return
+            k += 1
+        raise ValueError("interval not in the set")
+
+    #drops the intervals before the first one that ends after t
+    def removeBefore(self, t):
+        k = int(np.searchsorted(self.__index()[0], _seconds(t), 'right'))
+        if k:
+            self._starts = self._starts[k:]
+            self._ends = self._ends[k:]
+            del self._intervals[:k]
+            self._arrays = None
+
+    #a new set with the intervals of both
+    def union(self, other):
+        out = TimeSet(self._intervals)
+        out.update(other)
+        return out
+
+    __or__ = union
+
+    #(running max of ends, union segment starts, segment ends, prefix sums of
+    #segment lengths)
+    def __index(self):
+        if self._arrays is None:
+            starts = self._starts
+            max_ends = np.maximum.accumulate(self._ends) if len(starts) else self._ends
+            #a segment of the union starts wherever an interval starts after
+            #every earlier one has ended
+            first = np.flatnonzero(np.concatenate(([True], starts[1:] > max_ends[:-1]))) if len(starts) \
+                else np.zeros(0, dtype = np.int64)
+            seg_starts = starts[first]
+            seg_ends = max_ends[np.append(first[1:] - 1, len(starts) - 1)] if len(starts) else max_ends
+            covered = np.concatenate(([0.0], np.cumsum(seg_ends - seg_starts)))
+            self._arrays = (max_ends, seg_starts, seg_ends, covered)
+        return self._arrays
+
+    #intervals overlapping [a, b), in order of start
+    def overlapping(self, a, b):
+        a, b = _seconds(a), _seconds(b)
+        max_ends = self.__index()[0]
+        #intervals before lo all end by a; those from hi on start at or after b
+        lo = int(np.searchsorted(max_ends, a, 'right'))
+        hi = int(np.searchsorted(self._starts, b, 'left'))
+        return [self._intervals[lo + k] for k in np.flatnonzero(self._ends[lo:hi] > a)]
+
+    def overlaps(self, a, b):
+        return self.coveredHours(a, b) > 0
+
+    #seconds covered by the union before each of times (seconds)
+    def __coveredBefore(self, times):
+        seg_starts, seg_ends, covered = self.__index()[1:]
+        times = np.asarray(times, dtype = float)
+        if not len(seg_starts):
+            return np.zeros(times.shape)
+        k = np.searchsorted(seg_starts, times, 'right')
+        after = np.where(k > 0, np.maximum(seg_ends[np.maximum(k - 1, 0)] - times, 0.0), 0.0)
+        return covered[k] - after
+
+    #hours of [a, b) covered by at least one interval
+    def coveredHours(self, a, b):
+        before = self.__coveredBefore([_seconds(a), _seconds(b)])
+        return max(before[1] - before[0], 0.0) / 3600.0
+
+    #covered hours of each of num_days days from day0
+    def dayHours(self, day0, num_days):
+        times = _seconds(day0) + 86400.0 * np.arange(num_days + 1)
+        return np.diff(self.__coveredBefore(times)) / 3600.0
+
+    #the union as disjoint (start, end) pairs, cut to [a, b) if given
+    def merged(self, a = None, b = None):
+        seg_starts, seg_ends = self.__index()[1:3]
+        lo = -np.inf if a is None else _seconds(a)
+        hi = np.inf if b is None else _seconds(b)
+        first = int(np.searchsorted(seg_ends, lo, 'right'))
+        last = int(np.searchsorted(seg_starts, hi, 'left'))
+        return [(_time(max(seg_starts[k], lo)), _time(min(seg_ends[k], hi))) for k in range(first, last)]
+
+    #(start, end) pairs of the parts of [a, b) no interval covers
+    def free(self, a, b):
+        out = []
+        t = asDatetime(a)
+        for start, end in self.merged(a, b):
+            if start > t:
+                out.append((t, start))
+            t = max(t, end)
+        if t < asDatetime(b):
+            out.append((t, asDatetime(b)))
+        return out
+
+    #the query arrays are made again after unpickling
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['_arrays'] = None
+        return state
+
+    def __repr__(self):
+        return "TimeSet(%d intervals)" % len(self._intervals)
@@ -0,0 +1,115 @@
+"""
+Checks TimeSet against a bitmap of the minutes its intervals cover, over
+random sets of intervals built with add, update and remove.
+
+    python -m pytest time_set_test.py (or python time_set_test.py)
+"""
+
+import pickle
+import random
+import unittest
+from datetime import datetime, timedelta
+
+import numpy as np
+
+from time_set import TimeSet, TimeInterval
+
+_DAY0 = datetime(2024, 3, 4)
+_DAYS = 4
+_MINUTES = _DAYS * 24 * 60
+
+
+def _at(minute):
+    return _DAY0 + timedelta(minutes = minute)
+
+
+#runs of True in bitmap as (start, end) minutes
+def _runs(bitmap):
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], bitmap.astype(np.int8), [0]))))
+    return list(zip(edges[::2].tolist(), edges[1::2].tolist()))
+
+
+class TimeSetTest(unittest.TestCase):
+    #a random TimeSet and the number of its intervals over each minute
+    def randomSet(self, rng):
+        intervals = []
+        for k in range(rng.randint(0, 30)):
+            start = rng.randrange(_MINUTES)
+            end = min(start + rng.choice((1, 15, 60, 90, 300, 1500)), _MINUTES)
+            intervals.append(TimeInterval(_at(start), _at(end), (start, end)))
+        times = TimeSet()
+        if rng.random() < 0.5:
+            times.update(intervals)
+        else:
+            for interval in intervals:
+                times.add(interval)
+        for interval in rng.sample(intervals, len(intervals) // 4):
+            times.remove(interval)
+            intervals.remove(interval)
+        counts = np.zeros(_MINUTES, dtype = np.int64)
+        for interval in intervals:
+            start, end = interval.data
+            counts[start:end] += 1
+        return times, intervals, counts
+
+    def testQueries(self):
+        rng = random.Random(0)
+        for n in range(300):
+            times, intervals, counts = self.randomSet(rng)
+            bitmap = counts > 0
+            self.assertEqual(len(times), len(intervals))
+            self.assertEqual([i.data[0] for i in times], sorted(i.data[0] for i in intervals))
+            for q in range(10):
+                a = rng.randrange(-60, _MINUTES + 60)
+                b = rng.randrange(a, _MINUTES + 120)
+                lo, hi = max(a, 0), min(max(b, 0), _MINUTES)
+                covered = float(bitmap[lo:hi].sum()) if hi > lo else 0.0
+                self.assertAlmostEqual(times.coveredHours(_at(a), _at(b)), covered / 60, 9, (a, b))
+                self.assertEqual(times.overlaps(_at(a), _at(b)), covered > 0, (a, b))
+                want = sorted((i.data for i in intervals if i.data[0] < b and i.data[1] > a))
+                self.assertEqual(sorted(i.data for i in times.overlapping(_at(a), _at(b))), want, (a, b))
+                runs = [(max(s, a), min(e, b)) for s, e in _runs(bitmap) if s < b and e > a]
+                self.assertEqual(times.merged(_at(a), _at(b)), [(_at(s), _at(e)) for s, e in runs], (a, b))
+                gaps = [(max(s, a), min(e, b)) for s, e in _runs(~bitmap) if s < b and e > a]
+                #the bitmap ends at _MINUTES; the free time runs on to b
+                if b > _MINUTES:
+                    if gaps and gaps[-1][1] == _MINUTES:
+                        gaps[-1] = (gaps[-1][0], b)
+                    else:
+                        gaps.append((max(a, _MINUTES), b))
+                if a < 0:
+                    if gaps and gaps[0][0] == 0:
+                        gaps[0] = (a, gaps[0][1])
+                    else:
+                        gaps.insert(0, (a, min(b, 0)))
+                self.assertEqual(times.free(_at(a), _at(b)), [(_at(s), _at(e)) for s, e in gaps if e > s], (a, b))
+            day_hours = bitmap.reshape(_DAYS, 24 * 60).sum(axis = 1) / 60.0
+            self.assertTrue(np.allclose(times.dayHours(_DAY0, _DAYS), day_hours), (times.dayHours(_DAY0, _DAYS),
+                day_hours))
+
+    def testRemoveBefore(self):
+        rng = random.Random(1)
+        for n in range(300):
+            times, intervals, counts = self.randomSet(rng)
+            t = rng.randrange(_MINUTES)
+            ordered = list(times)
+            times.removeBefore(_at(t))
+            #everything up to the first interval that ends after t goes
+            k = 0
+            while k < len(ordered) and ordered[k].data[1] <= t:
+                k += 1
+            self.assertEqual(sorted(i.data for i in times), sorted(i.data for i in ordered[k:]), t)
+
+    def testUnionAndPickle(self):
+        rng = random.Random(2)
+        for n in range(100):
+            a, intervals_a, counts_a = self.randomSet(rng)
+            b, intervals_b, counts_b = self.randomSet(rng)
+            both = pickle.loads(pickle.dumps(a | b, 2))
+            bitmap = (counts_a + counts_b) > 0
+            self.assertEqual(len(both), len(a) + len(b))
+            self.assertAlmostEqual(both.coveredHours(_DAY0, _at(_MINUTES)), bitmap.sum() / 60.0, 9)
+
+
+if __name__ == "__main__":
+    unittest.main()